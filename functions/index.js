@@ -58,6 +58,7 @@ exports.enqueueImportJob = onRequest(async (req, res) => {
     dryRun: Boolean(req.body.dryRun),
     requestedBy: req.body.requestedBy || null,
     workerId: req.body.workerId || null,
+    shardPhotos: Number(req.body.shardPhotos) || null,
   };
 
   await jobRef.set({
@@ -66,8 +67,10 @@ exports.enqueueImportJob = onRequest(async (req, res) => {
     createdAt: FieldValue.serverTimestamp(),
   });
 
+  // workerId as an attribute lets each worker's subscription filter on it
   await pubsub.topic(IMPORT_JOBS_TOPIC).publishMessage({
     json: payload,
+    attributes: payload.workerId ? { workerId: payload.workerId } : {},
   });
 
   res.json({ ok: true, jobId });
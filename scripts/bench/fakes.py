@@ -0,0 +1,214 @@
+"""
+In-memory Firestore / Cloud Storage stand-ins for benchmarking import_photos.
+
+They implement just the client surface the importer uses (documents, batches,
+get_all, stream; blob uploads and server-side copies) and can inject latency
+per call so network-bound behaviour can be reproduced offline. Every call is
+counted and its time (including injected latency) accumulated per operation.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class Latency:
+    """Sleep mean_ms +/- jitter_ms per call; optionally bandwidth-limited by payload size."""
+
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0, mbps: float = 0.0, seed: int = 0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.mbps = mbps
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self, nbytes: int = 0) -> None:
+        with self._lock:
+            delay_ms = self.mean_ms + (self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        delay = max(0.0, delay_ms) / 1000.0
+        if self.mbps and nbytes:
+            delay += nbytes * 8 / (self.mbps * 1_000_000)
+        if delay:
+            time.sleep(delay)
+
+
+class OpStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.bytes: Dict[str, int] = defaultdict(int)
+
+    def add(self, op: str, started: float, nbytes: int = 0, count: int = 1) -> None:
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.calls[op] += count
+            self.seconds[op] += elapsed
+            self.bytes[op] += nbytes
+
+    def count(self, op: str, n: int) -> None:
+        with self._lock:
+            self.calls[op] += n
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            out: Dict[str, Dict[str, Any]] = {}
+            for op in sorted(self.calls):
+                entry: Dict[str, Any] = {"calls": self.calls[op]}
+                if op in self.seconds:
+                    entry["sec"] = round(self.seconds[op], 4)
+                if self.bytes.get(op):
+                    entry["bytes"] = self.bytes[op]
+                out[op] = entry
+            return out
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict[str, Any]]):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocumentRef:
+    def __init__(self, db: "FakeFirestore", collection: str, doc_id: str):
+        self._db = db
+        self.collection_path = collection
+        self.id = doc_id
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.collection_path, self.id
+
+    def get(self) -> FakeSnapshot:
+        started = time.perf_counter()
+        self._db.latency.wait()
+        snap = self._db._snapshot(self.key)
+        self._db.stats.add("get", started)
+        return snap
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        started = time.perf_counter()
+        self._db.latency.wait()
+        self._db._apply([(self.key, data, merge)])
+        self._db.stats.add("set", started)
+
+
+class FakeCollection:
+    def __init__(self, db: "FakeFirestore", path: str):
+        self._db = db
+        self.path = path
+
+    def document(self, doc_id: str) -> FakeDocumentRef:
+        return FakeDocumentRef(self._db, self.path, doc_id)
+
+    def stream(self) -> Iterable[FakeSnapshot]:
+        started = time.perf_counter()
+        self._db.latency.wait()
+        snaps = self._db._collection_snapshots(self.path)
+        self._db.stats.add("stream", started)
+        return iter(snaps)
+
+
+class FakeWriteBatch:
+    def __init__(self, db: "FakeFirestore"):
+        self._db = db
+        self._ops: List[Tuple[Tuple[str, str], Dict[str, Any], bool]] = []
+
+    def set(self, ref: FakeDocumentRef, data: Dict[str, Any], merge: bool = False) -> None:
+        self._ops.append((ref.key, data, merge))
+
+    def commit(self) -> None:
+        started = time.perf_counter()
+        self._db.latency.wait()
+        self._db._apply(self._ops)
+        self._db.stats.add("commit", started)
+        self._db.stats.count("commit_docs", len(self._ops))
+
+
+class FakeFirestore:
+    def __init__(self, latency: Optional[Latency] = None):
+        self.latency = latency or Latency()
+        self.stats = OpStats()
+        self.docs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def collection(self, path: str) -> FakeCollection:
+        return FakeCollection(self, path)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def get_all(self, refs: Iterable[FakeDocumentRef], field_paths=None) -> Iterable[FakeSnapshot]:
+        refs = list(refs)
+        started = time.perf_counter()
+        self.latency.wait()
+        snaps = [self._snapshot(ref.key, with_fields=field_paths != []) for ref in refs]
+        self.stats.add("get_all", started)
+        self.stats.count("get_all_docs", len(refs))
+        return snaps
+
+    def _snapshot(self, key: Tuple[str, str], with_fields: bool = True) -> FakeSnapshot:
+        with self._lock:
+            data = self.docs.get(key)
+            if data is not None and not with_fields:
+                data = {}
+            return FakeSnapshot(key[1], dict(data) if data is not None else None)
+
+    def _collection_snapshots(self, path: str) -> List[FakeSnapshot]:
+        with self._lock:
+            return [FakeSnapshot(doc_id, dict(data)) for (col, doc_id), data in self.docs.items() if col == path]
+
+    def _apply(self, ops) -> None:
+        with self._lock:
+            for key, data, merge in ops:
+                if merge and key in self.docs:
+                    self.docs[key].update(data)
+                else:
+                    self.docs[key] = dict(data)
+
+
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+
+    def upload_from_file(self, fh, content_type: Optional[str] = None) -> None:
+        data = fh.read()
+        started = time.perf_counter()
+        self.bucket.latency.wait(len(data))
+        with self.bucket._lock:
+            self.bucket.blobs[self.name] = (data, content_type)
+        self.bucket.stats.add("upload", started, nbytes=len(data))
+
+
+class NotFound(Exception):
+    code = 404
+
+
+class FakeBucket:
+    def __init__(self, latency: Optional[Latency] = None):
+        self.latency = latency or Latency()
+        self.stats = OpStats()
+        self.blobs: Dict[str, Tuple[bytes, Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def copy_blob(self, blob: FakeBlob, destination_bucket: "FakeBucket", new_name: str) -> FakeBlob:
+        started = time.perf_counter()
+        self.latency.wait()
+        with self._lock:
+            if blob.name not in self.blobs:
+                raise NotFound(blob.name)
+            destination_bucket.blobs[new_name] = self.blobs[blob.name]
+        self.stats.add("copy", started)
+        return FakeBlob(destination_bucket, new_name)
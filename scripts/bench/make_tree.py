@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic photo tree for benchmarking import_photos.
+
+The tree is deterministic for a given seed: nested folders, a mix of JPEG
+(with EXIF capture times), PNG and HEIC files at several resolutions. Image
+content is a smooth gradient with mild noise, so encoded sizes are closer to
+real photos than flat colour or pure noise would be.
+
+  python scripts/bench/make_tree.py --out /tmp/bench-tree --folders 8 --per-folder 25
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+from PIL import Image
+from pillow_heif import register_heif_opener
+
+register_heif_opener()
+
+DEFAULT_FORMATS = ("jpeg", "jpeg", "jpeg", "png", "heic")
+DEFAULT_SIZES = ((1600, 1200), (4000, 3000), (3000, 4000), (6000, 4000))
+EXTENSIONS = {"jpeg": ".jpg", "png": ".png", "heic": ".heic"}
+
+EXIF_IFD = 0x8769
+TAG_DATETIME_ORIGINAL = 0x9003
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def synthetic_image(size: Tuple[int, int], rng: random.Random) -> Image.Image:
+    # Build at 1/8 scale and upsample: cheap to generate, photo-like to encode
+    small = (max(1, size[0] // 8), max(1, size[1] // 8))
+    base = Image.linear_gradient("L").resize(small).convert("RGB")
+    tint = Image.new("RGB", small, tuple(rng.randrange(256) for _ in range(3)))
+    noise = Image.effect_noise(small, rng.uniform(10, 40)).convert("RGB")
+    mixed = Image.blend(Image.blend(base, tint, 0.5), noise, 0.25)
+    return mixed.resize(size, Image.BILINEAR)
+
+
+def folder_names(folders: int, depth: int) -> List[str]:
+    """Relative folder paths; folder i sits i % (depth + 1) levels deep."""
+    names = []
+    for i in range(folders):
+        parents = [f"level{level}" for level in range(i % (depth + 1))]
+        names.append("/".join(parents + [f"f{i:03d}"]))
+    return names
+
+
+def generate_tree(
+    out: Path,
+    folders: int = 4,
+    per_folder: int = 10,
+    depth: int = 2,
+    formats: Sequence[str] = DEFAULT_FORMATS,
+    sizes: Sequence[Tuple[int, int]] = DEFAULT_SIZES,
+    seed: int = 0,
+) -> Dict[str, object]:
+    """Write the tree under out; returns a summary (also written to out/tree.json)."""
+    rng = random.Random(seed)
+    out.mkdir(parents=True, exist_ok=True)
+    counts: Dict[str, int] = {}
+    total_bytes = 0
+    for folder_index, rel in enumerate(folder_names(folders, depth)):
+        folder = out / rel
+        folder.mkdir(parents=True, exist_ok=True)
+        for i in range(per_folder):
+            fmt = rng.choice(list(formats))
+            size = rng.choice(list(sizes))
+            path = folder / f"img_{i:04d}{EXTENSIONS[fmt]}"
+            im = synthetic_image(size, rng)
+            if fmt == "jpeg":
+                exif = Image.Exif()
+                exif.get_ifd(EXIF_IFD)[TAG_DATETIME_ORIGINAL] = (
+                    f"2020:{1 + folder_index % 12:02d}:{1 + i % 28:02d} 12:{i % 60:02d}:00"
+                )
+                im.save(path, quality=90, exif=exif)
+            else:
+                im.save(path)
+            counts[fmt] = counts.get(fmt, 0) + 1
+            total_bytes += path.stat().st_size
+    summary = {
+        "folders": folders,
+        "per_folder": per_folder,
+        "depth": depth,
+        "seed": seed,
+        "images": folders * per_folder,
+        "formats": counts,
+        "bytes": total_bytes,
+    }
+    (out / "tree.json").write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+def add_tree_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--folders", type=int, default=4, help="Number of folders (default 4)")
+    p.add_argument("--per-folder", type=int, default=10, help="Images per folder (default 10)")
+    p.add_argument("--depth", type=int, default=2, help="Maximum folder nesting (default 2)")
+    p.add_argument(
+        "--formats",
+        default=",".join(DEFAULT_FORMATS),
+        help="Comma-separated formats to pick from; repeat one to weight it (default %(default)s)",
+    )
+    p.add_argument(
+        "--sizes",
+        default=",".join(f"{w}x{h}" for w, h in DEFAULT_SIZES),
+        help="Comma-separated WxH resolutions to pick from (default %(default)s)",
+    )
+    p.add_argument("--seed", type=int, default=0)
+
+
+def tree_kwargs(args) -> Dict[str, object]:
+    formats = [f.strip().lower() for f in args.formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in EXTENSIONS]
+    if unknown:
+        raise SystemExit(f"unknown formats: {', '.join(unknown)}")
+    return {
+        "folders": args.folders,
+        "per_folder": args.per_folder,
+        "depth": args.depth,
+        "formats": formats,
+        "sizes": [parse_size(s) for s in args.sizes.split(",") if s.strip()],
+        "seed": args.seed,
+    }
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="generate a synthetic photo tree for import benchmarks")
+    p.add_argument("--out", required=True, help="Directory to create")
+    add_tree_args(p)
+    args = p.parse_args()
+    summary = generate_tree(Path(args.out), **tree_kwargs(args))
+    json.dump(summary, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Benchmark import_photos against in-memory Firestore/Storage fakes.
+
+Runs the real importer (import_photos.run) over a synthetic or existing tree
+with fake backends that can inject latency, and writes a JSON report with
+photos/sec, per-stage time and call counts, and peak RSS, so runs can be
+compared before and after a change. Per-stage timings come from the
+importer's own --stats-json summary; the fakes add per-call counts and time
+as seen from the backend side.
+
+  # generate a tree in a temp dir and run with 4 render workers
+  python scripts/bench/run_bench.py --folders 8 --per-folder 25 --out bench.json -- --workers 4
+
+  # reuse a tree and model a 40ms Firestore / 60ms Storage round trip
+  python scripts/bench/run_bench.py --tree /tmp/bench-tree --db-latency-ms 40 --storage-latency-ms 60
+
+Arguments after "--" (or any not recognised here) are passed to import_photos.
+A temporary manifest is used unless --manifest or --no-manifest is passed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+import PIL  # noqa: E402
+
+import import_photos as ip  # noqa: E402
+from fakes import FakeBucket, FakeFirestore, Latency  # noqa: E402
+from make_tree import add_tree_args, generate_tree, tree_kwargs  # noqa: E402
+
+ROOT_PATH = "/bench"
+
+
+def peak_rss_mb() -> Dict[str, Optional[float]]:
+    """Peak RSS of this process and of its reaped children (render workers)."""
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def count_images(tree: Path) -> int:
+    return sum(len(files) for _, files in ip.iter_image_folders(tree))
+
+
+def run_once(
+    tree: Path,
+    import_argv: Sequence[str],
+    db: FakeFirestore,
+    bucket: FakeBucket,
+) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="bench-stats-") as tmp:
+        stats_path = Path(tmp) / "stats.json"
+        args = ip.parse_args(
+            ["--input-dir", str(tree), "--root-path", ROOT_PATH, "--stats-json", str(stats_path), *import_argv]
+        )
+        db_before, bucket_before = db.stats.to_dict(), bucket.stats.to_dict()
+        error = None
+        started = time.perf_counter()
+        # The importer prints progress to stdout; keep stdout for the report
+        with contextlib.redirect_stdout(sys.stderr):
+            try:
+                ip.run(args, db, bucket)
+            except SystemExit as exc:
+                error = str(exc)
+        wall = time.perf_counter() - started
+        importer_stats = json.loads(stats_path.read_text()) if stats_path.exists() else None
+    photos = sum(1 for col, _ in db.docs if col == "photos")
+    return {
+        "wall_sec": round(wall, 3),
+        "photo_docs": photos,
+        "error": error,
+        "stages": importer_stats["stages"] if importer_stats else None,
+        "counters": importer_stats["counters"] if importer_stats else None,
+        "firestore": _diff(db.stats.to_dict(), db_before),
+        "storage": _diff(bucket.stats.to_dict(), bucket_before),
+    }
+
+
+def _diff(after: Dict[str, Dict[str, Any]], before: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    out = {}
+    for op, entry in after.items():
+        prev = before.get(op, {})
+        delta = {k: round(v - prev.get(k, 0), 4) if isinstance(v, float) else v - prev.get(k, 0) for k, v in entry.items()}
+        if delta.get("calls"):
+            out[op] = delta
+    return out
+
+
+def run_bench(
+    tree: Path,
+    import_argv: Sequence[str],
+    repeat: int = 1,
+    rerun: bool = False,
+    db_latency: Optional[Latency] = None,
+    storage_latency: Optional[Latency] = None,
+) -> Dict[str, Any]:
+    """Import tree repeat times into fresh fakes (plus an optional warm re-run each time)."""
+    images = count_images(tree)
+    scan_started = time.perf_counter()
+    sum(1 for _ in ip.iter_ordered_items(tree, ROOT_PATH, lambda *a: None))
+    scan_sec = time.perf_counter() - scan_started
+
+    runs: List[Dict[str, Any]] = []
+    reruns: List[Dict[str, Any]] = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="bench-manifest-") as tmp:
+            argv = list(import_argv)
+            if "--manifest" not in argv and "--no-manifest" not in argv:
+                argv += ["--manifest", str(Path(tmp) / "manifest.sqlite3")]
+            db = FakeFirestore(db_latency)
+            bucket = FakeBucket(storage_latency)
+            run = run_once(tree, argv, db, bucket)
+            run["photos_per_sec"] = round(images / run["wall_sec"], 2) if run["wall_sec"] else None
+            runs.append(run)
+            if rerun:
+                again = run_once(tree, argv, db, bucket)
+                again["photos_per_sec"] = round(images / again["wall_sec"], 2) if again["wall_sec"] else None
+                reruns.append(again)
+
+    report: Dict[str, Any] = {
+        "images": images,
+        "scan_sec": round(scan_sec, 4),
+        "photos_per_sec_median": statistics.median(r["photos_per_sec"] or 0 for r in runs),
+        "runs": runs,
+        "peak_rss_mb": peak_rss_mb(),
+        "env": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "cpus": os.cpu_count(),
+            "platform": platform.platform(),
+            "commit": _git_commit(),
+        },
+        "import_argv": list(import_argv),
+    }
+    if reruns:
+        report["reruns"] = reruns
+    return report
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="benchmark import_photos with fake Firestore/Storage backends")
+    p.add_argument("--tree", help="Existing image tree (default: generate one in a temp dir)")
+    p.add_argument("--keep-tree", help="Generate the tree here and keep it instead of a temp dir")
+    add_tree_args(p)
+    p.add_argument("--repeat", type=int, default=1, help="Runs, each into fresh fakes (default 1)")
+    p.add_argument("--rerun", action="store_true", help="Also time a second, warm import into the same fakes")
+    p.add_argument("--db-latency-ms", type=float, default=0.0, help="Injected latency per Firestore call")
+    p.add_argument("--storage-latency-ms", type=float, default=0.0, help="Injected latency per Storage call")
+    p.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on injected latencies")
+    p.add_argument("--storage-mbps", type=float, default=0.0, help="Simulated upload bandwidth (0 = unlimited)")
+    p.add_argument("--out", help="Also write the JSON report to this file")
+    args, import_argv = p.parse_known_args()
+    import_argv = [a for a in import_argv if a != "--"]
+
+    db_latency = Latency(args.db_latency_ms, args.jitter_ms, seed=args.seed)
+    storage_latency = Latency(args.storage_latency_ms, args.jitter_ms, args.storage_mbps, seed=args.seed + 1)
+
+    with contextlib.ExitStack() as stack:
+        tree_info = None
+        if args.tree:
+            tree = Path(args.tree).expanduser().resolve()
+        else:
+            tree = Path(args.keep_tree) if args.keep_tree else Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="bench-tree-")))
+            tree_info = generate_tree(tree, **tree_kwargs(args))
+        report = run_bench(tree, import_argv, args.repeat, args.rerun, db_latency, storage_latency)
+    if tree_info is not None:
+        report["tree"] = tree_info
+    report["latency"] = {
+        "db_ms": args.db_latency_ms,
+        "storage_ms": args.storage_latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "storage_mbps": args.storage_mbps,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
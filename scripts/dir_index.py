@@ -0,0 +1,283 @@
+"""
+Local SQLite index of directories for find_directory.
+
+One row per directory under an indexed root records its mtime_ns and the
+number of media files directly inside it. Paths are also kept in an FTS5
+trigram table, so a keyword (substring) query is an index lookup and not a
+walk over the whole tree. Media counts for the matched subtrees come from
+the same rows.
+
+refresh(root) is incremental. Every indexed directory is stat()ed, but it
+is listed again only when its mtime changed. Adding, removing or renaming
+an entry changes the mtime of the directory holding it, so unchanged
+directories keep their media count and their known subdirectories. Progress
+is committed as the walk goes, and a refresh cut short by should_stop
+continues from there the next time.
+
+The walk is find_directory.walk_dirs, so directories are stat()ed and
+listed in parallel, with its defaults: DEFAULT_SKIP_DIRNAMES and dot
+directories are not indexed, and dot files are not counted.
+
+  python scripts/dir_index.py --roots D:/Photos //nas/photos
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from find_directory import DEFAULT_SKIP_DIRNAMES, MEDIA_EXTS, default_roots, list_dir_entries, walk_dirs
+
+DEFAULT_INDEX_PATH = Path(__file__).with_name("dir_index.sqlite3")
+# Directories changed this recently are listed again on the next refresh:
+# coarse mtimes (FAT, SMB) could hide a second change in the same tick.
+MTIME_SETTLE_NS = 2_000_000_000
+# Trigrams need 3 characters; shorter keywords (and SQLite builds without
+# FTS5 trigram, < 3.34) fall back to scanning the paths
+_TRIGRAM_MIN_CHARS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    parent TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    media INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY,
+    refreshed_at REAL,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS dirs_fts USING fts5(
+    path, content='dirs', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS dirs_ai AFTER INSERT ON dirs BEGIN
+    INSERT INTO dirs_fts (rowid, path) VALUES (new.id, new.path);
+END;
+CREATE TRIGGER IF NOT EXISTS dirs_ad AFTER DELETE ON dirs BEGIN
+    INSERT INTO dirs_fts (dirs_fts, rowid, path) VALUES ('delete', old.id, old.path);
+END;
+"""
+
+
+def _subtree_bounds(path: str) -> Tuple[str, str]:
+    # Every descendant sorts in [path + sep, path + chr(ord(sep) + 1))
+    base = path.rstrip(os.sep)
+    return base + os.sep, base + chr(ord(os.sep) + 1)
+
+
+class DirIndex:
+    def __init__(self, path: Path = DEFAULT_INDEX_PATH, commit_every: int = 500):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared by the server's refresh thread and its query threads
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self._conn.commit()
+        self._commit_every = commit_every
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    # ---- refresh ----
+
+    def _delete_subtree(self, path: str) -> int:
+        lo, hi = _subtree_bounds(path)
+        cur = self._conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, lo, hi))
+        return cur.rowcount
+
+    def _list(self, path: Path) -> Tuple[List[Path], Tuple[Optional[int], Optional[int], List[str]]]:
+        """
+        walk_dirs lister: (subdirectories, (mtime_ns, media, subdirectories)).
+        An unchanged directory is not listed: its subdirectories come from the
+        index and media is None. mtime_ns is None when the directory is gone.
+        Runs on the walk's threads, so the stat and listing calls overlap and
+        stay outside the lock.
+        """
+        p = str(path)
+        try:
+            mtime_ns = os.stat(p, follow_symlinks=False).st_mtime_ns
+        except OSError:
+            return [], (None, None, [])
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (p,)).fetchone()
+            if row is not None and row[0] == mtime_ns:
+                known = [Path(r[0]) for r in self._conn.execute("SELECT path FROM dirs WHERE parent = ?", (p,))]
+                return sorted(known, key=lambda d: d.name), (mtime_ns, None, [])
+        try:
+            subdirs, files = list_dir_entries(path, False, DEFAULT_SKIP_DIRNAMES)
+        except OSError:
+            return [], (None, None, [])
+        media = sum(1 for name in files if not name.startswith(".") and os.path.splitext(name)[1].lower() in MEDIA_EXTS)
+        return subdirs, (mtime_ns, media, [str(d) for d in subdirs])
+
+    def refresh(self, root: Path, should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, int]:
+        """Bring the rows under root up to date, listing only changed directories."""
+        root_path = Path(root).expanduser().resolve()
+        root_str = str(root_path)
+        stats = {"dirs": 0, "listed": 0, "removed": 0, "complete": 0}
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO roots (path) VALUES (?)", (root_str,))
+        stopped = False
+
+        def stop() -> bool:
+            nonlocal stopped
+            stopped = should_stop is not None and should_stop()
+            return stopped
+
+        pending = 0
+        # Directories are stat()ed and listed ahead on walk_dirs' threads; the
+        # rows are written here, in walk order
+        walk = walk_dirs([root_path], False, DEFAULT_SKIP_DIRNAMES, stop, list_dir=self._list)
+        for dir_path, (mtime_ns, media, children) in walk:
+            path = str(dir_path)
+            if mtime_ns is None:
+                with self._lock:
+                    stats["removed"] += self._delete_subtree(path)
+                continue
+            stats["dirs"] += 1
+            if media is None:
+                continue
+            stats["listed"] += 1
+            if time.time_ns() - mtime_ns < MTIME_SETTLE_NS:
+                mtime_ns = -1
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO dirs (path, parent, mtime_ns, media) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (path) DO UPDATE SET mtime_ns = excluded.mtime_ns, media = excluded.media",
+                    (path, os.path.dirname(path), mtime_ns, media),
+                )
+                # Placeholder rows for the subdirectories (never matching mtime) so
+                # that a refresh stopped before reaching them still lists them later
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO dirs (path, parent, mtime_ns, media) VALUES (?, ?, -1, 0)",
+                    [(child, path) for child in children],
+                )
+                keep = set(children)
+                # A root of its own (say a dot directory) stays even though this walk skips it
+                gone = self._conn.execute(
+                    "SELECT path FROM dirs WHERE parent = ? AND path NOT IN (SELECT path FROM roots)", (path,)
+                ).fetchall()
+                for (old,) in gone:
+                    if old not in keep:
+                        stats["removed"] += self._delete_subtree(old)
+                pending += 1
+                if pending >= self._commit_every:
+                    self._conn.commit()
+                    pending = 0
+        if not stopped:
+            stats["complete"] = 1
+        with self._lock:
+            if stats["complete"]:
+                self._conn.execute(
+                    "UPDATE roots SET refreshed_at = ?, complete = 1 WHERE path = ?", (time.time(), root_str)
+                )
+            self._conn.commit()
+        return stats
+
+    # ---- queries ----
+
+    def roots(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT path FROM roots ORDER BY path")]
+
+    def covers(self, path: Path) -> bool:
+        """True when path lies under a completely refreshed root and is indexed."""
+        p = str(path)
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM dirs WHERE path = ?", (p,)).fetchone() is None:
+                return False
+            for (root,) in self._conn.execute("SELECT path FROM roots WHERE complete = 1"):
+                if p == root or p.startswith(root.rstrip(os.sep) + os.sep):
+                    return True
+        return False
+
+    def _candidates(self, keyword: str) -> Iterable[str]:
+        if self.fts and len(keyword) >= _TRIGRAM_MIN_CHARS:
+            phrase = '"' + keyword.replace('"', '""') + '"'
+            sql = "SELECT path FROM dirs_fts WHERE dirs_fts MATCH ? ORDER BY path"
+            return [r[0] for r in self._conn.execute(sql, (phrase,))]
+        return [r[0] for r in self._conn.execute("SELECT path FROM dirs ORDER BY path")]
+
+    def find(self, keyword: str, roots: List[Path], limit: int) -> List[str]:
+        """Indexed directories under roots whose path contains keyword (case-insensitive)."""
+        keyword_lower = keyword.lower()
+        prefixes = [(str(r), str(r).rstrip(os.sep) + os.sep) for r in roots]
+        hits: List[str] = []
+        with self._lock:
+            for path in self._candidates(keyword):
+                if keyword_lower not in path.lower():
+                    continue
+                if not any(path == r or path.startswith(prefix) for r, prefix in prefixes):
+                    continue
+                hits.append(path)
+                if len(hits) >= limit:
+                    break
+        return hits
+
+    def media_counts(self, dirs: List[str], limit: int) -> Dict[str, int]:
+        """Media count of every directory in the dirs subtrees, up to limit files in total."""
+        counts: Dict[str, int] = {}
+        total = 0
+        with self._lock:
+            for d in dirs:
+                lo, hi = _subtree_bounds(d)
+                rows = self._conn.execute(
+                    "SELECT path, media FROM dirs WHERE (path = ? OR (path >= ? AND path < ?)) AND media > 0"
+                    " ORDER BY path",
+                    (d, lo, hi),
+                )
+                for path, media in rows:
+                    if path in counts:
+                        continue
+                    media = min(media, limit - total)
+                    counts[path] = media
+                    total += media
+                    if total >= limit:
+                        return counts
+        return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build or refresh the directory index used by find_directory.")
+    parser.add_argument("--roots", nargs="*", default=[], help="Roots to index (default: home, Pictures, ...)")
+    parser.add_argument("--index", default=str(DEFAULT_INDEX_PATH), help="Index file")
+    args = parser.parse_args()
+
+    roots: List[Path] = [Path(r).expanduser().resolve() for r in args.roots] or default_roots()
+    index = DirIndex(Path(args.index))
+    try:
+        for root in roots:
+            t0 = time.time()
+            stats = index.refresh(root)
+            stats["elapsed_sec"] = round(time.time() - t0, 3)
+            sys.stdout.write(json.dumps({"root": str(root), **stats}) + "\n")
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,9 +5,11 @@ from __future__ import annotations
 
 import argparse
 import os
+import threading
 from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 
 IMAGE_EXTS: Set[str] = {
@@ -28,6 +30,9 @@ DEFAULT_SKIP_DIRNAMES: Set[str] = {
 # ==== 環境変数 ====
 MAX_KEYWORD_DIRS = int(os.getenv("MAX_KEYWORD_DIRS", "50"))
 MAX_IMAGES = int(os.getenv("MAX_IMAGES", "20000"))
+# Directory listings in flight at once; on network mounts every readdir is a
+# round trip, so walks scale with this rather than with CPU
+WALK_WORKERS = int(os.getenv("FIND_WALK_WORKERS", "8"))
 
 
 def is_hidden_like(p: Path) -> bool:
@@ -55,33 +60,138 @@ def default_roots() -> List[Path]:
     return uniq
 
 
+def list_dir_entries(cur: Path, include_hidden: bool, skip_dirnames: Set[str]) -> Tuple[List[Path], List[str]]:
+    """(subdirectories to descend into, sorted by name; file names) of cur."""
+    subdirs: List[Path] = []
+    files: List[str] = []
+    with os.scandir(cur) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if not is_dir:
+                files.append(entry.name)
+                continue
+            # Like os.walk(followlinks=False): symlinked dirs are not entered
+            if entry.is_symlink() or entry.name.lower() in skip_dirnames:
+                continue
+            dp = cur / entry.name
+            if not include_hidden and is_hidden_like(dp):
+                continue
+            subdirs.append(dp)
+    subdirs.sort(key=lambda p: p.name)
+    return subdirs, files
+
+
+class _Node:
+    __slots__ = ("path", "future", "children")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.future: Optional[Future] = None
+        self.children: Optional[List["_Node"]] = None
+
+
+def walk_dirs(
+    roots: List[Path],
+    include_hidden: bool,
+    skip_dirnames: Set[str],
+    should_stop: Optional[Callable[[], bool]] = None,
+    workers: Optional[int] = None,
+    list_dir: Optional[Callable[[Path], Tuple[List[Path], Any]]] = None,
+) -> Iterator[Tuple[Path, Any]]:
+    """
+    Yield (dir, file names) for roots and their subdirectories, depth-first
+    with subdirectories in name order. The order never depends on timing.
+    list_dir replaces the directory listing: it returns (subdirectories in
+    name order, whatever is yielded with the dir instead of the file names).
+
+    Listings run on a thread pool ahead of the walk: the next directories in
+    walk order, plus the subdirectories of every listing that comes back,
+    up to workers * 16 listings not yet consumed, so a walk over a
+    high-latency mount keeps up to `workers` readdir calls in flight.
+    Stopping early (limit reached, should_stop) cancels what has not
+    started.
+    """
+    workers = max(1, WALK_WORKERS if workers is None else workers)
+    budget = workers * 16
+    lock = threading.RLock()
+    ahead = 0
+    stopped = False
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="walk")
+
+    def submit(node: _Node) -> None:
+        nonlocal ahead
+        ahead += 1
+        if list_dir is None:
+            node.future = pool.submit(list_dir_entries, node.path, include_hidden, skip_dirnames)
+        else:
+            node.future = pool.submit(list_dir, node.path)
+        node.future.add_done_callback(lambda _, node=node: on_listed(node))
+
+    def expand(node: _Node) -> List[_Node]:
+        if node.children is None:
+            try:
+                subdirs, _ = node.future.result()
+            except OSError:
+                subdirs = []
+            node.children = [_Node(d) for d in subdirs]
+        return node.children
+
+    def on_listed(node: _Node) -> None:
+        with lock:
+            if stopped:
+                return
+            for child in expand(node):
+                if ahead >= budget:
+                    break
+                if child.future is None:
+                    submit(child)
+
+    # next directory on top
+    stack = [_Node(root) for root in reversed(roots)]
+    try:
+        while stack:
+            if should_stop is not None and should_stop():
+                return
+            with lock:
+                for node in stack[-workers:]:
+                    if node.future is None:
+                        submit(node)
+            node = stack.pop()
+            try:
+                _, files = node.future.result()
+            except OSError:
+                files = None
+            with lock:
+                ahead -= 1
+                children = expand(node)
+            if files is None:
+                continue
+            yield node.path, files
+            stack.extend(reversed(children))
+    finally:
+        with lock:
+            stopped = True
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
 def find_keyword_dirs(
     roots: List[Path],
     keyword: str,
     include_hidden: bool,
     skip_dirnames: Set[str],
+    should_stop: Optional[Callable[[], bool]] = None,
 ) -> List[Path]:
     keyword_lower = keyword.lower()
     hits: List[Path] = []
 
-    for root in roots:
-        for dirpath, dirnames, _ in os.walk(root, followlinks=False):
-            cur = Path(dirpath)
-
-            filtered = []
-            for d in dirnames:
-                dp = cur / d
-                if d.lower() in skip_dirnames:
-                    continue
-                if not include_hidden and is_hidden_like(dp):
-                    continue
-                filtered.append(d)
-            dirnames[:] = filtered
-
-            if keyword_lower in str(cur).lower():
-                hits.append(cur)
-                if len(hits) >= MAX_KEYWORD_DIRS:
-                    return hits
+    for cur, _ in walk_dirs(roots, include_hidden, skip_dirnames, should_stop):
+        if keyword_lower in str(cur).lower():
+            hits.append(cur)
+            if len(hits) >= MAX_KEYWORD_DIRS:
+                return hits
 
     return hits
 
@@ -90,37 +200,74 @@ def count_media_by_directory(
     dirs: List[Path],
     include_hidden: bool,
     skip_dirnames: Set[str],
+    should_stop: Optional[Callable[[], bool]] = None,
 ) -> Dict[Path, int]:
     counts: Dict[Path, int] = defaultdict(int)
     total_media = 0
 
-    for base in dirs:
-        for dirpath, dirnames, filenames in os.walk(base, followlinks=False):
-            cur = Path(dirpath)
-
-            filtered = []
-            for d in dirnames:
-                dp = cur / d
-                if d.lower() in skip_dirnames:
-                    continue
-                if not include_hidden and is_hidden_like(dp):
-                    continue
-                filtered.append(d)
-            dirnames[:] = filtered
-
-            for fn in filenames:
-                fp = cur / fn
-                if not include_hidden and is_hidden_like(fp):
-                    continue
-                if fp.suffix.lower() in MEDIA_EXTS:
-                    counts[cur] += 1
-                    total_media += 1
-                    if total_media >= MAX_IMAGES:
-                        return counts
+    # All bases in one walk, so listings are prefetched across them too
+    for cur, filenames in walk_dirs(dirs, include_hidden, skip_dirnames, should_stop):
+        for fn in filenames:
+            fp = cur / fn
+            if not include_hidden and is_hidden_like(fp):
+                continue
+            if fp.suffix.lower() in MEDIA_EXTS:
+                counts[cur] += 1
+                total_media += 1
+                if total_media >= MAX_IMAGES:
+                    return counts
 
     return counts
 
 
+def search(
+    keyword: str,
+    roots: Optional[List[str]] = None,
+    include_hidden: bool = False,
+    no_default_skip: bool = False,
+    should_stop: Optional[Callable[[], bool]] = None,
+    index: Any = None,
+) -> Dict[str, Any]:
+    """
+    Directories matching keyword and their media counts, as plain data.
+    should_stop is polled once per directory; when it returns True the walk
+    ends early and the partial result is marked cancelled.
+
+    With a dir_index.DirIndex the answer comes from the index. Roots it does
+    not cover yet are indexed first, which costs one walk. The index follows
+    the default hidden/skip rules, so include_hidden / no_default_skip
+    queries always walk.
+    """
+    skip = set() if no_default_skip else set(DEFAULT_SKIP_DIRNAMES)
+    root_paths = [Path(r).expanduser().resolve() for r in roots] if roots else default_roots()
+    root_paths = [r for r in root_paths if r.exists()]
+
+    indexed = index is not None and not include_hidden and not no_default_skip
+    if indexed:
+        for root in root_paths:
+            if not index.covers(root):
+                index.refresh(root, should_stop)
+        keyword_dirs = [Path(p) for p in index.find(keyword, root_paths, MAX_KEYWORD_DIRS)]
+        counts = {Path(p): c for p, c in index.media_counts([str(d) for d in keyword_dirs], MAX_IMAGES).items()}
+    else:
+        keyword_dirs = find_keyword_dirs(root_paths, keyword, include_hidden, skip, should_stop)
+        counts = count_media_by_directory(keyword_dirs, include_hidden, skip, should_stop) if keyword_dirs else {}
+    total = sum(counts.values())
+    return {
+        "keyword": keyword,
+        "roots": [str(r) for r in root_paths],
+        "matched_dirs": [str(d) for d in keyword_dirs],
+        "media_counts": [{"dir": str(d), "count": c} for d, c in sorted(counts.items(), key=lambda x: x[0])],
+        "total_media": total,
+        "max_keyword_dirs": MAX_KEYWORD_DIRS,
+        "max_images": MAX_IMAGES,
+        "dirs_truncated": len(keyword_dirs) >= MAX_KEYWORD_DIRS,
+        "media_truncated": total >= MAX_IMAGES,
+        "cancelled": bool(should_stop is not None and should_stop()),
+        "indexed": indexed,
+    }
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(
         description="Count images per directory by forcing a directory keyword."
@@ -129,44 +276,40 @@ def main() -> int:
     parser.add_argument("--roots", nargs="*", default=[], help="Optional search roots")
     parser.add_argument("--include-hidden", action="store_true", help="Include dot files/dirs")
     parser.add_argument("--no-default-skip", action="store_true", help="Do not skip common system dirs")
+    parser.add_argument("--index", help="Answer from (and refresh) this dir_index.py index file")
     args = parser.parse_args()
 
-    skip = set() if args.no_default_skip else set(DEFAULT_SKIP_DIRNAMES)
-    roots = [Path(r).expanduser().resolve() for r in args.roots] if args.roots else default_roots()
-    roots = [r for r in roots if r.exists()]
-
     print(f"[INFO] MAX_KEYWORD_DIRS={MAX_KEYWORD_DIRS}, MAX_IMAGES={MAX_IMAGES}")
 
-    keyword_dirs = find_keyword_dirs(
-        roots=roots,
-        keyword=args.keyword,
-        include_hidden=args.include_hidden,
-        skip_dirnames=skip,
-    )
-
-    if not keyword_dirs:
+    index = None
+    if args.index:
+        from dir_index import DirIndex
+
+        index = DirIndex(Path(args.index))
+        for root in [Path(r).expanduser().resolve() for r in args.roots] or default_roots():
+            if root.exists():
+                index.refresh(root)
+    try:
+        result = search(args.keyword, args.roots, args.include_hidden, args.no_default_skip, index=index)
+    finally:
+        if index is not None:
+            index.close()
+
+    if not result["matched_dirs"]:
         print(f'[INFO] No directories matched keyword="{args.keyword}"')
         return 0
 
-    print(f'[INFO] Matched {len(keyword_dirs)} directories by keyword="{args.keyword}"')
-
-    counts = count_media_by_directory(
-        dirs=keyword_dirs,
-        include_hidden=args.include_hidden,
-        skip_dirnames=skip,
-    )
+    print(f'[INFO] Matched {len(result["matched_dirs"])} directories by keyword="{args.keyword}"')
 
-    if not counts:
+    if not result["media_counts"]:
         print("[RESULT] No media files found.")
         return 0
 
     print("\n[RESULT] Media file count by directory:")
-    total = 0
-    for d, c in sorted(counts.items(), key=lambda x: x[0]):
-        print(f"{d} : {c}")
-        total += c
+    for entry in result["media_counts"]:
+        print(f"{entry['dir']} : {entry['count']}")
 
-    print(f"\n[SUMMARY] Total media files counted: {total}")
+    print(f"\n[SUMMARY] Total media files counted: {result['total_media']}")
     return 0
 
 
@@ -0,0 +1,136 @@
+"""
+Batched Firestore writes for import_photos.
+
+BatchedWriter queues set() calls and commits them as WriteBatch requests of
+up to 500 ops, flushing when the batch is full or when the oldest queued op
+is older than flush_interval_sec. A WriteBatch is atomic, so when a commit
+fails its ops are retried one by one to find out which documents actually
+failed; those are reported per document instead of failing the whole run.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+MAX_BATCH_OPS = 500
+
+WriteCallback = Callable[[Optional[BaseException]], None]
+
+
+class BatchedWriter:
+    def __init__(
+        self,
+        db,
+        max_ops: int = MAX_BATCH_OPS,
+        flush_interval_sec: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+        stats=None,
+    ):
+        self.db = db
+        self.stats = stats
+        self.max_ops = max(1, min(max_ops, MAX_BATCH_OPS))
+        self.flush_interval_sec = flush_interval_sec
+        self._clock = clock
+        self._ops: List[Tuple[str, str, Dict[str, Any], bool, Optional[WriteCallback]]] = []
+        self._oldest: Optional[float] = None
+        self.commits = 0
+        self.written = 0
+        self.failures: List[Tuple[str, BaseException]] = []
+
+    def set(
+        self,
+        collection: str,
+        doc_id: str,
+        data: Dict[str, Any],
+        merge: bool = True,
+        callback: Optional[WriteCallback] = None,
+    ) -> None:
+        """Queue a set(); callback(None) or callback(exc) runs after commit."""
+        if not self._ops:
+            self._oldest = self._clock()
+        self._ops.append((collection, doc_id, data, merge, callback))
+        if len(self._ops) >= self.max_ops:
+            self.flush()
+        else:
+            self.maybe_flush()
+
+    def maybe_flush(self) -> None:
+        """
+        Flush if the oldest queued op is older than flush_interval_sec. set()
+        checks this too; loops that can go a while without a set() (waiting
+        on renders, watching for files) call it so queued ops do not wait
+        for the next one.
+        """
+        if self._ops and self._clock() - self._oldest >= self.flush_interval_sec:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._ops:
+            return
+        ops, self._ops, self._oldest = self._ops, [], None
+        batch = self.db.batch()
+        for collection, doc_id, data, merge, _ in ops:
+            batch.set(self.db.collection(collection).document(doc_id), data, merge=merge)
+        started = time.perf_counter()
+        try:
+            batch.commit()
+        except Exception:
+            self._commit_one_by_one(ops)
+        else:
+            if self.stats is not None:
+                self.stats.record("doc_write", time.perf_counter() - started)
+            self.commits += 1
+            self.written += len(ops)
+            for op in ops:
+                if op[4] is not None:
+                    op[4](None)
+
+    def _commit_one_by_one(self, ops) -> None:
+        for collection, doc_id, data, merge, callback in ops:
+            started = time.perf_counter()
+            try:
+                self.db.collection(collection).document(doc_id).set(data, merge=merge)
+                if self.stats is not None:
+                    self.stats.record("doc_write", time.perf_counter() - started)
+            except Exception as exc:
+                self.failures.append((f"{collection}/{doc_id}", exc))
+                if callback is not None:
+                    callback(exc)
+                continue
+            self.commits += 1
+            self.written += 1
+            if callback is not None:
+                callback(None)
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "BatchedWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def _get_all_chunked(db, collection: str, doc_ids: Iterable[str], chunk_size: int, field_paths=None):
+    ids = list(dict.fromkeys(doc_ids))
+    col = db.collection(collection)
+    for i in range(0, len(ids), chunk_size):
+        refs = [col.document(doc_id) for doc_id in ids[i : i + chunk_size]]
+        for snap in db.get_all(refs, field_paths=field_paths):
+            if snap.exists:
+                yield snap
+
+
+def get_existing(db, collection: str, doc_ids: Iterable[str], chunk_size: int = 300) -> Dict[str, Dict[str, Any]]:
+    """Fetch existing docs by id with batched get_all calls: {doc_id: data}."""
+    return {snap.id: snap.to_dict() or {} for snap in _get_all_chunked(db, collection, doc_ids, chunk_size)}
+
+
+def existing_doc_ids(db, collection: str, doc_ids: Iterable[str], chunk_size: int = 300) -> Set[str]:
+    """
+    Resolve which doc ids exist with batched get_all calls. An empty field
+    mask is requested so only document names come back, not their fields.
+    """
+    return {snap.id for snap in _get_all_chunked(db, collection, doc_ids, chunk_size, field_paths=[])}
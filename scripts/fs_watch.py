@@ -0,0 +1,343 @@
+"""
+Watch a directory tree for new or rewritten files (import_photos --watch).
+
+On Linux the tree is watched with inotify (through ctypes, no extra
+package). Every directory gets a watch, and a file is reported when it is
+closed after writing or moved in. New directories are watched as they
+appear; the files already inside them are reported too, because they may
+have been written before the watch was added. inotify misses changes
+made by other machines on network mounts (CIFS/SMB, NFS), so those mounts,
+other platforms and hosts over the inotify watch limit use a polling
+scanner instead. It stats every known directory and lists again only the
+ones whose mtime changed.
+
+Either way, reported files go through a Debouncer. A file is handed out
+once its size and mtime have not changed for settle_sec, so a photo still
+being copied is imported once, when the copy is complete.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then len bytes of name
+
+# Mounts where inotify does not see changes made by other hosts
+NETWORK_FSTYPES = {
+    "cifs", "smb3", "smbfs", "nfs", "nfs4", "9p", "afs", "ceph", "glusterfs",
+    "fuse.sshfs", "fuse.rclone", "davfs",
+}
+# Directory mtimes this recent are not trusted: coarse timestamps could hide
+# a second change in the same tick
+MTIME_SETTLE_NS = 2_000_000_000
+
+Include = Callable[[Path], bool]
+FileSig = Tuple[int, int]  # (size, mtime_ns)
+
+
+def _file_sig(path: Path) -> Optional[FileSig]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def mount_fstype(path: Path, mounts_file: str = "/proc/self/mounts") -> Optional[str]:
+    """File system type of the mount holding path (Linux), or None."""
+    try:
+        with open(mounts_file, encoding="utf-8") as fh:
+            lines = fh.read().splitlines()
+    except OSError:
+        return None
+    target = str(path)
+    best, fstype = "", None
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        mount_point = fields[1].replace("\\040", " ")
+        prefix = mount_point.rstrip("/") + "/"
+        if (target == mount_point or target.startswith(prefix)) and len(mount_point) >= len(best):
+            best, fstype = mount_point, fields[2]
+    return fstype
+
+
+class Debouncer:
+    """Hold reported paths until their size and mtime stop changing."""
+
+    def __init__(self, settle_sec: float, clock: Callable[[], float] = time.monotonic):
+        self.settle_sec = settle_sec
+        self._clock = clock
+        self._pending: Dict[Path, Tuple[Optional[FileSig], float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, paths: List[Path]) -> None:
+        now = self._clock()
+        for path in paths:
+            self._pending[path] = (_file_sig(path), now)
+
+    def ready(self) -> List[Path]:
+        now = self._clock()
+        done: List[Path] = []
+        for path, (sig, since) in list(self._pending.items()):
+            current = _file_sig(path)
+            if current is None:
+                del self._pending[path]  # deleted (or renamed away) before it settled
+            elif current != sig:
+                self._pending[path] = (current, now)
+            elif now - since >= self.settle_sec:
+                del self._pending[path]
+                done.append(path)
+        return sorted(done)
+
+
+class InotifyWatcher:
+    kind = "inotify"
+
+    def __init__(self, base: Path, include: Include):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._base = str(base)
+        self._include = include
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._paths: Dict[int, str] = {}
+        try:
+            self._watch_tree(self._base)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, top: str) -> List[Path]:
+        """Watch top and its subdirectories; returns the files already in them."""
+        found: List[Path] = []
+        for dirpath, _, filenames in os.walk(top, followlinks=False):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOSPC, errno.ENOMEM):
+                    raise OSError(err, f"inotify watch limit reached at {dirpath!r} (fs.inotify.max_user_watches)")
+                continue  # vanished or unreadable; the walk skips it too
+            self._paths[wd] = dirpath
+            found.extend(p for p in (Path(dirpath, name) for name in filenames) if self._include(p))
+        return found
+
+    def _unwatch_tree(self, top: str) -> None:
+        prefix = top.rstrip(os.sep) + os.sep
+        for wd, path in list(self._paths.items()):
+            if path == top or path.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._paths[wd]
+
+    def poll(self, timeout_sec: float) -> List[Path]:
+        readable, _, _ = select.select([self._fd], [], [], max(0.0, timeout_sec))
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        changed: List[Path] = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, name_len = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size : offset + _EVENT.size + name_len].rstrip(b"\0")
+            offset += _EVENT.size + name_len
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: resync by reporting every file once more
+                self._unwatch_tree(self._base)
+                changed.extend(self._watch_tree(self._base))
+                continue
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            parent = self._paths.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.extend(self._watch_tree(path))
+                elif mask & IN_MOVED_FROM:
+                    self._unwatch_tree(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self._include(Path(path)):
+                changed.append(Path(path))
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    kind = "poll"
+
+    def __init__(
+        self,
+        base: Path,
+        include: Include,
+        interval_sec: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._base = str(base)
+        self._include = include
+        self.interval_sec = interval_sec
+        self._clock = clock
+        self._sleep = sleep
+        self._mtimes: Dict[str, int] = {}
+        self._files: Dict[str, Dict[str, FileSig]] = {}
+        self._subdirs: Dict[str, List[str]] = {}
+        self._scan(None)
+        self._next = clock() + interval_sec
+
+    def _forget(self, top: str) -> None:
+        prefix = top.rstrip(os.sep) + os.sep
+        for table in (self._mtimes, self._files, self._subdirs):
+            for path in [p for p in table if p == top or p.startswith(prefix)]:
+                del table[path]
+
+    def _list(self, cur: str) -> Tuple[Dict[str, FileSig], List[str]]:
+        files: Dict[str, FileSig] = {}
+        subdirs: List[str] = []
+        with os.scandir(cur) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file() and self._include(Path(entry.path)):
+                        st = entry.stat()
+                        files[entry.name] = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue
+        return files, subdirs
+
+    def _scan(self, changed: Optional[List[Path]]) -> None:
+        stack = [self._base]
+        while stack:
+            cur = stack.pop()
+            try:
+                mtime_ns = os.stat(cur).st_mtime_ns
+            except OSError:
+                self._forget(cur)
+                continue
+            if self._mtimes.get(cur) == mtime_ns:
+                stack.extend(self._subdirs.get(cur, []))
+                continue
+            try:
+                files, subdirs = self._list(cur)
+            except OSError:
+                self._forget(cur)
+                continue
+            if changed is not None:
+                old = self._files.get(cur, {})
+                changed.extend(Path(cur, name) for name, sig in files.items() if old.get(name) != sig)
+            for gone in set(self._subdirs.get(cur, [])) - set(subdirs):
+                self._forget(gone)
+            self._mtimes[cur] = -1 if time.time_ns() - mtime_ns < MTIME_SETTLE_NS else mtime_ns
+            self._files[cur] = files
+            self._subdirs[cur] = subdirs
+            stack.extend(subdirs)
+
+    def poll(self, timeout_sec: float) -> List[Path]:
+        wait = self._next - self._clock()
+        if wait > 0:
+            self._sleep(min(timeout_sec, wait))
+            if self._clock() < self._next:
+                return []
+        changed: List[Path] = []
+        self._scan(changed)
+        self._next = self._clock() + self.interval_sec
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def open_watcher(
+    base: Path,
+    include: Include,
+    mode: str = "auto",
+    poll_sec: float = 5.0,
+    log: Optional[Callable[[str], None]] = None,
+):
+    """inotify when it can see the changes ("auto"), or the given mode ("inotify" / "poll")."""
+    if mode not in {"auto", "inotify", "poll"}:
+        raise ValueError(f"unknown watch mode: {mode!r}")
+    if mode != "poll":
+        fstype = mount_fstype(base)
+        if mode == "auto" and fstype in NETWORK_FSTYPES:
+            if log is not None:
+                log(f"watch fstype={fstype} is a network mount, polling every {poll_sec}s")
+        else:
+            try:
+                return InotifyWatcher(base, include)
+            except OSError as exc:
+                if mode == "inotify":
+                    raise
+                if log is not None:
+                    log(f"watch inotify unavailable ({exc}), polling every {poll_sec}s")
+    return PollingWatcher(base, include, poll_sec)
+
+
+def watch(
+    base: Path,
+    include: Include,
+    settle_sec: float = 2.0,
+    poll_sec: float = 5.0,
+    mode: str = "auto",
+    should_stop: Optional[Callable[[], bool]] = None,
+    log: Optional[Callable[[str], None]] = None,
+    watcher=None,
+    on_poll: Optional[Callable[[], None]] = None,
+) -> Iterator[List[Path]]:
+    """
+    Yield batches of files under base that were added or rewritten and have
+    settled. watcher is one already opened with open_watcher (it is closed
+    here): open it before an initial scan, and files written during the scan
+    are reported too. on_poll runs after every poll, about once a second
+    while nothing changes.
+    """
+    if watcher is None:
+        watcher = open_watcher(base, include, mode, poll_sec, log)
+    if log is not None:
+        log(f"watch started kind={watcher.kind} base={str(base)!r} settle={settle_sec}s")
+    debouncer = Debouncer(settle_sec)
+    try:
+        while should_stop is None or not should_stop():
+            timeout = max(0.05, min(1.0, settle_sec / 2)) if len(debouncer) else 1.0
+            debouncer.add(watcher.poll(timeout))
+            if on_poll is not None:
+                on_poll()
+            ready = debouncer.ready()
+            if ready:
+                yield ready
+    finally:
+        watcher.close()
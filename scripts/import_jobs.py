@@ -28,6 +28,7 @@ def build_job_payload(
     dry_run: bool,
     requested_by: Optional[str] = None,
     worker_id: Optional[str] = None,
+    shard_photos: Optional[int] = None,
 ) -> Dict[str, Any]:
     if not input_dir or not input_dir.strip():
         raise ValueError("input_dir is required")
@@ -42,6 +43,9 @@ def build_job_payload(
         payload["requestedBy"] = requested_by
     if worker_id:
         payload["workerId"] = worker_id
+    if shard_photos:
+        # The worker plans the import and fans it out into sub-jobs of this size
+        payload["shardPhotos"] = int(shard_photos)
     return payload
 
 
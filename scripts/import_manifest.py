@@ -0,0 +1,251 @@
+"""
+Local SQLite manifest of photos imported by import_photos.
+
+One row per (source path, root path) records the file's size, mtime_ns and
+content hash at import time, the photo doc id, and the storage path and
+parameters of every rendition. A re-run compares the current file and
+rendition specs against the row:
+
+- unchanged: size/mtime_ns match (or the content hash still matches after a
+  touch) and every rendition was built with the same parameters -> skipped
+  without any Firestore/Storage call.
+- changed: the row exists but content or rendition parameters differ -> the
+  photo is re-imported even though its doc exists.
+- new: no row -> the usual remote existence check decides.
+
+The manifest also indexes rendition blobs by (content hash, encode
+parameters). When the same original shows up again under another path or
+root, its renditions are copied server-side from the existing blobs instead
+of being decoded, resized and uploaded again.
+
+Several imports may share one manifest file (import_worker runs jobs side
+by side). Writes are therefore buffered in memory and committed in short
+transactions, every commit_every rows or commit_interval_sec seconds, so
+the write lock is held only for the few milliseconds a commit takes.
+Other connections wait for it up to busy_timeout_sec.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+DEFAULT_MANIFEST_PATH = Path(__file__).with_name("import_manifest.sqlite3")
+
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+NEW = "new"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    source_path TEXT NOT NULL,
+    root_path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT,
+    doc_id TEXT NOT NULL,
+    renditions TEXT NOT NULL,
+    imported_at REAL NOT NULL,
+    PRIMARY KEY (source_path, root_path)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    content_hash TEXT NOT NULL,
+    params TEXT NOT NULL,
+    blob_path TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    PRIMARY KEY (content_hash, params)
+);
+"""
+
+
+def bytes_hash(data: bytes) -> str:
+    """file_hash() of a file whose contents are already in memory."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_hash(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    size: int
+    mtime_ns: int
+    content_hash: Optional[str]
+    doc_id: str
+    renditions: Dict[str, Any]
+
+
+class ImportManifest:
+    def __init__(
+        self,
+        path: Path,
+        commit_every: int = 200,
+        commit_interval_sec: float = 2.0,
+        busy_timeout_sec: float = 30.0,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=busy_timeout_sec)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._commit_every = commit_every
+        self._commit_interval_sec = commit_interval_sec
+        # Buffered writes, visible to lookups before they are committed
+        self._files: Dict[Tuple[str, str], Tuple[Any, ...]] = {}
+        self._touched: Dict[Tuple[str, str], int] = {}
+        self._blobs: Dict[Tuple[str, str], Tuple[str, int, int]] = {}
+        self._first_pending: Optional[float] = None
+
+    def lookup(self, source_path: Path, root_path: str) -> Optional[ManifestEntry]:
+        key = (str(source_path), root_path)
+        row: Optional[Tuple[Any, ...]] = self._files.get(key)
+        if row is not None:
+            row = row[2:7]
+        else:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, content_hash, doc_id, renditions FROM files"
+                " WHERE source_path = ? AND root_path = ?",
+                key,
+            ).fetchone()
+        if row is None:
+            return None
+        mtime_ns = self._touched.get(key, row[1])
+        return ManifestEntry(row[0], mtime_ns, row[2], row[3], json.loads(row[4]))
+
+    def check(
+        self,
+        source_path: Path,
+        root_path: str,
+        st: os.stat_result,
+        doc_id: str,
+        renditions: Dict[str, Any],
+    ) -> str:
+        """Classify a source file as UNCHANGED, CHANGED or NEW."""
+        entry = self.lookup(source_path, root_path)
+        if entry is None:
+            return NEW
+        if entry.doc_id != doc_id or entry.renditions != renditions:
+            return CHANGED
+        if entry.size == st.st_size and entry.mtime_ns == st.st_mtime_ns:
+            return UNCHANGED
+        if entry.content_hash and entry.size == st.st_size and file_hash(source_path) == entry.content_hash:
+            # Touched but identical: remember the new mtime so we don't hash again
+            key = (str(source_path), root_path)
+            if key in self._files:
+                self._files[key] = self._files[key][:3] + (st.st_mtime_ns,) + self._files[key][4:]
+            else:
+                self._touched[key] = st.st_mtime_ns
+            self._maybe_commit()
+            return UNCHANGED
+        return CHANGED
+
+    def record(
+        self,
+        source_path: Path,
+        root_path: str,
+        size: int,
+        mtime_ns: int,
+        content_hash: Optional[str],
+        doc_id: str,
+        renditions: Dict[str, Any],
+    ) -> None:
+        key = (str(source_path), root_path)
+        self._touched.pop(key, None)
+        self._files[key] = key + (
+            size,
+            mtime_ns,
+            content_hash,
+            doc_id,
+            json.dumps(renditions, sort_keys=True),
+            time.time(),
+        )
+        self._maybe_commit()
+
+    def find_blobs(self, content_hash: str, params_keys: Mapping[str, str]) -> Optional[Dict[str, Tuple[str, int, int]]]:
+        """
+        Look up existing rendition blobs for content_hash. params_keys maps a
+        rendition name to its encode parameters; returns {name: (blob_path,
+        width, height)} only if every rendition has an indexed blob.
+        """
+        found: Dict[str, Tuple[str, int, int]] = {}
+        for name, params in params_keys.items():
+            row = self._blobs.get((content_hash, params))
+            if row is None:
+                row = self._conn.execute(
+                    "SELECT blob_path, width, height FROM blobs WHERE content_hash = ? AND params = ?",
+                    (content_hash, params),
+                ).fetchone()
+            if row is None:
+                return None
+            found[name] = (row[0], row[1], row[2])
+        return found
+
+    def record_blob(self, content_hash: str, params: str, blob_path: str, size: Tuple[int, int]) -> None:
+        self._blobs[(content_hash, params)] = (blob_path, size[0], size[1])
+        self._maybe_commit()
+
+    def forget_blobs(self, content_hash: str) -> None:
+        """Drop index rows whose blobs turned out to be missing."""
+        for key in [k for k in self._blobs if k[0] == content_hash]:
+            del self._blobs[key]
+        self.commit()
+        with self._conn:
+            self._conn.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+
+    def _maybe_commit(self) -> None:
+        now = time.monotonic()
+        if self._first_pending is None:
+            self._first_pending = now
+        pending = len(self._files) + len(self._touched) + len(self._blobs)
+        if pending >= self._commit_every or now - self._first_pending >= self._commit_interval_sec:
+            self.commit()
+
+    def commit(self) -> None:
+        """Write the buffered rows in one short transaction."""
+        if self._files or self._touched or self._blobs:
+            files: List[Tuple[Any, ...]] = list(self._files.values())
+            touched = [(mtime_ns,) + key for key, mtime_ns in self._touched.items()]
+            blobs = [key + row for key, row in self._blobs.items()]
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO files"
+                    " (source_path, root_path, size, mtime_ns, content_hash, doc_id, renditions, imported_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    files,
+                )
+                self._conn.executemany(
+                    "UPDATE files SET mtime_ns = ? WHERE source_path = ? AND root_path = ?", touched
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO blobs (content_hash, params, blob_path, width, height)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    blobs,
+                )
+            self._files.clear()
+            self._touched.clear()
+            self._blobs.clear()
+        self._first_pending = None
+
+    def close(self) -> None:
+        self.commit()
+        self._conn.close()
+
+    def __enter__(self) -> "ImportManifest":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
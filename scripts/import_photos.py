@@ -4,17 +4,24 @@ Import a local photo folder structure into Firestore + Firebase Storage.
 
 What it does:
 - Walks a local directory, builds folder documents in Firestore.
-- Generates and uploads two resized images per photo:
+- Generates and uploads two resized images per photo (see renditions.py):
   - thumb: long edge 256px  -> stored at photos/<rel>/thumb/<filename>
   - medium: long edge 1280px -> stored at photos/<rel>/medium/<filename>
-- Creates photo documents pointing to the Storage paths.
+  Each source is decoded once; the thumb is downscaled from the medium.
+  Sizes/formats/quality/byte budget are configurable with --rendition
+  (e.g. --rendition medium:1280:webp:80:200k).
+- Creates photo documents pointing to the Storage paths, with the capture
+  time read from the EXIF header.
 
 Expected Firestore schema:
 - collection: folders
   { id, name, path, parentPath, order?, createdAt? }
 - collection: photos
-  { id, fileName, folderPath, thumbPath, mediumPath, width, height,
-    capturedAt?, createdAt, order? }
+  { id, fileName, folderPath, thumbPath, mediumPath, thumbFormat,
+    mediumFormat, width, height, capturedAt, year?, month?, day?,
+    createdAt, order? }
+  capturedAt/year/month/day come from EXIF (see photo_metadata.py); the
+  composite indexes for date queries are in firestore.indexes.json.
 
 Prereqs (install):
   pip install firebase-admin Pillow
@@ -26,35 +33,192 @@ Auth:
 from __future__ import annotations
 
 import argparse
+import functools
+import itertools
+import json
+import os
 import sys
 import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import datetime
 from io import BytesIO
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 import firebase_admin
 from firebase_admin import credentials, firestore, storage
 from PIL import Image
-from pillow_heif import register_heif_opener
 
-register_heif_opener()
+import fs_watch
+from firestore_batch import BatchedWriter, existing_doc_ids, get_existing
+from import_manifest import CHANGED, DEFAULT_MANIFEST_PATH, NEW, UNCHANGED, ImportManifest, bytes_hash, file_hash
+from import_pipeline import UploadStage, bounded_map, limit_process_memory
+from import_stats import ImportStats
+from job_ledger import JobLedger
+from photo_metadata import capture_fields, capture_time_from_image, read_capture_time
+from renditions import (
+    DEFAULT_RENDITIONS,
+    FORMATS,
+    Rendition,
+    RenditionSpec,
+    SourceTooLarge,
+    merge_rendition_specs,
+    parse_rendition_spec,
+    render_source,
+    set_decode_ceiling,
+)
 
 BASE_DIR = Path(__file__).resolve().parents[1]
 SERVICE_ACCOUNT_PATH = BASE_DIR / "mikkikicom-firebase-adminsdk-fbsvc-06bdbf6b0d.json"
 STORAGE_BUCKET = "mikkikicom.firebasestorage.app"
 
+# ~1.2 GB of RGB pixels; JPEG sources are measured after draft scaling
+DEFAULT_MAX_DECODE_MPIX = 400.0
+
+# Sources up to this size are read once: hashed and then decoded from memory
+HASH_BUFFER_MAX_BYTES = 256 << 20
+
 
 def elog(msg: str):
     sys.stderr.write(f"[import_photos] {time.strftime('%H:%M:%S')} {msg}\n")
     sys.stderr.flush()
 
 
-def parse_args():
+def parse_args(argv: Optional[Sequence[str]] = None):
     p = argparse.ArgumentParser(description="scan and create lightweight images optimized for viewing on smartphones and upload them to Firebase Storage")
     p.add_argument("--input-dir", required=True, help="Local folder to scan (images only)")
     p.add_argument("--root-path", required=True, help="Virtual root path prefix in Firestore (e.g. /2024)")
     p.add_argument("--dry-run", action="store_true", help="Do not write to Firestore/Storage")
-    return p.parse_args()
+    p.add_argument(
+        "--rendition",
+        action="append",
+        default=[],
+        metavar="NAME:LONG_EDGE[:FORMAT[:QUALITY[:MAX_BYTES]]]",
+        help=(
+            "Override or add a rendition (default: thumb:256:jpeg:90 and medium:1280:jpeg:90). "
+            f"FORMAT: {', '.join(sorted(FORMATS))}. MAX_BYTES (e.g. 200k) lowers quality until "
+            "the output fits. Repeatable."
+        ),
+    )
+    p.add_argument(
+        "--no-previews",
+        action="store_true",
+        help="Always decode the full image instead of rendering from embedded MPF/EXIF/HEIF previews",
+    )
+    p.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes used for decode/resize/encode (default 1 = in-process)",
+    )
+    p.add_argument(
+        "--max-pending",
+        type=int,
+        default=0,
+        help="Photos queued ahead of the uploader when --workers > 1 (default 2 x workers)",
+    )
+    p.add_argument(
+        "--max-decode-mpix",
+        type=float,
+        default=DEFAULT_MAX_DECODE_MPIX,
+        help=(
+            "Reject sources whose decoded size (after JPEG draft scaling; other formats at full size) "
+            "exceeds this many megapixels "
+            f"(default {DEFAULT_MAX_DECODE_MPIX:g}, 0 = no limit)"
+        ),
+    )
+    p.add_argument(
+        "--worker-memory-mb",
+        type=int,
+        default=0,
+        help="Address-space limit per render worker process (Unix, --workers > 1); a photo that hits it fails alone",
+    )
+    p.add_argument(
+        "--upload-concurrency",
+        type=int,
+        default=8,
+        help="Concurrent Storage uploads sharing one pooled HTTP transport (default 8)",
+    )
+    p.add_argument("--upload-retries", type=int, default=3, help="Retries per blob upload (default 3)")
+    p.add_argument(
+        "--manifest",
+        default=str(DEFAULT_MANIFEST_PATH),
+        help=f"Local SQLite manifest of imported files (default: {DEFAULT_MANIFEST_PATH.name} next to this script)",
+    )
+    p.add_argument("--no-manifest", action="store_true", help="Ignore the local manifest and check Firestore for every photo")
+    p.add_argument("--job-id", default="", help="Import job ID; checkpoints progress so a rerun of the same job resumes")
+    p.add_argument(
+        "--jobs-collection",
+        default="importJobs",
+        help="Firestore collection holding import job docs (default importJobs)",
+    )
+    p.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between progress checkpoints when --job-id is set (default 10)",
+    )
+    p.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Firestore writes per batch commit (max 500)",
+    )
+    p.add_argument(
+        "--batch-interval",
+        type=float,
+        default=2.0,
+        help="Commit queued Firestore writes at least every N seconds (default 2)",
+    )
+    p.add_argument(
+        "--stats-json",
+        help="Write per-stage timings and counters as JSON to this file at the end ('-' = stdout)",
+    )
+    p.add_argument(
+        "--progress-interval",
+        type=float,
+        default=0.0,
+        help="Emit JSONL progress events with the running stats on stderr every N seconds (default off)",
+    )
+    p.add_argument(
+        "--shard-file",
+        help="Import only the folder slices listed in this JSON file (a sub-job shard from import_plan.py)",
+    )
+    p.add_argument(
+        "--watch",
+        action="store_true",
+        help="After the import, keep watching --input-dir and import new or rewritten photos (Ctrl+C to stop)",
+    )
+    p.add_argument(
+        "--watch-mode",
+        choices=["auto", "inotify", "poll"],
+        default="auto",
+        help="auto (default): inotify, or polling on network mounts (CIFS/NFS) and where inotify is unavailable",
+    )
+    p.add_argument(
+        "--watch-settle",
+        type=float,
+        default=2.0,
+        help="Seconds a new file's size/mtime must stay unchanged before it is imported (default 2)",
+    )
+    p.add_argument("--watch-poll", type=float, default=5.0, help="Seconds between rescans when polling (default 5)")
+    args = p.parse_args(argv)
+    if args.watch and args.shard_file:
+        p.error("--watch cannot be combined with --shard-file")
+    if args.upload_concurrency < 1:
+        p.error("--upload-concurrency must be >= 1")
+    if args.workers < 1:
+        p.error("--workers must be >= 1")
+    if args.max_pending <= 0:
+        args.max_pending = 2 * args.workers
+    try:
+        args.renditions = merge_rendition_specs(parse_rendition_spec(r) for r in args.rendition)
+    except ValueError as exc:
+        p.error(str(exc))
+    return args
 
 
 def init_firebase():
@@ -69,16 +233,6 @@ def is_image(path: Path) -> bool:
     return path.suffix.lower() in {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff", ".heic", ".heif"}
 
 
-def resize_image(src_path: Path, long_edge: int) -> Tuple[BytesIO, Tuple[int, int]]:
-    with Image.open(src_path) as im:
-        im = im.convert("RGB")
-        im.thumbnail((long_edge, long_edge), Image.LANCZOS)
-        buf = BytesIO()
-        im.save(buf, format="JPEG", quality=90)
-        buf.seek(0)
-        return buf, im.size
-
-
 def normalize_path(path: str) -> str:
     if not path:
         return ""
@@ -104,119 +258,649 @@ def validate_virtual_root(root_path: str):
         )
 
 
-def ensure_folder_docs(db, folders: List[Dict], dry_run: bool):
+FOLDER_FIELDS = ("name", "path", "parentPath", "order")
+
+
+def folder_doc_id(path: str) -> str:
+    return path.lstrip("/").replace("/", "_") or "root"
+
+
+def ensure_folder_docs(db, folders: List[Dict], dry_run: bool, writer: Optional[BatchedWriter] = None):
+    """Write folder docs, skipping ones whose fields are already up to date."""
+    existing = {} if dry_run else get_existing(db, "folders", [folder_doc_id(f["path"]) for f in folders])
+    skipped = 0
     for f in folders:
-        doc_id = f["path"].lstrip("/").replace("/", "_") or "root"
-        data = {
-            "name": f["name"],
-            "path": f["path"],
-            "parentPath": f["parentPath"],
-            "order": f["order"],
-            "createdAt": firestore.SERVER_TIMESTAMP,
-        }
+        doc_id = folder_doc_id(f["path"])
+        data = {k: f[k] for k in FOLDER_FIELDS}
+        current = existing.get(doc_id)
+        if current is not None and all(current.get(k) == data[k] for k in FOLDER_FIELDS):
+            skipped += 1
+            continue
+        if current is None:
+            data["createdAt"] = firestore.SERVER_TIMESTAMP
         if dry_run:
             print(f"[DRY-RUN] folder doc -> folders/{doc_id} {data}")
+        elif writer is not None:
+            writer.set("folders", doc_id, data, merge=True)
         else:
             db.collection("folders").document(doc_id).set(data, merge=True)
+    if skipped:
+        elog(f"folder docs unchanged skipped={skipped}")
 
 
-def upload_and_make_docs(
+def photo_folder_path(root_path: str, rel_dir: str) -> str:
+    return normalize_path("/".join([part for part in [root_path.strip("/"), rel_dir.replace("\\", "/")] if part]))
+
+
+def rendition_path(root_path: str, rel_dir: str, spec: RenditionSpec, file_path: Path) -> str:
+    return "/".join(
+        [p for p in ["photos", root_path.strip("/"), rel_dir.replace("\\", "/"), spec.name, file_path.stem + spec.extension] if p]
+    )
+
+
+@dataclass
+class PhotoTask:
+    file_path: Path
+    rel_dir: str
+    order: int
+    folder_path: str
+    doc_id: str
+    paths: Dict[str, str]
+    size: int = 0
+    mtime_ns: int = 0
+    content_hash: Optional[str] = None
+    # {name: (existing blob path, width, height)} when the content is already in the bucket
+    reuse: Optional[Dict[str, Tuple[str, int, int]]] = None
+    sizes: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    captured_at: Optional[datetime] = None
+    # Source bytes read for hashing, decoded from instead of reading the file again
+    data: Optional[bytes] = None
+
+
+@dataclass
+class RenderedPhoto:
+    renditions: Optional[Dict[str, Rendition]]
+    captured_at: Optional[datetime] = None
+    source: Optional[str] = None  # renditions.SOURCE_*; None when reused
+    error: Optional[str] = None  # set when the source was rejected
+    timings: Dict[str, float] = field(default_factory=dict)  # stage -> seconds, measured in the worker
+
+
+def rendition_params(task: PhotoTask, specs: Sequence[RenditionSpec]) -> Dict[str, Dict]:
+    """What the manifest remembers about how each rendition was built."""
+    return {spec.name: {"path": task.paths[spec.name], **spec.params()} for spec in specs}
+
+
+def iter_photo_tasks(
+    db,
+    items: Iterable[Tuple[Path, str, int]],
+    root_path: str,
+    dry_run: bool,
+    specs: Sequence[RenditionSpec],
+    manifest: Optional[ImportManifest] = None,
+    on_photo_done: Optional[Callable[[PhotoTask], None]] = None,
+    stats: Optional[ImportStats] = None,
+) -> Iterator[PhotoTask]:
+    """Resolve skip decisions one folder at a time as items stream in."""
+    stats = stats or ImportStats()
+    for _, folder_items in itertools.groupby(items, key=lambda item: item[1]):
+        yield from _folder_photo_tasks(
+            db, list(folder_items), root_path, dry_run, specs, manifest, on_photo_done, stats
+        )
+
+
+def _folder_photo_tasks(
     db,
-    bucket,
     items: List[Tuple[Path, str, int]],
     root_path: str,
     dry_run: bool,
-):
-    """
-    items: list of (file_path, rel_dir, order)
-    """
+    specs: Sequence[RenditionSpec],
+    manifest: Optional[ImportManifest],
+    on_photo_done: Optional[Callable[[PhotoTask], None]],
+    stats: ImportStats,
+) -> Iterator[PhotoTask]:
+    candidates: List[Tuple[PhotoTask, bool]] = []
+    counts = {UNCHANGED: 0, CHANGED: 0, NEW: 0}
     for file_path, rel_dir, order in items:
-        folder_path = normalize_path("/".join([part for part in [root_path.strip("/"), rel_dir.replace("\\", "/")] if part]))
-        parent_path = normalize_path("/".join(folder_path.split("/")[:-1])) if folder_path else ""
-        file_name = file_path.name
-        jpg_file_name = file_path.stem + ".jpg"
+        folder_path = photo_folder_path(root_path, rel_dir)
         doc_id = (folder_path.lstrip("/").replace("/", "_") + "_" + file_path.stem).strip("_") or file_path.stem
+        paths = {spec.name: rendition_path(root_path, rel_dir, spec, file_path) for spec in specs}
+        task = PhotoTask(file_path, rel_dir, order, folder_path, doc_id, paths)
+        if manifest is None:
+            candidates.append((task, True))
+            continue
+        with stats.time("manifest_check"):
+            st = file_path.stat()
+            task.size, task.mtime_ns = st.st_size, st.st_mtime_ns
+            state = manifest.check(file_path, root_path, st, doc_id, rendition_params(task, specs))
+        counts[state] += 1
+        if state == UNCHANGED:
+            stats.incr("photos_skipped")
+            if on_photo_done is not None:
+                on_photo_done(task)
+            continue
+        # Changed sources are re-imported even though their doc exists
+        candidates.append((task, state == NEW))
+    if manifest is not None:
+        elog(f"manifest unchanged={counts[UNCHANGED]} changed={counts[CHANGED]} new={counts[NEW]}")
+
+    # Resolve every candidate's photo doc in a few batched reads up front
+    existing = set()
+    to_check = [task.doc_id for task, check in candidates if check]
+    if not dry_run and to_check:
+        with stats.time("exists_check"):
+            existing = existing_doc_ids(db, "photos", to_check)
+        elog(f"photo docs existing={len(existing)} candidates={len(to_check)}")
 
-        # Skip if photo doc already exists
-        if not dry_run and db.collection("photos").document(doc_id).get().exists:
-            print(f"Skipping {file_name}, already exists.")
+    for task, check in candidates:
+        if check and task.doc_id in existing:
+            print(f"Skipping {task.file_path.name}, already exists.")
+            stats.incr("photos_skipped")
+            if manifest is not None:
+                # Imported before the manifest existed: adopt it so the next
+                # run skips it locally. No hash yet; a later touch re-imports.
+                manifest.record(
+                    task.file_path, root_path, task.size, task.mtime_ns, None, task.doc_id, rendition_params(task, specs)
+                )
+            if on_photo_done is not None:
+                on_photo_done(task)
             continue
+        yield task
 
-        thumb_rel = "/".join([p for p in ["photos", root_path.strip("/"), rel_dir.replace("\\", "/"), "thumb", jpg_file_name] if p])
-        medium_rel = "/".join([p for p in ["photos", root_path.strip("/"), rel_dir.replace("\\", "/"), "medium", jpg_file_name] if p])
 
-        # Resize
-        thumb_buf, thumb_size = resize_image(file_path, 256)
-        medium_buf, medium_size = resize_image(file_path, 1280)
+def _read_and_hash(task: PhotoTask) -> Tuple[str, Optional[bytes]]:
+    if task.size > HASH_BUFFER_MAX_BYTES:
+        return file_hash(task.file_path), None
+    data = task.file_path.read_bytes()
+    return bytes_hash(data), data
 
-        if dry_run:
-            print(f"[DRY-RUN] upload thumb -> {thumb_rel} size {thumb_size}")
-            print(f"[DRY-RUN] upload medium -> {medium_rel} size {medium_size}")
-        else:
-            thumb_blob = bucket.blob(thumb_rel)
-            thumb_blob.upload_from_file(thumb_buf, content_type="image/jpeg")
-            medium_blob = bucket.blob(medium_rel)
-            medium_blob.upload_from_file(medium_buf, content_type="image/jpeg")
-
-        data = {
-            "fileName": file_name,
-            "folderPath": folder_path,
-            "thumbPath": thumb_rel,
-            "mediumPath": medium_rel,
-            "width": medium_size[0],
-            "height": medium_size[1],
-            "capturedAt": None,
-            "createdAt": firestore.SERVER_TIMESTAMP,
-            "order": order,
-        }
-        if dry_run:
-            print(f"[DRY-RUN] photo doc -> photos/{doc_id} {data}")
-        else:
-            db.collection("photos").document(doc_id).set(data, merge=True)
 
+def _hash_task(task: PhotoTask, stats: Optional[ImportStats] = None) -> Tuple[str, Optional[bytes]]:
+    """(content hash, source bytes); sources over HASH_BUFFER_MAX_BYTES are streamed, not kept."""
+    if stats is None:
+        return _read_and_hash(task)
+    with stats.time("hash", task.size):
+        return _read_and_hash(task)
 
-def collect_items(base: Path) -> List[Tuple[Path, str]]:
-    items = []
-    for path in sorted(base.rglob("*")):
-        if path.is_file() and is_image(path):
-            rel_dir = str(path.parent.relative_to(base)).replace("\\", "/")
+
+def iter_hashed_tasks(
+    tasks: Iterable[PhotoTask],
+    manifest: ImportManifest,
+    specs: Sequence[RenditionSpec],
+    hasher: Optional[Executor] = None,
+    max_pending: int = 1,
+    stats: Optional[ImportStats] = None,
+) -> Iterator[PhotoTask]:
+    """
+    Hash each source (on hasher threads, if given) and look the content up
+    in the manifest's blob index. Tasks whose renditions already exist in
+    the bucket get task.reuse set and skip decode/resize/upload; the others
+    keep the bytes that were hashed in task.data, so the decoder does not
+    read the file a second time.
+    """
+    params_keys = {spec.name: spec.params_key for spec in specs}
+    hash_task = functools.partial(_hash_task, stats=stats)
+    for task, (content_hash, data) in bounded_map(hash_task, tasks, hasher, max_pending):
+        task.content_hash = content_hash
+        task.reuse = manifest.find_blobs(content_hash, params_keys)
+        if task.reuse is None:
+            task.data = data
+        yield task
+
+
+def max_decode_pixels(mpix: float) -> Optional[int]:
+    """--max-decode-mpix as a pixel count; 0 = no limit (None)."""
+    return int(mpix * 1_000_000) if mpix else None
+
+
+def _init_render_worker(max_bytes: Optional[int], max_pixels: Optional[int]) -> None:
+    """Render pool initializer: memory cap and decode ceiling, once per process."""
+    limit_process_memory(max_bytes)
+    set_decode_ceiling(max_pixels)
+
+
+def _render_task(
+    task: PhotoTask,
+    specs: Sequence[RenditionSpec],
+    use_previews: bool = True,
+    max_pixels: Optional[int] = None,
+) -> RenderedPhoto:
+    """
+    Read the capture time and, unless renditions are reused, render them.
+    Sources over the decode ceiling (or the worker's memory limit) come back
+    with error set instead of raising, so one huge file fails alone.
+    """
+    if task.reuse is not None:
+        started = time.perf_counter()
+        captured_at = read_capture_time(task.file_path)
+        return RenderedPhoto(None, captured_at, timings={"decode": time.perf_counter() - started})
+    timings: Dict[str, float] = {}
+    try:
+        started = time.perf_counter()
+        with Image.open(BytesIO(task.data) if task.data is not None else task.file_path) as im:
+            captured_at = capture_time_from_image(im)
+            timings["decode"] = time.perf_counter() - started
+            renditions, source = render_source(im, specs, use_previews, max_pixels, timings)
+            return RenderedPhoto(renditions, captured_at, source, timings=timings)
+    except (SourceTooLarge, Image.DecompressionBombError, MemoryError) as exc:
+        return RenderedPhoto(None, error=repr(exc))
+
+
+def photo_doc_data(task: PhotoTask, specs: Sequence[RenditionSpec]) -> Dict:
+    medium_size = task.sizes["medium"]
+    data = {
+        "fileName": task.file_path.name,
+        "folderPath": task.folder_path,
+        "thumbPath": task.paths["thumb"],
+        "mediumPath": task.paths["medium"],
+        "width": medium_size[0],
+        "height": medium_size[1],
+        **capture_fields(task.captured_at),
+        "createdAt": firestore.SERVER_TIMESTAMP,
+        "order": task.order,
+    }
+    for spec in specs:
+        data.setdefault(f"{spec.name}Path", task.paths[spec.name])
+        data[f"{spec.name}Format"] = spec.format
+    return data
+
+
+def upload_and_make_docs(
+    db,
+    bucket,
+    items: Iterable[Tuple[Path, str, int]],
+    root_path: str,
+    dry_run: bool,
+    specs: Sequence[RenditionSpec] = DEFAULT_RENDITIONS,
+    executor: Optional[Executor] = None,
+    max_pending: int = 1,
+    uploader: Optional[UploadStage] = None,
+    writer: Optional[BatchedWriter] = None,
+    manifest: Optional[ImportManifest] = None,
+    on_photo_done: Optional[Callable[[PhotoTask], None]] = None,
+    hasher: Optional[Executor] = None,
+    use_previews: bool = True,
+    max_pixels: Optional[int] = None,
+    stats: Optional[ImportStats] = None,
+) -> int:
+    """
+    items: iterable of (file_path, rel_dir, order), grouped by rel_dir
+
+    Decode/resize/encode runs on executor (if given) with at most max_pending
+    photos in flight. Blobs go through the uploader stage concurrently; each
+    photo doc is queued on the batched writer once all of its blobs are
+    stored. Returns the number of photos that failed (upload or doc write);
+    they are left without a doc so a re-run retries them. Successful photos
+    are recorded in the manifest (if given) once their doc is committed.
+    on_photo_done(task) runs for every photo that is finished, whether it
+    was skipped or its doc was committed.
+
+    With a manifest, sources are hashed first (on hasher threads) and
+    content that already has renditions in the bucket is copied server-side
+    instead of being rendered and uploaded again.
+
+    Renditions come from an embedded preview when one is large enough
+    (use_previews); the per-source counts are logged at the end. Sources
+    that would decode to more than max_pixels are rejected and counted as
+    failed.
+
+    Stage timings and counters are recorded on stats (see import_stats.py).
+    """
+    stats = stats or ImportStats()
+    uploading: Deque[Tuple[PhotoTask, List[Future]]] = deque()
+    failed = 0
+
+    def fail() -> None:
+        nonlocal failed
+        failed += 1
+        stats.incr("photos_failed")
+
+    def on_doc_written(task: PhotoTask):
+        def callback(exc: Optional[BaseException]) -> None:
+            if exc is not None:
+                fail()
+                elog(f"photo doc write failed doc=photos/{task.doc_id} error={exc!r}")
+                return
+            stats.incr("photos_imported")
+            if manifest is not None:
+                manifest.record(
+                    task.file_path, root_path, task.size, task.mtime_ns, task.content_hash, task.doc_id,
+                    rendition_params(task, specs),
+                )
+                if task.content_hash:
+                    for spec in specs:
+                        manifest.record_blob(task.content_hash, spec.params_key, task.paths[spec.name], task.sizes[spec.name])
+            if on_photo_done is not None:
+                on_photo_done(task)
+        return callback
+
+    def submit_renditions(task: PhotoTask, rendered: RenderedPhoto) -> List[Future]:
+        task.captured_at = rendered.captured_at
+        encoded = sum(len(r.data) for r in rendered.renditions.values()) if rendered.renditions else 0
+        for stage, seconds in rendered.timings.items():
+            nbytes = {"decode": task.size, "encode": encoded}.get(stage, 0)
+            stats.record(stage, seconds, nbytes)
+        if rendered.source is not None:
+            stats.incr(f"source_{rendered.source}")
+        futures: List[Future] = []
+        for spec in specs:
+            dst = task.paths[spec.name]
+            if rendered.renditions is None:
+                src, width, height = task.reuse[spec.name]
+                task.sizes[spec.name] = (width, height)
+                if dry_run:
+                    print(f"[DRY-RUN] copy {spec.name} {src} -> {dst} size {task.sizes[spec.name]}")
+                elif src != dst:
+                    futures.append(uploader.submit_copy(src, dst))
+            else:
+                rendition = rendered.renditions[spec.name]
+                task.sizes[spec.name] = rendition.size
+                if dry_run:
+                    print(f"[DRY-RUN] upload {spec.name} -> {dst} size {rendition.size}")
+                else:
+                    futures.append(uploader.submit(dst, rendition.data, spec.content_type))
+        return futures
+
+    def rejected(task: PhotoTask, rendered: RenderedPhoto) -> bool:
+        if rendered.error is None:
+            return False
+        fail()
+        elog(f"render rejected file={str(task.file_path)!r} error={rendered.error}")
+        return True
+
+    render = functools.partial(_render_task, specs=tuple(specs), use_previews=use_previews, max_pixels=max_pixels)
+
+    def finish_ready(block: bool) -> None:
+        while uploading and (block or all(f.done() for f in uploading[0][1])):
+            task, futures = uploading.popleft()
+            errors = [exc for exc in (f.exception() for f in futures) if exc is not None]
+            if errors and task.reuse is not None:
+                # Indexed blob is gone (deleted or renamed): forget it and
+                # fall back to rendering and uploading this photo normally.
+                elog(f"blob copy failed file={str(task.file_path)!r} error={errors[0]!r}, re-rendering")
+                manifest.forget_blobs(task.content_hash)
+                task.reuse = None
+                rendered = render(task)
+                if not rejected(task, rendered):
+                    uploading.append((task, submit_renditions(task, rendered)))
+                continue
+            if errors:
+                fail()
+                elog(f"upload failed file={str(task.file_path)!r} error={errors[0]!r}")
+                continue
+            if task.reuse is not None:
+                stats.incr("photos_copied")
+            writer.set("photos", task.doc_id, photo_doc_data(task, specs), merge=True, callback=on_doc_written(task))
+
+    with ExitStack() as stack:
+        if not dry_run:
+            if uploader is None:
+                uploader = stack.enter_context(UploadStage(bucket, max_in_flight=1, retries=0))
+            if writer is None:
+                writer = stack.enter_context(BatchedWriter(db))
+
+        tasks = iter_photo_tasks(db, items, root_path, dry_run, specs, manifest, on_photo_done, stats)
+        if manifest is not None:
+            tasks = iter_hashed_tasks(tasks, manifest, specs, hasher, max_pending, stats)
+        for task, rendered in bounded_map(render, tasks, executor, max_pending):
+            task.data = None
+            stats.maybe_emit_progress()
+            if writer is not None:
+                writer.maybe_flush()
+            if rejected(task, rendered):
+                continue
+            futures = submit_renditions(task, rendered)
+            if dry_run:
+                print(f"[DRY-RUN] photo doc -> photos/{task.doc_id} {photo_doc_data(task, specs)}")
+            else:
+                uploading.append((task, futures))
+                finish_ready(block=False)
+
+        finish_ready(block=True)
+        if writer is not None:
+            writer.flush()
+        if manifest is not None:
+            manifest.commit()
+    sources = {k[len("source_"):]: v for k, v in stats.counters.items() if k.startswith("source_")}
+    if sources:
+        elog("render sources " + " ".join(f"{name}={count}" for name, count in sorted(sources.items())))
+    if stats.counters.get("photos_copied"):
+        elog(f"dedup renditions copied server-side photos={stats.counters['photos_copied']}")
+    return failed
+
+
+def iter_image_folders(base: Path) -> Iterator[Tuple[str, List[Path]]]:
+    """
+    Walk base with os.scandir and yield (rel_dir, images sorted by name) for
+    each directory holding images, as soon as that directory is listed.
+    Directories are visited depth-first in name order; entry types come from
+    the directory listing itself, so no per-file stat is needed.
+    """
+    stack = [base]
+    while stack:
+        cur = stack.pop()
+        try:
+            files, dirs = _scan_dir(cur)
+        except OSError as exc:
+            elog(f"scan error dir={str(cur)!r} error={exc!r}")
+            continue
+        if files:
+            rel_dir = str(cur.relative_to(base)).replace("\\", "/")
             if rel_dir == ".":
                 rel_dir = ""
-            items.append((path, rel_dir))
-    return items
+            yield rel_dir, files
+        stack.extend(sorted(dirs, key=lambda p: p.name, reverse=True))
+
+
+def _scan_dir(cur: Path) -> Tuple[List[Path], List[Path]]:
+    """
+    (images sorted by name, subdirectories) of one directory. Symlinked
+    directories are not followed, as with rglob, so a link back up the tree
+    cannot make the walk loop.
+    """
+    files: List[Path] = []
+    dirs: List[Path] = []
+    with os.scandir(cur) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(Path(entry.path))
+                elif entry.is_file() and is_image(Path(entry.name)):
+                    files.append(Path(entry.path))
+            except OSError:
+                continue
+    return sorted(files, key=lambda p: p.name), dirs
+
+
+def iter_shard_folders(base: Path, shard: Sequence[Dict]) -> Iterator[Tuple[str, List[Path], int]]:
+    """
+    Yield (rel_dir, images, start) for the folder slices of a shard
+    ({"relDir", "start", "end"} each; end exclusive, null = to the end).
+    Only the listed folders are read; a slice keeps each photo's order
+    within the whole folder.
+    """
+    for entry in shard:
+        rel_dir = entry["relDir"]
+        try:
+            files, _ = _scan_dir(base / rel_dir if rel_dir else base)
+        except OSError as exc:
+            elog(f"scan error dir={rel_dir!r} error={exc!r}")
+            continue
+        start = int(entry.get("start") or 0)
+        end = entry.get("end")
+        yield rel_dir, files[start:end], start
+
+
+def collect_items(base: Path) -> List[Tuple[Path, str]]:
+    return [(path, rel_dir) for rel_dir, files in iter_image_folders(base) for path in files]
+
+
+def new_folder_docs(rel_dir: str, root_path: str, seen: Set[str]) -> List[Dict]:
+    """Folder docs for rel_dir and its ancestors that are not in seen yet."""
+    folders: List[Dict] = []
+    parts = [p for p in rel_dir.split("/") if p]
+    for i in range(len(parts) + 1):
+        sub_parts = parts[: i + 1]
+        if not sub_parts:
+            folder_path = normalize_path(root_path)
+            name = folder_path.rsplit("/", 1)[-1] or "root"
+        else:
+            folder_path = normalize_path("/".join([root_path.strip("/")] + sub_parts))
+            name = sub_parts[-1]
+        if folder_path in seen:
+            continue
+        seen.add(folder_path)
+        parent_path = normalize_path("/".join(folder_path.split("/")[:-1])) if folder_path else ""
+        folders.append(
+            {
+                "name": name,
+                "path": folder_path,
+                "parentPath": parent_path,
+                "order": i,  # shallow depth first; adjust as needed
+            }
+        )
+    return folders
 
 
 def collect_folders(items: List[Tuple[Path, str]], root_path: str) -> List[Dict]:
-    seen = set()
+    seen: Set[str] = set()
     folders: List[Dict] = []
     for _, rel_dir in items:
-        parts = [p for p in rel_dir.split("/") if p]
-        for i in range(len(parts) + 1):
-            sub_parts = parts[: i + 1]
-            if not sub_parts:
-                folder_path = normalize_path(root_path)
-                name = folder_path.rsplit("/", 1)[-1] or "root"
-            else:
-                folder_path = normalize_path("/".join([root_path.strip("/")] + sub_parts))
-                name = sub_parts[-1]
-            if folder_path in seen:
-                continue
-            seen.add(folder_path)
-            parent_path = normalize_path("/".join(folder_path.split("/")[:-1])) if folder_path else ""
-            folders.append(
-                {
-                    "name": name,
-                    "path": folder_path,
-                    "parentPath": parent_path,
-                    "order": i,  # shallow depth first; adjust as needed
-                }
-            )
+        folders.extend(new_folder_docs(rel_dir, root_path, seen))
     return folders
 
+
+def iter_ordered_items(
+    base: Path,
+    root_path: str,
+    on_folder: Callable[[str, List[Path], List[Dict], int], None],
+    stats: Optional[ImportStats] = None,
+    shard: Optional[Sequence[Dict]] = None,
+) -> Iterator[Tuple[Path, str, int]]:
+    """
+    Stream (file_path, rel_dir, order) folder by folder while scanning.
+    on_folder(rel_dir, files, new_folders, start) runs when a folder is
+    discovered, before any of its photos are yielded; files hold the orders
+    start.. of the folder (start is 0 unless a shard slices the folder).
+    """
+    seen: Set[str] = set()
+    if shard is None:
+        folders = ((rel_dir, files, 0) for rel_dir, files in iter_image_folders(base))
+    else:
+        folders = iter_shard_folders(base, shard)
+    if stats is not None:
+        folders = stats.timed_iter("scan", folders)
+    for rel_dir, files, start in folders:
+        if stats is not None:
+            stats.incr("photos_found", len(files))
+        on_folder(rel_dir, files, new_folder_docs(rel_dir, root_path, seen), start)
+        # order photos by filename within each folder
+        for idx, path in enumerate(files, start):
+            yield path, rel_dir, idx
+    if stats is not None:
+        # photos_found is final from here on (progress ETA)
+        stats.incr("scan_complete")
+
+
+def skip_checkpointed(
+    items: Iterable[Tuple[Path, str, int]],
+    ledger: JobLedger,
+    root_path: str,
+    stats: Optional[ImportStats] = None,
+) -> Iterator[Tuple[Path, str, int]]:
+    """Drop photos below their folder's checkpoint watermark."""
+    skipped = 0
+    for item in items:
+        if item[2] < ledger.resume_from(photo_folder_path(root_path, item[1])):
+            skipped += 1
+            if stats is not None:
+                stats.incr("photos_checkpointed")
+            continue
+        yield item
+    if skipped:
+        elog(f"resume skipped checkpointed={skipped}")
+
+
+def watch_items(
+    base: Path,
+    paths: Iterable[Path],
+    root_path: str,
+    seen: Set[str],
+) -> Tuple[List[Tuple[Path, str, int]], List[Dict]]:
+    """
+    (items, new folder docs) for changed files, grouped by folder. Only the
+    affected folders are listed, to give each photo the order a full scan
+    would give it (its index in the folder's name-sorted images).
+    """
+    by_dir: Dict[Path, Set[Path]] = {}
+    for path in paths:
+        if is_image(path) and base in path.parents:
+            by_dir.setdefault(path.parent, set()).add(path)
+    items: List[Tuple[Path, str, int]] = []
+    folders: List[Dict] = []
+    for cur in sorted(by_dir):
+        try:
+            files, _ = _scan_dir(cur)
+        except OSError as exc:
+            elog(f"scan error dir={str(cur)!r} error={exc!r}")
+            continue
+        rel_dir = str(cur.relative_to(base)).replace("\\", "/")
+        if rel_dir == ".":
+            rel_dir = ""
+        folders.extend(new_folder_docs(rel_dir, root_path, seen))
+        for order, path in enumerate(files):
+            if path in by_dir[cur]:
+                items.append((path, rel_dir, order))
+    return items, folders
+
+
+def watch_import(
+    base: Path,
+    root_path: str,
+    batches: Iterable[List[Path]],
+    import_items: Callable[[List[Tuple[Path, str, int]]], int],
+    ensure_folders: Callable[[List[Dict]], None],
+    stats: Optional[ImportStats] = None,
+) -> Tuple[int, int]:
+    """
+    Import each settled batch of changed files as it arrives, until the
+    watch ends or Ctrl+C. Returns (photos seen, photos failed).
+    """
+    seen: Set[str] = set()
+    found = failed = 0
+    try:
+        for batch in batches:
+            items, folders = watch_items(base, batch, root_path, seen)
+            if not items:
+                continue
+            elog(f"watch batch photos={len(items)} folders={len({rel_dir for _, rel_dir, _ in items})}")
+            if stats is not None:
+                stats.incr("photos_found", len(items))
+            if folders:
+                ensure_folders(folders)
+            found += len(items)
+            failed += import_items(items)
+    except KeyboardInterrupt:
+        elog("watch stopped")
+    return found, failed
+
+
 def main():
     args = parse_args()
     elog(f"start argv={sys.argv!r}")
-    elog(f"args input_dir={args.input_dir!r} root_path={args.root_path!r} dry_run={args.dry_run!r}")
+    if args.dry_run:
+        db = bucket = None
+    else:
+        db, bucket = init_firebase()
+    run(args, db, bucket)
+
+
+def run(args, db, bucket) -> None:
+    """Import with already initialized clients (real or fake); see parse_args for args."""
+    elog(
+        f"args input_dir={args.input_dir!r} root_path={args.root_path!r} dry_run={args.dry_run!r} "
+        f"workers={args.workers!r}"
+    )
 
     validate_virtual_root(args.root_path)
     base = Path(args.input_dir).expanduser().resolve()
@@ -227,33 +911,138 @@ def main():
 
     print(f"Scanning images under: {base}")
     print(f"Virtual root path    : '{normalize_path(args.root_path)}'")
-    elog("collect_items begin")
-    items = collect_items(base)
-    elog(f"collect_items done count={len(items)}")
 
-    if not items:
-        print("No images found.")
-        return
+    stats = ImportStats(sys.stderr, args.progress_interval)
+    try:
+        _run_import(args, db, bucket, base, stats)
+    finally:
+        write_stats(stats, args.stats_json)
 
-    folders = collect_folders(items, args.root_path)
 
-    if args.dry_run:
-        db = bucket = None
+def write_stats(stats: ImportStats, path: Optional[str]) -> None:
+    stats.maybe_emit_progress(force=True)
+    summary = stats.summary()
+    stages = " ".join(f"{name}={s['total_sec']}s/{s['count']}" for name, s in summary["stages"].items())
+    elog(f"stats elapsed={summary['elapsed_sec']}s {stages}")
+    if not path:
+        return
+    text = json.dumps(summary, indent=2)
+    if path == "-":
+        print(text)
     else:
-        db, bucket = init_firebase()
+        Path(path).write_text(text + "\n", encoding="utf-8")
+
+
+def _run_import(args, db, bucket, base: Path, stats: ImportStats) -> None:
+    with ExitStack() as stack:
+        pool = uploader = writer = manifest = None
+        if not args.dry_run and not args.no_manifest:
+            elog(f"manifest path={args.manifest!r}")
+            manifest = stack.enter_context(ImportManifest(Path(args.manifest).expanduser()))
+        hasher = None
+        if manifest is not None:
+            # Hashing is I/O bound: threads overlap reads on network mounts
+            hasher = stack.enter_context(ThreadPoolExecutor(max_workers=max(2, args.workers), thread_name_prefix="hash"))
+        max_pixels = max_decode_pixels(args.max_decode_mpix)
+        # Renders run here too when there is no pool
+        set_decode_ceiling(max_pixels)
+        if args.workers > 1:
+            elog(f"render pool workers={args.workers} max_pending={args.max_pending}")
+            pool = stack.enter_context(
+                ProcessPoolExecutor(
+                    max_workers=args.workers,
+                    initializer=_init_render_worker,
+                    initargs=(args.worker_memory_mb * 1024 * 1024 if args.worker_memory_mb else None, max_pixels),
+                )
+            )
+        if not args.dry_run:
+            elog(f"upload stage concurrency={args.upload_concurrency} retries={args.upload_retries}")
+            uploader = stack.enter_context(
+                UploadStage(bucket, max_in_flight=args.upload_concurrency, retries=args.upload_retries, stats=stats)
+            )
+            writer = stack.enter_context(
+                BatchedWriter(db, max_ops=args.batch_size, flush_interval_sec=args.batch_interval, stats=stats)
+            )
+
+        ledger = None
+        if args.job_id and not args.dry_run:
+            ledger = JobLedger(
+                db, args.job_id, writer, collection=args.jobs_collection,
+                interval_sec=args.checkpoint_interval, server_timestamp=firestore.SERVER_TIMESTAMP,
+            )
+            elog(f"ledger job_id={args.job_id!r} folders_checkpointed={ledger.load()}")
 
-    ensure_folder_docs(db, folders, args.dry_run)
+        scanned = {"folders": 0, "images": 0}
 
-    # order photos by filename within each folder
-    grouped: Dict[str, List[Tuple[Path, str]]] = {}
-    for path, rel_dir in items:
-        grouped.setdefault(rel_dir, []).append((path, rel_dir))
-    ordered_items: List[Tuple[Path, str, int]] = []
-    for rel_dir, lst in grouped.items():
-        for idx, (path, _) in enumerate(sorted(lst, key=lambda t: t[0].name)):
-            ordered_items.append((path, rel_dir, idx))
+        def on_folder(rel_dir: str, files: List[Path], folders: List[Dict], start: int) -> None:
+            if scanned["folders"] == 0:
+                elog(f"first folder found rel_dir={rel_dir!r} count={len(files)}")
+            scanned["folders"] += 1
+            scanned["images"] += len(files)
+            if ledger is not None:
+                folder_path = photo_folder_path(args.root_path, rel_dir)
+                if ledger.folder_done(folder_path):
+                    return
+                ledger.start_folder(folder_path, start + len(files), start)
+            ensure_folder_docs(db, folders, args.dry_run, writer)
+
+        def on_photo_done(task: PhotoTask) -> None:
+            if ledger is not None:
+                ledger.photo_done(task.folder_path, task.order)
+
+        shard = None
+        if args.shard_file:
+            shard = json.loads(Path(args.shard_file).read_text(encoding="utf-8"))["folders"]
+            elog(f"shard folders={len(shard)}")
+        items = iter_ordered_items(base, args.root_path, on_folder, stats, shard)
+        if ledger is not None:
+            items = skip_checkpointed(items, ledger, args.root_path, stats)
+        watcher = None
+        if args.watch:
+            # Opened before the initial import, so files added during it are not missed
+            watcher = fs_watch.open_watcher(base, is_image, args.watch_mode, args.watch_poll, elog)
+            stack.callback(watcher.close)
+        import_options = dict(
+            executor=pool, max_pending=args.max_pending, uploader=uploader, writer=writer,
+            manifest=manifest, hasher=hasher, use_previews=not args.no_previews,
+            max_pixels=max_pixels,
+            stats=stats,
+        )
+        failed = upload_and_make_docs(
+            db, bucket, items, args.root_path, args.dry_run, args.renditions,
+            on_photo_done=on_photo_done, **import_options,
+        )
+        if ledger is not None:
+            ledger.checkpoint(force=True)
+
+        if args.watch:
+            # From here on only changed files are touched, never the whole tree
+            batches = fs_watch.watch(
+                base, is_image, args.watch_settle, args.watch_poll, args.watch_mode, log=elog, watcher=watcher,
+                on_poll=writer.maybe_flush if writer is not None else None,
+            )
+            found, watch_failed = watch_import(
+                base, args.root_path, batches,
+                lambda batch: upload_and_make_docs(
+                    db, bucket, batch, args.root_path, args.dry_run, args.renditions, **import_options
+                ),
+                lambda folders: ensure_folder_docs(db, folders, args.dry_run, writer),
+                stats,
+            )
+            scanned["images"] += found
+            failed += watch_failed
+
+    elog(f"scan done folders={scanned['folders']} count={scanned['images']}")
+    if not scanned["images"]:
+        print("No images found.")
+        return
 
-    upload_and_make_docs(db, bucket, ordered_items, args.root_path, args.dry_run)
+    doc_failures = 0
+    if writer is not None:
+        doc_failures = len(writer.failures)
+        elog(f"doc writes written={writer.written} commits={writer.commits} failed={doc_failures}")
+    if failed or doc_failures:
+        raise SystemExit(f"Done with errors: {failed} photo(s) failed, {doc_failures} doc write(s) failed.")
     print("Done.")
 
 if __name__ == "__main__":
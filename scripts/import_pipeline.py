@@ -0,0 +1,172 @@
+"""
+Pipeline helpers shared by import_photos stages.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, Deque, Iterable, Iterator, Optional, Tuple, TypeVar
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def bounded_map(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    executor: Optional[Executor] = None,
+    max_pending: int = 1,
+) -> Iterator[Tuple[T, R]]:
+    """
+    Yield (item, fn(item)) in input order.
+
+    With an executor, at most max_pending calls are submitted ahead of the
+    consumer, so the input iterable is only drained as fast as results are
+    taken and memory stays flat for arbitrarily long inputs. Without an
+    executor fn runs inline, one item at a time.
+    """
+    if executor is None:
+        for item in items:
+            yield item, fn(item)
+        return
+
+    max_pending = max(1, max_pending)
+    pending: Deque[Tuple[T, Future]] = deque()
+    it = iter(items)
+    try:
+        for item in it:
+            pending.append((item, executor.submit(fn, item)))
+            if len(pending) >= max_pending:
+                head, fut = pending.popleft()
+                yield head, fut.result()
+        while pending:
+            head, fut = pending.popleft()
+            yield head, fut.result()
+    finally:
+        for _, fut in pending:
+            fut.cancel()
+
+
+def limit_process_memory(max_bytes: Optional[int]) -> None:
+    """
+    ProcessPoolExecutor initializer: cap the worker's address space so a
+    runaway decode raises MemoryError in that worker instead of getting the
+    whole box OOM-killed. No-op without a limit or without RLIMIT_AS.
+    """
+    if not max_bytes or resource is None or not hasattr(resource, "RLIMIT_AS"):
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        max_bytes = min(max_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+
+
+def configure_http_pool(bucket, pool_size: int) -> bool:
+    """
+    Size the storage client's shared HTTP connection pool for pool_size
+    concurrent requests. Returns False when the bucket has no requests-style
+    session to configure (e.g. a fake bucket in tests).
+    """
+    client = getattr(bucket, "client", None)
+    session = getattr(client, "_http", None) if client is not None else None
+    if session is None or not hasattr(session, "mount"):
+        return False
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return True
+
+
+class UploadStage:
+    """
+    Upload blobs from a bounded thread pool sharing one pooled HTTP transport.
+
+    submit() returns a Future per blob and blocks once max_in_flight uploads
+    are queued or running, so encoded renditions never pile up in memory.
+    Each blob is retried on its own worker thread with exponential backoff;
+    a slow or failing blob does not hold up the others. submit_copy() runs
+    a server-side blob copy through the same slots and retry policy.
+    """
+
+    def __init__(
+        self,
+        bucket,
+        max_in_flight: int = 8,
+        retries: int = 3,
+        backoff_sec: float = 1.0,
+        sleep: Callable[[float], None] = time.sleep,
+        stats=None,
+    ):
+        self.bucket = bucket
+        self.stats = stats
+        self.retries = max(0, retries)
+        self.backoff_sec = backoff_sec
+        self._sleep = sleep
+        self._slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="upload")
+        configure_http_pool(bucket, max(1, max_in_flight))
+
+    def submit(self, path: str, data: bytes, content_type: str) -> Future:
+        return self._submit("upload", len(data), self._upload, path, data, content_type)
+
+    def submit_copy(self, src_path: str, dst_path: str) -> Future:
+        """Server-side copy of an existing blob; no bytes leave this machine."""
+        return self._submit("copy", 0, self._copy, src_path, dst_path)
+
+    def _submit(self, stage: str, nbytes: int, fn: Callable[..., str], *args) -> Future:
+        self._slots.acquire()
+        try:
+            fut = self._pool.submit(self._timed, stage, nbytes, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _: self._slots.release())
+        return fut
+
+    def _timed(self, stage: str, nbytes: int, fn: Callable[..., str], *args) -> str:
+        # Per blob, including retries and backoff
+        if self.stats is None:
+            return self._with_retries(fn, *args)
+        with self.stats.time(stage, nbytes):
+            return self._with_retries(fn, *args)
+
+    def _with_retries(self, fn: Callable[..., str], *args) -> str:
+        attempt = 0
+        while True:
+            try:
+                return fn(*args)
+            except Exception as exc:
+                # A missing source blob (404) will not appear by retrying
+                if attempt >= self.retries or getattr(exc, "code", None) == 404:
+                    raise
+                self._sleep(self.backoff_sec * (2 ** attempt))
+                attempt += 1
+
+    def _upload(self, path: str, data: bytes, content_type: str) -> str:
+        blob = self.bucket.blob(path)
+        blob.upload_from_file(BytesIO(data), content_type=content_type)
+        return path
+
+    def _copy(self, src_path: str, dst_path: str) -> str:
+        self.bucket.copy_blob(self.bucket.blob(src_path), self.bucket, dst_path)
+        return dst_path
+
+    def close(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+    def __enter__(self) -> "UploadStage":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close(wait=exc_type is None)
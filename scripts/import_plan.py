@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Split one import into shards that separate import jobs can run in parallel.
+
+The tree is scanned once (file names only, no stat or decode) and its image
+folders are packed, in scan order, into shards of about max_photos photos.
+Small folders are grouped whole; a folder larger than max_photos is cut into
+slices of consecutive photos. A shard is a list of
+
+  {"relDir": "2024/trip", "start": 0, "end": 500}     # end exclusive, null = to the end
+
+and import_photos.py --shard-file imports exactly those photos with the same
+per-folder order a full import would give them, so folder docs and photo
+order stay identical however the tree is split.
+
+  python scripts/import_plan.py --input-dir D:/Photos --max-photos 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from import_photos import iter_image_folders
+
+DEFAULT_MAX_PHOTOS = 2000
+
+
+def plan_shards(folders: Iterable[Tuple[str, int]], max_photos: int) -> List[List[Dict[str, Any]]]:
+    """Pack (rel_dir, photo_count) folders into shards of at most max_photos photos."""
+    if max_photos < 1:
+        raise ValueError("max_photos must be >= 1")
+    shards: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    size = 0
+    for rel_dir, count in folders:
+        if count > max_photos:
+            if current:
+                shards.append(current)
+                current, size = [], 0
+            for start in range(0, count, max_photos):
+                end = start + max_photos
+                shards.append([{"relDir": rel_dir, "start": start, "end": end if end < count else None}])
+            continue
+        if size + count > max_photos:
+            shards.append(current)
+            current, size = [], 0
+        current.append({"relDir": rel_dir, "start": 0, "end": None})
+        size += count
+    if current:
+        shards.append(current)
+    return shards
+
+
+def shard_photo_count(shard: List[Dict[str, Any]], counts: Dict[str, int]) -> int:
+    total = 0
+    for entry in shard:
+        end = entry["end"] if entry["end"] is not None else counts[entry["relDir"]]
+        total += end - entry["start"]
+    return total
+
+
+def plan_import(base: Path, max_photos: int = DEFAULT_MAX_PHOTOS) -> Dict[str, Any]:
+    counts = {rel_dir: len(files) for rel_dir, files in iter_image_folders(base)}
+    shards = plan_shards(counts.items(), max_photos)
+    return {
+        "folders": len(counts),
+        "photos": sum(counts.values()),
+        "shards": [{"photos": shard_photo_count(shard, counts), "folders": shard} for shard in shards],
+    }
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="split an import into shards for parallel import jobs")
+    p.add_argument("--input-dir", required=True, help="Root folder to scan")
+    p.add_argument(
+        "--max-photos",
+        type=int,
+        default=DEFAULT_MAX_PHOTOS,
+        help=f"Photos per shard (default {DEFAULT_MAX_PHOTOS})",
+    )
+    args = p.parse_args()
+    if args.max_photos < 1:
+        p.error("--max-photos must be >= 1")
+    base = Path(args.input_dir).expanduser().resolve()
+    if not base.is_dir():
+        raise SystemExit(f"Input dir not found: {base}")
+    json.dump(plan_import(base, args.max_photos), sys.stdout)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
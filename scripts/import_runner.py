@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Warm, long-lived import_photos process for import_worker.
+
+Running `python import_photos.py` per job pays for interpreter startup, the
+Pillow / pillow_heif / firebase_admin imports and a fresh credential load and
+token fetch before the first photo. This script imports all of that once and
+then runs import_photos.run() for one job after another, reusing the
+Firestore and Storage clients.
+
+Protocol: the parent writes one JSON request per line to stdin,
+  {"jobId": "...", "argv": ["--input-dir", ...]}
+and the job's output arrives on stdout/stderr exactly as from a one-off
+import_photos.py. When the job ends, a JSON line
+  {"event":"job_exit","jobId":"...","code":0}
+is written to both streams, so the parent knows that it has seen all of the
+job's output.
+
+Isolation is the same as with one process per job. A job that crashes the
+runner, or runs past its timeout, takes only the runner down. The parent
+(WarmRunner) reports that job as failed and starts a fresh runner for the
+next one. Runners are also replaced after max_jobs jobs, to bound any slow
+growth in memory.
+"""
+
+from __future__ import annotations
+
+import json
+import queue
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from proc_stream import DEFAULT_TAIL_CHARS, LineCallback, StreamResult, TailBuffer, kill_process_group
+
+RUNNER_PATH = Path(__file__).resolve()
+EXIT_EVENT_PREFIX = '{"event":"job_exit"'
+# Exit code reported for a job whose runner died under it
+RUNNER_LOST = -1
+
+
+def _exit_code(exc: SystemExit) -> int:
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    sys.stderr.write(f"{exc.code}\n")
+    return 1
+
+
+def serve() -> None:
+    import import_photos as ip
+
+    clients = None
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        code = 0
+        try:
+            args = ip.parse_args(request["argv"])
+            ip.elog(f"start argv={request['argv']!r} (warm runner)")
+            if args.dry_run:
+                db = bucket = None
+            else:
+                if clients is None:
+                    clients = ip.init_firebase()
+                db, bucket = clients
+            ip.run(args, db, bucket)
+        except SystemExit as exc:
+            code = _exit_code(exc)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        event = json.dumps({"event": "job_exit", "jobId": request.get("jobId"), "code": code}, separators=(",", ":"))
+        for stream in (sys.stdout, sys.stderr):
+            stream.write(event + "\n")
+            stream.flush()
+
+
+class _Job:
+    def __init__(self, on_line: Optional[LineCallback], tail_chars: int):
+        self.on_line = on_line
+        self.tails = {"stdout": TailBuffer(tail_chars), "stderr": TailBuffer(tail_chars)}
+        self.exits: Dict[str, int] = {}
+        self.done = threading.Event()
+
+
+class WarmRunner:
+    """One warm runner process, running one job at a time."""
+
+    def __init__(self, env: Optional[Dict[str, str]] = None, max_jobs: int = 50, python: str = sys.executable):
+        self._cmd = [python, str(RUNNER_PATH)]
+        self._env = env
+        self.max_jobs = max_jobs
+        self.jobs_run = 0
+        self._job: Optional[_Job] = None
+        self._proc = subprocess.Popen(
+            self._cmd,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            # Its own process group, so a kill also takes the job's render workers
+            start_new_session=True,
+        )
+        self._readers = [
+            threading.Thread(target=self._pump, args=(name, getattr(self._proc, name)), daemon=True)
+            for name in ("stdout", "stderr")
+        ]
+        for reader in self._readers:
+            reader.start()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+
+    @property
+    def reusable(self) -> bool:
+        return self.alive and self.jobs_run < self.max_jobs
+
+    def _pump(self, name: str, stream) -> None:
+        for line in stream:
+            job = self._job
+            if job is None:
+                continue
+            if line.startswith(EXIT_EVENT_PREFIX):
+                try:
+                    job.exits[name] = int(json.loads(line)["code"])
+                except (ValueError, KeyError, TypeError):
+                    job.exits[name] = 1
+                if len(job.exits) == 2:
+                    job.done.set()
+                continue
+            if job.on_line is not None and job.on_line(name, line):
+                continue
+            job.tails[name].append(line)
+
+    def run(
+        self,
+        job_id: Optional[str],
+        argv: Sequence[str],
+        timeout_sec: Optional[float] = None,
+        on_line: Optional[LineCallback] = None,
+        on_tick: Optional[Callable[[], None]] = None,
+        poll_sec: float = 1.0,
+        tail_chars: int = DEFAULT_TAIL_CHARS,
+    ) -> StreamResult:
+        """Run one import like proc_stream.run_streaming would run import_photos.py."""
+        t0 = time.monotonic()
+        job = self._job = _Job(on_line, tail_chars)
+        self.jobs_run += 1
+        timed_out = False
+        try:
+            self._proc.stdin.write(json.dumps({"jobId": job_id, "argv": list(argv)}) + "\n")
+            self._proc.stdin.flush()
+        except OSError:
+            pass  # runner already gone; reported as lost below
+        while not job.done.wait(poll_sec):
+            if not self.alive:
+                # The job's render workers outlive a crashed runner
+                kill_process_group(self._proc)
+                # Let the readers drain what the runner printed before it died
+                for reader in self._readers:
+                    reader.join(timeout=5)
+                break
+            if timeout_sec is not None and time.monotonic() - t0 > timeout_sec:
+                self.close(grace_sec=0)
+                timed_out = True
+                break
+            if on_tick is not None:
+                on_tick()
+        self._job = None
+        if job.done.is_set():
+            code = job.exits["stderr"]
+        else:
+            code = RUNNER_LOST if not timed_out else self._proc.returncode
+        return StreamResult(
+            returncode=code,
+            timed_out=timed_out,
+            elapsed_sec=time.monotonic() - t0,
+            stdout=job.tails["stdout"].text(),
+            stderr=job.tails["stderr"].text(),
+        )
+
+    def close(self, grace_sec: float = 5.0) -> None:
+        """Stop the runner: EOF on stdin lets an idle runner exit by itself."""
+        if self.alive:
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                pass
+            try:
+                self._proc.wait(timeout=grace_sec)
+            except subprocess.TimeoutExpired:
+                kill_process_group(self._proc)
+                self._proc.wait()
+        for reader in self._readers:
+            reader.join(timeout=5)
+        for stream in (self._proc.stdin, self._proc.stdout, self._proc.stderr):
+            try:
+                stream.close()
+            except (OSError, ValueError):
+                pass
+
+
+class RunnerPool:
+    """Idle warm runners, one per concurrently running job, started on demand."""
+
+    def __init__(self, env: Optional[Dict[str, str]] = None, max_jobs_per_runner: int = 50):
+        self._env = env
+        self._max_jobs = max_jobs_per_runner
+        self._idle: "queue.SimpleQueue[WarmRunner]" = queue.SimpleQueue()
+        self._all: List[WarmRunner] = []
+        self._lock = threading.Lock()
+
+    def run(self, job_id: Optional[str], argv: Sequence[str], **kwargs: Any) -> StreamResult:
+        runner = self._checkout()
+        try:
+            return runner.run(job_id, argv, **kwargs)
+        finally:
+            self._checkin(runner)
+
+    def _checkout(self) -> WarmRunner:
+        while True:
+            try:
+                runner = self._idle.get_nowait()
+            except queue.Empty:
+                runner = WarmRunner(self._env, self._max_jobs)
+                with self._lock:
+                    self._all.append(runner)
+                return runner
+            if runner.reusable:
+                return runner
+            self._retire(runner)
+
+    def _checkin(self, runner: WarmRunner) -> None:
+        if runner.reusable:
+            self._idle.put(runner)
+        else:
+            self._retire(runner)
+
+    def _retire(self, runner: WarmRunner) -> None:
+        runner.close()
+        with self._lock:
+            if runner in self._all:
+                self._all.remove(runner)
+
+    def close(self) -> None:
+        with self._lock:
+            runners = list(self._all)
+            self._all.clear()
+        for runner in runners:
+            runner.close()
+
+
+if __name__ == "__main__":
+    serve()
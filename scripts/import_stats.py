@@ -0,0 +1,150 @@
+"""
+Per-stage timers and counters for import_photos.
+
+Stages are timed per call (a folder listing, a photo decode, a blob upload,
+a batch commit, ...). For each stage the summary reports the count, total
+seconds, p50/p95/max in milliseconds and the bytes processed, so a slow job
+can be attributed to CPU (decode/resize/encode) or network (upload,
+exists_check, doc_write). Percentiles come from a bounded reservoir sample.
+
+Render stages run in worker processes; they are measured there and
+recorded here by the main process (see record()).
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, TypeVar
+
+T = TypeVar("T")
+
+STAGES = (
+    "scan",
+    "manifest_check",
+    "exists_check",
+    "hash",
+    "decode",
+    "resize",
+    "encode",
+    "upload",
+    "copy",
+    "doc_write",
+)
+
+RESERVOIR_SIZE = 4096
+
+
+class StageStats:
+    def __init__(self, rng: random.Random):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self._samples: List[float] = []
+        self._rng = rng
+
+    def add(self, seconds: float, nbytes: int = 0) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.bytes += nbytes
+        if len(self._samples) < RESERVOIR_SIZE:
+            self._samples.append(seconds)
+        else:
+            slot = self._rng.randrange(self.count)
+            if slot < RESERVOIR_SIZE:
+                self._samples[slot] = seconds
+
+    def percentile(self, pct: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        # nearest-rank
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_sec": round(self.total, 4),
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p95_ms": round(self.percentile(95) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "bytes": self.bytes,
+        }
+
+
+class ImportStats:
+    def __init__(
+        self,
+        progress_stream: Optional[TextIO] = None,
+        progress_interval_sec: float = 0.0,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self._clock = clock
+        self._started = clock()
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+        self._stages: Dict[str, StageStats] = {}
+        self.counters: Dict[str, int] = {}
+        self._progress_stream = progress_stream
+        self._progress_interval = progress_interval_sec
+        self._last_progress = self._started
+
+    def record(self, stage: str, seconds: float, nbytes: int = 0) -> None:
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats(self._rng)
+            stats.add(seconds, nbytes)
+
+    @contextmanager
+    def time(self, stage: str, nbytes: int = 0) -> Iterator[None]:
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.record(stage, self._clock() - started, nbytes)
+
+    def timed_iter(self, stage: str, items: Iterable[T]) -> Iterator[T]:
+        """Yield from items, recording the time spent producing each one."""
+        it = iter(items)
+        while True:
+            started = self._clock()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self.record(stage, self._clock() - started)
+            yield item
+
+    def incr(self, counter: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            ordered = [s for s in STAGES if s in self._stages] + sorted(set(self._stages) - set(STAGES))
+            return {
+                "elapsed_sec": round(self._clock() - self._started, 3),
+                "stages": {stage: self._stages[stage].to_dict() for stage in ordered},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def maybe_emit_progress(self, force: bool = False) -> None:
+        """Write a JSONL progress event to the progress stream at most every interval."""
+        if self._progress_stream is None or self._progress_interval <= 0:
+            return
+        now = self._clock()
+        if not force and now - self._last_progress < self._progress_interval:
+            return
+        self._last_progress = now
+        event = {"event": "progress", **self.summary()}
+        self._progress_stream.write(json.dumps(event, separators=(",", ":")) + "\n")
+        self._progress_stream.flush()
+
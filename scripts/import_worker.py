@@ -5,9 +5,10 @@ import json
 import os
 import subprocess
 import sys
+import tempfile
 import time
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 from warnings_config import configure_warning_filters
 
@@ -17,16 +18,68 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from google.cloud import pubsub_v1
 
+from firestore_batch import get_existing
+from import_runner import RUNNER_LOST, RunnerPool
+from proc_stream import run_streaming
+
 SCRIPT_PATH = Path(__file__).with_name("import_photos.py")
+PLAN_SCRIPT_PATH = Path(__file__).with_name("import_plan.py")
 DEFAULT_SERVICE_ACCOUNT_PATH = Path(__file__).resolve().parents[1] / "mikkikicom-firebase-adminsdk-fbsvc-06bdbf6b0d.json"
 
 IMPORT_JOBS_COLLECTION = os.getenv("IMPORT_JOBS_COLLECTION", "importJobs").strip()
 IMPORT_JOBS_SUBSCRIPTION = os.getenv("IMPORT_JOBS_SUBSCRIPTION", "").strip()
+# Topic sub-jobs are published to; defaults to the subscription's topic
+IMPORT_JOBS_TOPIC = os.getenv("IMPORT_JOBS_TOPIC", "").strip()
 SUBPROCESS_TIMEOUT_SEC = int(os.getenv("IMPORT_JOB_TIMEOUT_SEC", "21600"))
+
+# Routing: a job with a workerId only runs on the worker with that ID; jobs
+# without one run anywhere. Routing is done by subscription filters: the
+# shared subscription takes only unrouted jobs (NOT attributes:workerId) and
+# each routed worker also pulls its own IMPORT_WORKER_SUBSCRIPTION
+# (attributes.workerId = "<id>"). A routed job that still reaches the wrong
+# worker is acked and republished, at most MAX_ROUTE_HOPS times.
+WORKER_ID = os.getenv("IMPORT_WORKER_ID", "").strip()
+WORKER_SUBSCRIPTION = os.getenv("IMPORT_WORKER_SUBSCRIPTION", "").strip()
+MAX_ROUTE_HOPS = 3
+# Render processes per job (import_photos --workers) and concurrent jobs per
+# worker; 0 = as many jobs as fit the CPU count.
+JOB_RENDER_WORKERS = max(1, int(os.getenv("IMPORT_JOB_RENDER_WORKERS", "2")))
+MAX_CONCURRENT_JOBS = int(os.getenv("IMPORT_WORKER_MAX_JOBS", "0")) or max(
+    1, (os.cpu_count() or 1) // JOB_RENDER_WORKERS
+)
+# Admission: only start a job while the 1-minute load per core is below
+# MAX_LOAD and at least MIN_FREE_MB of memory is available. A job that is
+# not admitted within ADMISSION_WAIT_SEC is nacked for another worker.
+MAX_LOAD_PER_CPU = float(os.getenv("IMPORT_WORKER_MAX_LOAD", "1.0"))
+MIN_FREE_MB = int(os.getenv("IMPORT_WORKER_MIN_FREE_MB", "1024"))
+ADMISSION_WAIT_SEC = float(os.getenv("IMPORT_WORKER_ADMISSION_WAIT_SEC", "120"))
+ADMISSION_POLL_SEC = 5.0
+# Lease: the subscriber client's lease manager extends the ack deadline of
+# every message it holds until max_lease_duration (see main()), so a long
+# job is not redelivered to another worker mid-run. LEASE_MARGIN_SEC covers
+# the status writes around the import.
+LEASE_MARGIN_SEC = 600
+# Progress: the child reports every CHILD_PROGRESS_SEC on stderr; the job doc
+# gets at most one progress write per PROGRESS_WRITE_SEC.
+CHILD_PROGRESS_SEC = 5
+PROGRESS_WRITE_SEC = float(os.getenv("IMPORT_WORKER_PROGRESS_SEC", "30"))
+POLL_SEC = 1.0
+# Fan-out: a job with shardPhotos (or every job, if this is set) is planned
+# into sub-jobs of about that many photos; 0 = run jobs whole.
+DEFAULT_SHARD_PHOTOS = int(os.getenv("IMPORT_WORKER_SHARD_PHOTOS", "0"))
+PLAN_TIMEOUT_SEC = 1800
+# Warm runners: imports run in long-lived import_runner.py processes that
+# keep Pillow and the Firebase clients loaded; each is replaced after
+# RUNNER_MAX_JOBS jobs. IMPORT_WORKER_WARM=0 spawns import_photos.py per job.
+WARM_RUNNERS = os.getenv("IMPORT_WORKER_WARM", "1").strip().lower() not in {"0", "false", "no"}
+RUNNER_MAX_JOBS = int(os.getenv("IMPORT_WORKER_RUNNER_MAX_JOBS", "50"))
 LOG_TAIL = 2000
 RET_TAIL = 20000
 
 
+_runner_pool: Optional[RunnerPool] = None
+
+
 def _ts() -> str:
     return time.strftime("%H:%M:%S")
 
@@ -64,10 +117,183 @@ def _update_job(db: firestore.Client, job_id: str, data: Dict[str, Any]) -> None
     doc.set(data, merge=True)
 
 
-def _run_import_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+def _get_job(db: firestore.Client, job_id: str) -> Dict[str, Any]:
+    snap = db.collection(IMPORT_JOBS_COLLECTION).document(job_id).get()
+    return (snap.to_dict() or {}) if snap.exists else {}
+
+
+def _routed_here(payload: Dict[str, Any]) -> bool:
+    target = (payload.get("workerId") or "").strip()
+    return not target or target == WORKER_ID
+
+
+def _reroute(
+    db: firestore.Client,
+    message: pubsub_v1.subscriber.message.Message,
+    payload: Dict[str, Any],
+    publish: Optional[Callable[[Dict[str, Any]], None]],
+) -> None:
+    """
+    Pass on a job routed to another worker. Nacking it would have Pub/Sub
+    redeliver it at once, to this worker as likely as to its owner, so it
+    is republished (its workerId attribute lets filtered subscriptions
+    deliver it to the owner) and acked. A job that keeps arriving at the
+    wrong worker is failed after MAX_ROUTE_HOPS instead of cycling.
+    """
+    job_id, target = payload["jobId"], payload.get("workerId")
+    if not WORKER_ID:
+        _log(
+            f"warning: job {job_id} is routed to worker {target!r} but reached a worker without "
+            "IMPORT_WORKER_ID; filter the shared subscription with NOT attributes:workerId"
+        )
+    hops = int(payload.get("routeHops") or 0) + 1
+    if hops > MAX_ROUTE_HOPS:
+        _log(f"job {job_id} for worker {target!r} was misrouted {hops - 1} times, failing it")
+        _update_job(
+            db,
+            job_id,
+            {
+                "status": "error",
+                "finishedAt": firestore.SERVER_TIMESTAMP,
+                "error": f"not picked up by worker {target!r}; check the subscription filters",
+            },
+        )
+        message.ack()
+        return
+    if publish is None:
+        _log(f"job {job_id} is for worker {target!r} and cannot be republished, nacking")
+        message.nack()
+        return
+    try:
+        publish({**payload, "routeHops": hops})
+    except Exception as exc:
+        _log(f"job {job_id} republish for worker {target!r} failed ({exc!r}), nacking")
+        message.nack()
+        return
+    _log(f"job {job_id} is for worker {target!r}, republished hop={hops}")
+    message.ack()
+
+
+def _load_per_cpu() -> Optional[float]:
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def _mem_available_mb() -> Optional[int]:
+    try:
+        with open("/proc/meminfo", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _admission_blocker() -> Optional[str]:
+    """Why a new job should not start right now, or None if it may."""
+    load = _load_per_cpu()
+    if load is not None and load >= MAX_LOAD_PER_CPU:
+        return f"load per cpu {load:.2f} >= {MAX_LOAD_PER_CPU}"
+    free_mb = _mem_available_mb()
+    if free_mb is not None and free_mb < MIN_FREE_MB:
+        return f"available memory {free_mb}MB < {MIN_FREE_MB}MB"
+    return None
+
+
+def _wait_for_admission(
+    wait_sec: float = ADMISSION_WAIT_SEC,
+    poll_sec: float = ADMISSION_POLL_SEC,
+    sleep=time.sleep,
+    clock=time.monotonic,
+) -> Optional[str]:
+    """Poll until the machine has headroom; returns the last blocker on timeout."""
+    deadline = clock() + wait_sec
+    while True:
+        blocker = _admission_blocker()
+        if blocker is None or clock() >= deadline:
+            return blocker
+        sleep(poll_sec)
+
+
+def progress_fields(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Job doc progress from an import_photos progress event."""
+    counters = event.get("counters") or {}
+    upload = (event.get("stages") or {}).get("upload") or {}
+    checkpointed = counters.get("photos_checkpointed", 0)
+    done = checkpointed + sum(counters.get(k, 0) for k in ("photos_imported", "photos_skipped", "photos_failed"))
+    total = counters.get("photos_found", 0)
+    scan_complete = bool(counters.get("scan_complete"))
+    elapsed = float(event.get("elapsed_sec") or 0.0)
+    # Photos skipped via the resume checkpoint cost nothing; leave them out of the rate
+    rate = (done - checkpointed) / elapsed if elapsed > 0 else 0.0
+    eta = round(max(0, total - done) / rate) if scan_complete and rate > 0 else None
+    return {
+        "photosDone": done,
+        "photosTotal": total,
+        "scanComplete": scan_complete,
+        "photosFailed": counters.get("photos_failed", 0),
+        "bytesUploaded": upload.get("bytes", 0),
+        "photosPerSec": round(rate, 2),
+        "etaSec": eta,
+        "elapsedSec": round(elapsed, 1),
+    }
+
+
+def _progress_event(line: str) -> Optional[Dict[str, Any]]:
+    if not line.startswith('{"event":"progress"'):
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+class JobProgress:
+    """Latest child progress, written to the job doc at most once per interval."""
+
+    def __init__(
+        self,
+        write: Callable[[Dict[str, Any]], None],
+        interval_sec: float = PROGRESS_WRITE_SEC,
+        clock=time.monotonic,
+    ):
+        self._write = write
+        self._interval = interval_sec
+        self._clock = clock
+        self._last_write: Optional[float] = None
+        self._written: Optional[Dict[str, Any]] = None
+        self.latest: Optional[Dict[str, Any]] = None
+
+    def update(self, event: Dict[str, Any]) -> None:
+        self.latest = progress_fields(event)
+
+    def maybe_write(self) -> None:
+        latest = self.latest
+        if latest is None or latest == self._written:
+            return
+        now = self._clock()
+        if self._last_write is not None and now - self._last_write < self._interval:
+            return
+        self._last_write = now
+        self._written = latest
+        try:
+            self._write(latest)
+        except Exception as exc:
+            _log(f"progress write failed: {exc!r}")
+
+
+def _run_import_job(
+    payload: Dict[str, Any],
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    on_tick: Optional[Callable[[], None]] = None,
+) -> Dict[str, Any]:
     input_dir = payload.get("inputDir")
     root_path = payload.get("rootPath", "")
     dry_run = bool(payload.get("dryRun", False))
+    job_id = payload.get("jobId")
 
     if not input_dir:
         return {"ok": False, "error": "inputDir is required"}
@@ -79,54 +305,305 @@ def _run_import_job(payload: Dict[str, Any]) -> Dict[str, Any]:
         cmd += ["--root-path", root_path]
     if dry_run:
         cmd += ["--dry-run"]
+    cmd += ["--workers", str(JOB_RENDER_WORKERS)]
+    stats_fd, stats_path = tempfile.mkstemp(prefix="import-stats-", suffix=".json")
+    os.close(stats_fd)
+    temp_paths = [stats_path]
+    cmd += ["--stats-json", stats_path, "--progress-interval", str(CHILD_PROGRESS_SEC)]
+    if payload.get("shard"):
+        shard_fd, shard_path = tempfile.mkstemp(prefix="import-shard-", suffix=".json")
+        with os.fdopen(shard_fd, "w", encoding="utf-8") as fh:
+            json.dump({"folders": payload["shard"]}, fh)
+        temp_paths.append(shard_path)
+        cmd += ["--shard-file", shard_path]
+    if job_id:
+        # import_photos checkpoints under importJobs/{jobId}/ledger, so a
+        # redelivered or restarted job resumes where the last attempt stopped
+        cmd += ["--job-id", job_id, "--jobs-collection", IMPORT_JOBS_COLLECTION]
+    # Concurrent jobs share import_photos' default manifest (WAL, short
+    # commits), so unchanged files and reusable renditions are found
+    # whichever job imported them first
 
     env = os.environ.copy()
     env["PYTHONUNBUFFERED"] = "1"
 
     t0 = time.time()
     try:
-        cp = subprocess.run(
-            cmd,
-            env=env,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            check=False,
-            timeout=SUBPROCESS_TIMEOUT_SEC,
-        )
-    except subprocess.TimeoutExpired as exc:
-        dt = time.time() - t0
-        return {
-            "ok": False,
-            "error": f"subprocess timeout (> {SUBPROCESS_TIMEOUT_SEC}s)",
-            "elapsedSec": round(dt, 3),
-            "stdoutTail": _tail(getattr(exc, "stdout", None), RET_TAIL),
-            "stderrTail": _tail(getattr(exc, "stderr", None), RET_TAIL),
-        }
+        return _run_subprocess(cmd, env, t0, stats_path, on_event, on_tick, job_id, _runner_pool)
+    finally:
+        for path in temp_paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
 
+def _read_stats(path: str) -> Optional[Dict[str, Any]]:
+    """Per-stage timings written by import_photos --stats-json, if any."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _run_subprocess(
+    cmd,
+    env,
+    t0: float,
+    stats_path: str,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    on_tick: Optional[Callable[[], None]] = None,
+    job_id: Optional[str] = None,
+    runners: Optional[RunnerPool] = None,
+) -> Dict[str, Any]:
+    """
+    Run the import, streaming its output: progress events from stderr go to
+    on_event, every other line to the log as it arrives and into bounded
+    tails. on_tick runs about every POLL_SEC while the child is alive
+    (progress writes). With runners, the import runs in a warm
+    runner instead of a new import_photos.py process.
+    """
+    log_prefix = f"[{job_id}] " if job_id else ""
+
+    def on_line(stream: str, line: str) -> bool:
+        if stream == "stderr" and on_event is not None:
+            event = _progress_event(line)
+            if event is not None:
+                on_event(event)
+                return True
+        _log(f"{log_prefix}{line.rstrip()}")
+        return False
+
+    options = dict(
+        timeout_sec=SUBPROCESS_TIMEOUT_SEC, on_line=on_line, on_tick=on_tick, poll_sec=POLL_SEC, tail_chars=RET_TAIL
+    )
+    if runners is not None:
+        # cmd is [python, import_photos.py, *argv]
+        run = runners.run(job_id, cmd[2:], **options)
+    else:
+        run = run_streaming(cmd, env=env, **options)
+    timed_out = run.timed_out
     dt = time.time() - t0
-    return {
-        "ok": cp.returncode == 0,
-        "exitCode": cp.returncode,
+    result: Dict[str, Any] = {
+        "ok": run.returncode == 0 and not timed_out,
+        "exitCode": run.returncode,
         "elapsedSec": round(dt, 3),
-        "stdoutTail": _tail(cp.stdout, RET_TAIL),
-        "stderrTail": _tail(cp.stderr, RET_TAIL),
+        "stdoutTail": run.stdout,
+        "stderrTail": run.stderr,
     }
-
-
-def _handle_message(db: firestore.Client, message: pubsub_v1.subscriber.message.Message) -> None:
+    if timed_out:
+        result["error"] = f"subprocess timeout (> {SUBPROCESS_TIMEOUT_SEC}s)"
+    elif run.returncode == RUNNER_LOST and runners is not None:
+        result["error"] = "import runner exited during the job"
+    stats = _read_stats(stats_path)
+    if stats is not None:
+        result["stats"] = stats
+    return result
+
+
+def _plan_job(input_dir: str, max_photos: int) -> Dict[str, Any]:
+    """Scan input_dir with import_plan.py; returns its plan (see that script)."""
+    cp = subprocess.run(
+        [sys.executable, str(PLAN_SCRIPT_PATH), "--input-dir", input_dir, "--max-photos", str(max_photos)],
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        check=False,
+        timeout=PLAN_TIMEOUT_SEC,
+    )
+    if cp.returncode != 0:
+        raise RuntimeError(f"import_plan.py exit={cp.returncode}: {_tail(cp.stderr, LOG_TAIL)}")
+    return json.loads(cp.stdout)
+
+
+def child_job_id(parent_id: str, index: int) -> str:
+    return f"{parent_id}-{index:03d}"
+
+
+def child_payloads(payload: Dict[str, Any], plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Sub-job payloads for a planned job. Children keep the parent's workerId:
+    a routed job's inputDir is only known to exist on that worker. Unrouted
+    children can run on any worker that sees inputDir at the same path.
+    """
+    parent_id = payload["jobId"]
+    shards = plan["shards"]
+    return [
+        {
+            "jobId": child_job_id(parent_id, index),
+            "parentJobId": parent_id,
+            "shardIndex": index,
+            "shardCount": len(shards),
+            "shard": shard["folders"],
+            "plannedPhotos": shard["photos"],
+            "inputDir": payload["inputDir"],
+            "rootPath": payload.get("rootPath", ""),
+            "dryRun": bool(payload.get("dryRun", False)),
+            "requestedBy": payload.get("requestedBy"),
+            "workerId": payload.get("workerId"),
+        }
+        for index, shard in enumerate(shards)
+    ]
+
+
+def _fan_out(
+    db: firestore.Client,
+    payload: Dict[str, Any],
+    children: List[Dict[str, Any]],
+    publish: Callable[[Dict[str, Any]], None],
+) -> None:
+    """
+    Create the sub-job docs and publish them. Each child is marked with
+    publishedAt once its publish went through, so when a publish fails (the
+    parent is nacked and redelivered) the next fan-out publishes exactly the
+    children still queued and unsent. Children that already exist are not
+    written again.
+    """
+    col = db.collection(IMPORT_JOBS_COLLECTION)
+    existing = get_existing(db, IMPORT_JOBS_COLLECTION, [child["jobId"] for child in children])
+    fresh = [child for child in children if child["jobId"] not in existing]
+    for start in range(0, len(fresh), 400):
+        batch = db.batch()
+        for child in fresh[start : start + 400]:
+            batch.set(col.document(child["jobId"]), {**child, "status": "queued", "createdAt": firestore.SERVER_TIMESTAMP})
+        batch.commit()
+    for child in children:
+        doc = existing.get(child["jobId"])
+        if doc is not None and (doc.get("publishedAt") or (doc.get("status") or "queued") != "queued"):
+            continue
+        publish(child)
+        _update_job(db, child["jobId"], {"publishedAt": firestore.SERVER_TIMESTAMP})
+
+
+def aggregate_children(statuses: List[Optional[str]], progress: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Parent job fields from its children's statuses and progress."""
+    # Every key is always written: the parent doc is merged, not replaced
+    counts = {"queued": 0, "running": 0, "done": 0, "error": 0}
+    for status in statuses:
+        key = status or "queued"
+        counts[key] = counts.get(key, 0) + 1
+    if counts["done"] == len(statuses):
+        status = "done"
+    elif counts["queued"] or counts["running"]:
+        status = "running"
+    else:
+        # Failed children are retried on redelivery; the parent follows them
+        status = "error"
+    totals = {"photosDone": 0, "photosTotal": 0, "photosFailed": 0, "bytesUploaded": 0}
+    for fields in progress:
+        for key in totals:
+            totals[key] += int(fields.get(key) or 0)
+    return {"status": status, "children": counts, "progress": totals}
+
+
+def _update_parent(db: firestore.Client, parent_id: str) -> None:
+    """
+    Recompute the parent job from its children. The children are read and
+    the parent written in one transaction: two children finishing at the same
+    time could otherwise each miss the other's status and leave the parent
+    at "running".
+    """
+    col = db.collection(IMPORT_JOBS_COLLECTION)
+    query = col.where(filter=firestore.FieldFilter("parentJobId", "==", parent_id)).select(["status", "progress"])
+
+    @firestore.transactional
+    def update(transaction) -> None:
+        docs = [snap.to_dict() or {} for snap in query.stream(transaction=transaction)]
+        if not docs:
+            return
+        fields = aggregate_children([d.get("status") for d in docs], [d.get("progress") or {} for d in docs])
+        if fields["status"] != "running":
+            fields["finishedAt"] = firestore.SERVER_TIMESTAMP
+        transaction.set(col.document(parent_id), fields, merge=True)
+
+    update(db.transaction())
+
+
+def _shard_photos(payload: Dict[str, Any]) -> int:
+    if payload.get("parentJobId"):
+        return 0
+    return int(payload.get("shardPhotos") or DEFAULT_SHARD_PHOTOS)
+
+
+def _handle_message(
+    db: firestore.Client,
+    message: pubsub_v1.subscriber.message.Message,
+    publish: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> None:
     payload = json.loads(message.data.decode("utf-8"))
     job_id = payload.get("jobId")
     if not job_id:
         _log("message missing jobId, acking")
         message.ack()
         return
+    if not _routed_here(payload):
+        _reroute(db, message, payload, publish)
+        return
+
+    job = _get_job(db, job_id)
+    if job.get("status") == "done" or job.get("childCount"):
+        _log(f"job {job_id} already done or fanned out, acking redelivery")
+        message.ack()
+        return
 
-    _log(f"job {job_id} start")
-    _update_job(db, job_id, {"status": "running", "startedAt": firestore.SERVER_TIMESTAMP})
+    shard_photos = _shard_photos(payload)
+    if shard_photos and publish is not None and payload.get("inputDir"):
+        try:
+            plan = _plan_job(payload["inputDir"], shard_photos)
+        except (RuntimeError, ValueError, OSError, subprocess.SubprocessError) as exc:
+            _log(f"job {job_id} planning failed ({exc!r}), running it whole")
+            plan = None
+        if plan is not None and len(plan["shards"]) > 1:
+            children = child_payloads(payload, plan)
+            try:
+                _fan_out(db, payload, children, publish)
+            except Exception as exc:
+                # Redelivery finishes the fan-out: children already sent are not sent again
+                _log(f"job {job_id} fan-out failed ({exc!r}), nacking")
+                message.nack()
+                return
+            _update_job(
+                db,
+                job_id,
+                {
+                    "status": "running",
+                    "startedAt": firestore.SERVER_TIMESTAMP,
+                    "childCount": len(children),
+                    "plannedPhotos": plan["photos"],
+                    "plannedFolders": plan["folders"],
+                    "children": {"queued": len(children)},
+                },
+            )
+            _log(f"job {job_id} fanned out children={len(children)} photos={plan['photos']}")
+            message.ack()
+            return
+
+    blocker = _wait_for_admission()
+    if blocker is not None:
+        _log(f"job {job_id} not admitted ({blocker}), nacking")
+        message.nack()
+        return
 
-    result = _run_import_job(payload)
+    attempt = int(job.get("attempts") or 0) + 1
+    _log(f"job {job_id} start attempt={attempt}")
+    _update_job(
+        db,
+        job_id,
+        {"status": "running", "startedAt": firestore.SERVER_TIMESTAMP, "attempts": attempt, "resumed": attempt > 1},
+    )
+    parent_id = payload.get("parentJobId")
+    if parent_id:
+        _update_parent(db, parent_id)
+
+    progress = JobProgress(
+        lambda fields: _update_job(db, job_id, {"progress": fields, "progressAt": firestore.SERVER_TIMESTAMP})
+    )
+    result = _run_import_job(payload, on_event=progress.update, on_tick=progress.maybe_write)
+    if progress.latest is not None:
+        # The child's final progress event rides along with the status write
+        result["progress"] = progress.latest
     if result.get("ok"):
         _update_job(
             db,
@@ -134,6 +611,8 @@ def _handle_message(db: firestore.Client, message: pubsub_v1.subscriber.message.
             {"status": "done", "finishedAt": firestore.SERVER_TIMESTAMP, **result},
         )
         _log(f"job {job_id} done")
+        if parent_id:
+            _update_parent(db, parent_id)
         message.ack()
         return
 
@@ -143,22 +622,71 @@ def _handle_message(db: firestore.Client, message: pubsub_v1.subscriber.message.
         {"status": "error", "finishedAt": firestore.SERVER_TIMESTAMP, **result},
     )
     _log(f"job {job_id} failed")
+    if parent_id:
+        _update_parent(db, parent_id)
     message.nack()
 
 
 def main() -> None:
     if not IMPORT_JOBS_SUBSCRIPTION:
         raise SystemExit("IMPORT_JOBS_SUBSCRIPTION is required")
+    if WORKER_SUBSCRIPTION and not WORKER_ID:
+        raise SystemExit("IMPORT_WORKER_SUBSCRIPTION needs IMPORT_WORKER_ID")
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
+
+    global _runner_pool
+    if WARM_RUNNERS:
+        _runner_pool = RunnerPool({**os.environ, "PYTHONUNBUFFERED": "1"}, RUNNER_MAX_JOBS)
 
     db = _init_firestore()
     subscriber = pubsub_v1.SubscriberClient()
-    future = subscriber.subscribe(IMPORT_JOBS_SUBSCRIPTION, callback=lambda msg: _handle_message(db, msg))
-    _log(f"listening on {IMPORT_JOBS_SUBSCRIPTION}")
+    publisher = pubsub_v1.PublisherClient()
+    topic = IMPORT_JOBS_TOPIC or subscriber.get_subscription(request={"subscription": IMPORT_JOBS_SUBSCRIPTION}).topic
+
+    def publish(payload: Dict[str, Any]) -> None:
+        attributes = {"workerId": payload["workerId"]} if payload.get("workerId") else {}
+        publisher.publish(topic, json.dumps(payload).encode("utf-8"), **attributes).result(timeout=60)
+
+    # Lease at most MAX_CONCURRENT_JOBS messages; the rest stay on the
+    # subscription for other workers instead of queueing up here.
+    # The client extends leases on its own but gives up after
+    # max_lease_duration (default 1h); keep that beyond the longest a job
+    # can hold its message: planning, admission wait and the import.
+    flow_control = pubsub_v1.types.FlowControl(
+        max_messages=MAX_CONCURRENT_JOBS,
+        max_lease_duration=int(PLAN_TIMEOUT_SEC + ADMISSION_WAIT_SEC + SUBPROCESS_TIMEOUT_SEC + LEASE_MARGIN_SEC),
+    )
+    # Both streams (shared and this worker's own) run jobs on the same
+    # MAX_CONCURRENT_JOBS threads
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix="import-job")
+    subscriptions = [IMPORT_JOBS_SUBSCRIPTION] + ([WORKER_SUBSCRIPTION] if WORKER_SUBSCRIPTION else [])
+    futures = [
+        subscriber.subscribe(
+            subscription,
+            callback=lambda msg: _handle_message(db, msg, publish),
+            flow_control=flow_control,
+            scheduler=ThreadScheduler(executor=executor),
+        )
+        for subscription in subscriptions
+    ]
+    _log(
+        f"listening on {' '.join(subscriptions)} worker_id={WORKER_ID or '-'} "
+        f"max_jobs={MAX_CONCURRENT_JOBS} render_workers={JOB_RENDER_WORKERS} warm_runners={WARM_RUNNERS}"
+    )
 
     try:
-        future.result()
+        for future in futures:
+            future.result()
     except KeyboardInterrupt:
-        future.cancel()
+        pass
+    finally:
+        for future in futures:
+            future.cancel()
+        if _runner_pool is not None:
+            _runner_pool.close()
 
 
 if __name__ == "__main__":
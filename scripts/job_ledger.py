@@ -0,0 +1,129 @@
+"""
+Per-job progress ledger for resumable imports.
+
+Progress is checkpointed to importJobs/{jobId}/ledger/{folderDocId}, one doc
+per folder:
+
+  { folderPath, total, nextOrder, done, updatedAt }
+
+Photos inside a folder are processed by their per-folder order, so a single
+watermark is enough: nextOrder is the lowest order that is not known to be
+finished yet (every photo below it was imported or skipped). Photos can
+finish out of order; the watermark only advances over a contiguous prefix.
+A restarted job skips folders marked done and photos below nextOrder
+without listing them against Firestore again.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Set
+
+LEDGER_SUBCOLLECTION = "ledger"
+
+
+def _ledger_doc_id(folder_path: str) -> str:
+    return folder_path.lstrip("/").replace("/", "_") or "root"
+
+
+@dataclass
+class FolderProgress:
+    total: Optional[int] = None
+    next_order: int = 0
+    finished: Set[int] = field(default_factory=set)
+    dirty: bool = False
+
+    @property
+    def done(self) -> bool:
+        return self.total is not None and self.next_order >= self.total
+
+
+class JobLedger:
+    def __init__(
+        self,
+        db,
+        job_id: str,
+        writer,
+        collection: str = "importJobs",
+        interval_sec: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+        server_timestamp=None,
+    ):
+        self.db = db
+        self.job_id = job_id
+        self.writer = writer
+        self.path = f"{collection}/{job_id}/{LEDGER_SUBCOLLECTION}"
+        self.interval_sec = interval_sec
+        self._clock = clock
+        self._last_checkpoint = clock()
+        self._server_timestamp = server_timestamp
+        self._folders: Dict[str, FolderProgress] = {}
+
+    def load(self) -> int:
+        """Read existing checkpoints; returns the number of folders found."""
+        for snap in self.db.collection(self.path).stream():
+            data = snap.to_dict() or {}
+            folder_path = data.get("folderPath")
+            if folder_path is None:
+                continue
+            self._folders[folder_path] = FolderProgress(
+                total=data.get("total"),
+                next_order=int(data.get("nextOrder") or 0),
+            )
+        return len(self._folders)
+
+    def _folder(self, folder_path: str) -> FolderProgress:
+        return self._folders.setdefault(folder_path, FolderProgress())
+
+    def folder_done(self, folder_path: str) -> bool:
+        progress = self._folders.get(folder_path)
+        return bool(progress and progress.done)
+
+    def resume_from(self, folder_path: str) -> int:
+        progress = self._folders.get(folder_path)
+        return progress.next_order if progress else 0
+
+    def start_folder(self, folder_path: str, total: int, first: int = 0) -> None:
+        """total is the end of this job's slice of the folder, first its start."""
+        progress = self._folder(folder_path)
+        if progress.next_order < first:
+            # A shard's watermark starts at its slice; lower orders belong to others
+            progress.next_order = first
+            progress.dirty = True
+        if progress.total != total:
+            progress.total = total
+            progress.dirty = True
+        self.checkpoint(force=progress.done)
+
+    def photo_done(self, folder_path: str, order: int) -> None:
+        progress = self._folder(folder_path)
+        if order < progress.next_order:
+            return
+        progress.finished.add(order)
+        while progress.next_order in progress.finished:
+            progress.finished.discard(progress.next_order)
+            progress.next_order += 1
+            progress.dirty = True
+        self.checkpoint(force=progress.done)
+
+    def checkpoint(self, force: bool = False) -> None:
+        """Queue dirty folders on the writer, at most once per interval_sec."""
+        if not force and self._clock() - self._last_checkpoint < self.interval_sec:
+            # Checkpoints queued earlier still go out on the writer's interval
+            self.writer.maybe_flush()
+            return
+        self._last_checkpoint = self._clock()
+        for folder_path, progress in self._folders.items():
+            if not progress.dirty:
+                continue
+            progress.dirty = False
+            data = {
+                "folderPath": folder_path,
+                "total": progress.total,
+                "nextOrder": progress.next_order,
+                "done": progress.done,
+            }
+            if self._server_timestamp is not None:
+                data["updatedAt"] = self._server_timestamp
+            self.writer.set(self.path, _ledger_doc_id(folder_path), data, merge=True)
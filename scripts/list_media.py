@@ -7,7 +7,7 @@ import argparse
 import os
 import sys
 from pathlib import Path
-from typing import Iterable, List, Set
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
 
 IMAGE_EXTS: Set[str] = {
     ".jpg", ".jpeg", ".png", ".heic", ".webp", ".gif", ".bmp", ".tiff", ".tif"
@@ -33,6 +33,31 @@ def iter_media_files(base: Path, include_hidden: bool) -> Iterable[Path]:
             yield p
 
 
+def collect_media(
+    base: Path,
+    include_hidden: bool = False,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Dict[str, Any]:
+    """Media files directly under base (at most MAX_FILES), sorted by name, as plain data."""
+    files: List[Path] = []
+    cancelled = False
+    for p in iter_media_files(base, include_hidden=include_hidden):
+        if should_stop is not None and should_stop():
+            cancelled = True
+            break
+        files.append(p)
+        if len(files) >= MAX_FILES:
+            break
+    return {
+        "dir": str(base),
+        "files": [str(p) for p in sorted(files, key=lambda x: x.name.lower())],
+        "count": len(files),
+        "max_files": MAX_FILES,
+        "truncated": len(files) >= MAX_FILES,
+        "cancelled": cancelled,
+    }
+
+
 def main() -> int:
     try:
         sys.stdout.reconfigure(encoding="utf-8", errors="replace")
@@ -52,24 +77,20 @@ def main() -> int:
         print(f"[ERROR] dir not found or not a directory: {args.dir!r}")
         return 1
 
-    files: List[Path] = []
-    for p in iter_media_files(base, include_hidden=args.include_hidden):
-        files.append(p)
-        if len(files) >= MAX_FILES:
-            break
+    result = collect_media(base, include_hidden=args.include_hidden)
 
     print(f"[INFO] MAX_MEDIA_FILES={MAX_FILES}")
     print(f"[INFO] dir={str(base)}")
 
-    if not files:
+    if not result["files"]:
         print("[RESULT] No media files found.")
         return 0
 
-    print(f"\n[RESULT] Media files ({len(files)}):")
-    for p in sorted(files, key=lambda x: x.name.lower()):
-        print(str(p))
+    print(f"\n[RESULT] Media files ({result['count']}):")
+    for p in result["files"]:
+        print(p)
 
-    print(f"\n[SUMMARY] Total media files listed: {len(files)}")
+    print(f"\n[SUMMARY] Total media files listed: {result['count']}")
     return 0
 
 
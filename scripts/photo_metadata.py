@@ -0,0 +1,102 @@
+"""
+Header-only capture time extraction for import_photos.
+
+Image.open() only parses the file header; getexif() reads the EXIF block
+(JPEG APP1, HEIF/TIFF/WebP metadata) without decoding any pixels, so this is
+cheap enough to run for every photo, including ones whose renditions are
+reused instead of rendered.
+
+The capture time comes from DateTimeOriginal (falling back to
+DateTimeDigitized, then the IFD0 DateTime) together with the matching
+OffsetTime* tag. EXIF times without an offset are taken as local time of the
+importing machine. year/month/day are the photo's own wall-clock date, so
+they stay stable regardless of the timezone used to store capturedAt.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+EXIF_IFD = 0x8769
+
+TAG_DATETIME = 0x0132
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_DATETIME_DIGITIZED = 0x9004
+TAG_OFFSET_TIME = 0x9010
+TAG_OFFSET_TIME_ORIGINAL = 0x9011
+TAG_OFFSET_TIME_DIGITIZED = 0x9012
+
+
+def _clean(value: Any) -> Optional[str]:
+    if isinstance(value, bytes):
+        value = value.decode("ascii", "replace")
+    if not isinstance(value, str):
+        return None
+    value = value.strip("\x00 ")
+    return value or None
+
+
+def parse_exif_datetime(value: Any, offset: Any = None) -> Optional[datetime]:
+    """Parse "YYYY:MM:DD HH:MM:SS" (+ optional "+09:00" offset); None if unusable."""
+    text = _clean(value)
+    if text is None:
+        return None
+    try:
+        dt = datetime.strptime(text[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    offset_text = _clean(offset)
+    if offset_text:
+        try:
+            sign = -1 if offset_text[0] == "-" else 1
+            hours, minutes = offset_text.lstrip("+-").split(":")
+            delta = timedelta(hours=int(hours), minutes=int(minutes))
+            return dt.replace(tzinfo=timezone(sign * delta))
+        except (ValueError, IndexError):
+            pass
+    return dt
+
+
+def capture_time_from_image(im: Image.Image) -> Optional[datetime]:
+    try:
+        exif = im.getexif()
+    except Exception:
+        return None
+    if not exif:
+        return None
+    sub = exif.get_ifd(EXIF_IFD)
+    for tag, offset_tag, tags in (
+        (TAG_DATETIME_ORIGINAL, TAG_OFFSET_TIME_ORIGINAL, sub),
+        (TAG_DATETIME_DIGITIZED, TAG_OFFSET_TIME_DIGITIZED, sub),
+        (TAG_DATETIME, TAG_OFFSET_TIME, exif),
+    ):
+        dt = parse_exif_datetime(tags.get(tag), sub.get(offset_tag))
+        if dt is not None:
+            return dt
+    return None
+
+
+def read_capture_time(path: Path) -> Optional[datetime]:
+    """Capture time of an image file, reading only its header."""
+    try:
+        with Image.open(path) as im:
+            return capture_time_from_image(im)
+    except Exception:
+        return None
+
+
+def capture_fields(captured_at: Optional[datetime]) -> Dict[str, Any]:
+    """Photo doc fields: capturedAt plus denormalized year/month/day."""
+    if captured_at is None:
+        return {"capturedAt": None}
+    stored = captured_at if captured_at.tzinfo is not None else captured_at.astimezone()
+    return {
+        "capturedAt": stored,
+        "year": captured_at.year,
+        "month": captured_at.month,
+        "day": captured_at.day,
+    }
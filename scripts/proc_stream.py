@@ -0,0 +1,210 @@
+"""
+Run a child process while streaming its output.
+
+subprocess.run(capture_output=True) holds everything a child prints until
+it exits. A long import prints a line per photo, so that is hours of output
+kept in memory only to be cut down to a tail at the end. run_streaming reads
+stdout and stderr line by line as they arrive. Each line is handed to a
+callback (live logging, progress parsing) and kept in a TailBuffer of fixed
+size, so memory stays constant however long the child runs.
+
+run_streaming_async does the same on an asyncio event loop, for callers
+(the MCP server) that must not block their loop while a child runs.
+
+Children start in a session of their own. On a timeout the whole process
+group is killed, not just the child: import_photos --workers N has render
+processes of its own, and those would otherwise keep running and keep the
+output pipes open.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional, Sequence
+
+DEFAULT_TAIL_CHARS = 20000
+# asyncio's readline() gives up on longer lines; they are dropped
+ASYNC_LINE_LIMIT = 1 << 20
+
+# on_line(stream, line) with stream "stdout" or "stderr"; returning True
+# consumes the line (it is left out of the tail, e.g. a parsed progress event)
+LineCallback = Callable[[str, str], Optional[bool]]
+
+
+class TailBuffer:
+    """The last max_chars characters of a stream of lines."""
+
+    def __init__(self, max_chars: int = DEFAULT_TAIL_CHARS):
+        self.max_chars = max_chars
+        self._lines: Deque[str] = deque()
+        self._chars = 0
+
+    def append(self, line: str) -> None:
+        if len(line) > self.max_chars:
+            line = line[-self.max_chars :]
+        self._lines.append(line)
+        self._chars += len(line)
+        while self._chars > self.max_chars:
+            self._chars -= len(self._lines.popleft())
+
+    def text(self) -> str:
+        return "".join(self._lines)
+
+
+@dataclass
+class StreamResult:
+    returncode: Optional[int]
+    timed_out: bool
+    elapsed_sec: float
+    stdout: str
+    stderr: str
+
+
+def kill_process_group(proc) -> None:
+    """SIGKILL proc and everything it started (its process group); kill() where there are no groups."""
+    if not hasattr(os, "killpg"):
+        proc.kill()
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _pump(name: str, stream, tail: TailBuffer, on_line: Optional[LineCallback]) -> None:
+    for line in stream:
+        if on_line is not None and on_line(name, line):
+            continue
+        tail.append(line)
+
+
+def run_streaming(
+    cmd: Sequence[str],
+    env: Optional[Dict[str, str]] = None,
+    timeout_sec: Optional[float] = None,
+    on_line: Optional[LineCallback] = None,
+    on_tick: Optional[Callable[[], None]] = None,
+    poll_sec: float = 1.0,
+    tail_chars: int = DEFAULT_TAIL_CHARS,
+) -> StreamResult:
+    """
+    Run cmd to completion (or kill it after timeout_sec), keeping the last
+    tail_chars of each stream. on_line runs on reader threads as lines
+    arrive; on_tick runs on the calling thread about every poll_sec while
+    the child is alive.
+    """
+    t0 = time.monotonic()
+    tails = {"stdout": TailBuffer(tail_chars), "stderr": TailBuffer(tail_chars)}
+    with subprocess.Popen(
+        list(cmd),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        start_new_session=True,
+    ) as proc:
+        readers = [
+            threading.Thread(target=_pump, args=(name, getattr(proc, name), tails[name], on_line), daemon=True)
+            for name in ("stdout", "stderr")
+        ]
+        for reader in readers:
+            reader.start()
+
+        timed_out = False
+        while True:
+            try:
+                proc.wait(timeout=poll_sec)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if timeout_sec is not None and time.monotonic() - t0 > timeout_sec:
+                kill_process_group(proc)
+                proc.wait()
+                timed_out = True
+                break
+            if on_tick is not None:
+                on_tick()
+        for reader in readers:
+            reader.join(timeout=10)
+
+    return StreamResult(
+        returncode=proc.returncode,
+        timed_out=timed_out,
+        elapsed_sec=time.monotonic() - t0,
+        stdout=tails["stdout"].text(),
+        stderr=tails["stderr"].text(),
+    )
+
+
+async def _pump_async(name: str, stream: asyncio.StreamReader, tail: TailBuffer, on_line: Optional[LineCallback]) -> None:
+    while True:
+        try:
+            raw = await stream.readline()
+        except ValueError:
+            continue  # over ASYNC_LINE_LIMIT
+        if not raw:
+            return
+        line = raw.decode("utf-8", errors="replace").replace("\r\n", "\n")
+        if on_line is not None and on_line(name, line):
+            continue
+        tail.append(line)
+
+
+async def run_streaming_async(
+    cmd: Sequence[str],
+    env: Optional[Dict[str, str]] = None,
+    timeout_sec: Optional[float] = None,
+    on_line: Optional[LineCallback] = None,
+    tail_chars: int = DEFAULT_TAIL_CHARS,
+) -> StreamResult:
+    """
+    run_streaming without threads: the child is started with
+    asyncio.create_subprocess_exec and its output is read on the running
+    loop, so other coroutines keep going while it runs. on_line runs on the
+    loop and must not block. If the awaiting task is cancelled the child is
+    killed.
+    """
+    t0 = time.monotonic()
+    tails = {"stdout": TailBuffer(tail_chars), "stderr": TailBuffer(tail_chars)}
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        limit=ASYNC_LINE_LIMIT,
+        start_new_session=True,
+    )
+    readers = asyncio.gather(
+        _pump_async("stdout", proc.stdout, tails["stdout"], on_line),
+        _pump_async("stderr", proc.stderr, tails["stderr"], on_line),
+    )
+    timed_out = False
+    try:
+        await asyncio.wait_for(proc.wait(), timeout_sec)
+    except asyncio.TimeoutError:
+        timed_out = True
+    finally:
+        if proc.returncode is None:
+            kill_process_group(proc)
+            await proc.wait()
+        try:
+            await asyncio.wait_for(readers, 10)
+        except asyncio.TimeoutError:
+            pass
+
+    return StreamResult(
+        returncode=proc.returncode,
+        timed_out=timed_out,
+        elapsed_sec=time.monotonic() - t0,
+        stdout=tails["stdout"].text(),
+        stderr=tails["stderr"].text(),
+    )
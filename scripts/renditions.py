@@ -0,0 +1,446 @@
+"""
+Decode-once rendition engine for import_photos.
+
+Each source image is opened and converted to RGB exactly once. Renditions are
+then produced largest-first, each one downscaled from the previous result, so
+the default pipeline builds the 1280px medium from the source and the 256px
+thumb from the medium.
+
+A rendition is described by a RenditionSpec and can be given on the command
+line as NAME:LONG_EDGE[:FORMAT[:QUALITY[:MAX_BYTES]]], e.g. "medium:1600:webp:80"
+or "medium:1280:avif:70:150k". Formats are jpeg, pjpeg (progressive JPEG),
+png, webp and avif (when the installed Pillow has AVIF support). With
+MAX_BYTES the encoder searches for the highest quality, down to
+MIN_BUDGET_QUALITY, whose output fits the byte budget.
+
+Many sources carry an embedded preview: an MPF "large thumbnail" frame in
+camera JPEGs, the EXIF IFD1 thumbnail, or HEIF thumbnail items. For each
+rendition, render_source() picks the smallest preview that is at least as
+large as the rendition and has the primary image's aspect ratio, decodes
+the full-resolution image only for renditions no preview covers, and
+reports which sources it used.
+
+JPEG (and MPO) sources are decoded with draft() so libjpeg scales by 1/2,
+1/4 or 1/8 while decoding; they are never held in memory at more than about
+twice the largest rendition's size. Pillow has no reduced decode for PNG,
+TIFF, WebP or HEIF: those are decoded at full resolution and then shrunk
+with reduce() before the RGB conversion, so only the converted copy is
+small. A max_pixels ceiling on the decoded size (the header size for those
+formats) rejects pathological inputs with SourceTooLarge before any pixels
+are read.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import asdict, dataclass, replace
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import ExifTags, Image, features
+from pillow_heif import open_heif, register_heif_opener
+
+register_heif_opener()
+
+# format name -> (Pillow format, file extension, content type)
+FORMATS: Dict[str, Tuple[str, str, str]] = {
+    "jpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "png": ("PNG", ".png", "image/png"),
+    "pjpeg": ("JPEG", ".jpg", "image/jpeg"),
+    "webp": ("WEBP", ".webp", "image/webp"),
+}
+if features.check("avif"):
+    FORMATS["avif"] = ("AVIF", ".avif", "image/avif")
+FORMAT_ALIASES = {"jpg": "jpeg", "progressive": "pjpeg"}
+
+# Lowest quality a byte budget may push an encode down to
+MIN_BUDGET_QUALITY = 30
+
+# Where render_source() took its pixels from
+SOURCE_FULL = "full"
+SOURCE_MPF = "mpf"
+SOURCE_EXIF = "exif"
+SOURCE_HEIF = "heif"
+
+# Relative aspect ratio difference allowed between a preview and the image;
+# anything more is letterboxed or cropped.
+PREVIEW_ASPECT_TOLERANCE = 0.01
+
+# Decode at least this many times the target size before the final
+# LANCZOS resample, same as Image.thumbnail's default reducing_gap.
+REDUCING_GAP = 2.0
+
+TAG_JPEG_IF_OFFSET = 0x0201
+TAG_JPEG_IF_LENGTH = 0x0202
+
+
+@dataclass(frozen=True)
+class RenditionSpec:
+    name: str
+    long_edge: int
+    format: str = "jpeg"
+    quality: int = 90
+    max_bytes: Optional[int] = None
+
+    @property
+    def extension(self) -> str:
+        return FORMATS[self.format][1]
+
+    @property
+    def content_type(self) -> str:
+        return FORMATS[self.format][2]
+
+    def params(self) -> Dict[str, object]:
+        """Everything that affects the encoded bytes (i.e. all but the name and unset options)."""
+        return {k: v for k, v in asdict(self).items() if k != "name" and v is not None}
+
+    @property
+    def params_key(self) -> str:
+        return json.dumps(self.params(), sort_keys=True)
+
+
+@dataclass
+class Rendition:
+    spec: RenditionSpec
+    data: bytes
+    size: Tuple[int, int]
+    quality: Optional[int] = None
+
+    def open(self) -> BytesIO:
+        return BytesIO(self.data)
+
+
+DEFAULT_RENDITIONS: Tuple[RenditionSpec, ...] = (
+    RenditionSpec("thumb", 256),
+    RenditionSpec("medium", 1280),
+)
+REQUIRED_RENDITIONS = ("thumb", "medium")
+
+
+def parse_byte_size(text: str) -> int:
+    """Parse "150000", "150k" or "1.5m" into bytes."""
+    units = {"k": 1024, "m": 1024 * 1024}
+    text = text.strip().lower().rstrip("b")
+    multiplier = units.get(text[-1:], 1)
+    if multiplier != 1:
+        text = text[:-1]
+    return int(float(text) * multiplier)
+
+
+def parse_rendition_spec(text: str) -> RenditionSpec:
+    parts = [p.strip() for p in text.split(":")]
+    if len(parts) < 2 or len(parts) > 5 or not parts[0]:
+        raise ValueError(f"invalid rendition {text!r} (expected NAME:LONG_EDGE[:FORMAT[:QUALITY[:MAX_BYTES]]])")
+    name = parts[0]
+    try:
+        long_edge = int(parts[1])
+    except ValueError:
+        raise ValueError(f"invalid long edge in rendition {text!r}") from None
+    if long_edge <= 0:
+        raise ValueError(f"long edge must be positive in rendition {text!r}")
+
+    spec = RenditionSpec(name, long_edge)
+    if len(parts) >= 3 and parts[2]:
+        fmt = parts[2].lower()
+        fmt = FORMAT_ALIASES.get(fmt, fmt)
+        if fmt not in FORMATS:
+            raise ValueError(f"unsupported format {parts[2]!r} in rendition {text!r}")
+        spec = replace(spec, format=fmt)
+    if len(parts) >= 4 and parts[3]:
+        try:
+            quality = int(parts[3])
+        except ValueError:
+            raise ValueError(f"invalid quality in rendition {text!r}") from None
+        if not 1 <= quality <= 100:
+            raise ValueError(f"quality must be 1-100 in rendition {text!r}")
+        spec = replace(spec, quality=quality)
+    if len(parts) == 5 and parts[4]:
+        try:
+            max_bytes = parse_byte_size(parts[4])
+        except ValueError:
+            raise ValueError(f"invalid byte budget in rendition {text!r}") from None
+        if max_bytes <= 0:
+            raise ValueError(f"byte budget must be positive in rendition {text!r}")
+        spec = replace(spec, max_bytes=max_bytes)
+    return spec
+
+
+def merge_rendition_specs(
+    overrides: Iterable[RenditionSpec],
+    defaults: Iterable[RenditionSpec] = DEFAULT_RENDITIONS,
+) -> Tuple[RenditionSpec, ...]:
+    """Overlay overrides on defaults by name, keeping definition order."""
+    merged: Dict[str, RenditionSpec] = {s.name: s for s in defaults}
+    for spec in overrides:
+        merged[spec.name] = spec
+    missing = [n for n in REQUIRED_RENDITIONS if n not in merged]
+    if missing:
+        raise ValueError(f"missing required renditions: {', '.join(missing)}")
+    return tuple(merged.values())
+
+
+def _save(im: Image.Image, spec: RenditionSpec, quality: int) -> bytes:
+    pil_format = FORMATS[spec.format][0]
+    buf = BytesIO()
+    if pil_format == "PNG":
+        im.save(buf, format=pil_format, optimize=True)
+    elif spec.format == "pjpeg":
+        im.save(buf, format=pil_format, quality=quality, progressive=True, optimize=True)
+    else:
+        im.save(buf, format=pil_format, quality=quality)
+    return buf.getvalue()
+
+
+def encode(im: Image.Image, spec: RenditionSpec) -> Tuple[bytes, Optional[int]]:
+    """
+    Encode im per spec; returns (data, quality used). PNG is lossless, so
+    it has no quality and ignores max_bytes.
+    """
+    if spec.format == "png":
+        return _save(im, spec, spec.quality), None
+    data = _save(im, spec, spec.quality)
+    if spec.max_bytes is None or len(data) <= spec.max_bytes or spec.quality <= MIN_BUDGET_QUALITY:
+        return data, spec.quality
+
+    # Binary search for the highest quality that fits; if even the floor
+    # does not fit, the floor's output is used anyway.
+    lo, hi = MIN_BUDGET_QUALITY, spec.quality - 1
+    best_quality = MIN_BUDGET_QUALITY
+    best = None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        candidate = _save(im, spec, mid)
+        if len(candidate) <= spec.max_bytes:
+            best, best_quality = candidate, mid
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    if best is None:
+        best = _save(im, spec, MIN_BUDGET_QUALITY)
+    return best, best_quality
+
+
+class SourceTooLarge(ValueError):
+    pass
+
+
+# JPEG draft decoding shrinks each side by up to 1/8
+_MAX_DRAFT_SHRINK = 64
+
+
+def set_decode_ceiling(max_pixels: Optional[int]) -> None:
+    """
+    Set Pillow's (process-wide) decompression bomb check to go with a
+    max_pixels ceiling; call once per process. Pillow checks the header size,
+    which would refuse JPEG panoramas that decode at 1/8 scale just fine, so
+    it only refuses sources no draft scaling could bring under the ceiling.
+    None or 0 means no limit at all.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels * _MAX_DRAFT_SHRINK if max_pixels else None
+
+
+def decode_near(im: Image.Image, long_edge: int, max_pixels: Optional[int] = None) -> Image.Image:
+    """
+    Load an opened (not yet loaded) image at the smallest resolution that is
+    still REDUCING_GAP times long_edge. Only JPEGs can be drafted; other
+    formats load at full size and are reduced afterwards. Raises
+    SourceTooLarge if the decoded size would exceed max_pixels, before
+    loading, so for non-JPEG sources the full header size is what counts.
+    """
+    target = long_edge * REDUCING_GAP
+    width, height = im.size
+    scale = target / max(width, height)
+    if scale < 1:
+        # No-op for formats other than JPEG: im.size stays the full size
+        im.draft("RGB", (max(1, int(width * scale + 0.5)), max(1, int(height * scale + 0.5))))
+    width, height = im.size
+    if max_pixels is not None and width * height > max_pixels:
+        raise SourceTooLarge(f"decoded size {width}x{height} exceeds {max_pixels} pixels")
+    im.load()
+    factor = int(max(width, height) // target)
+    if factor >= 2:
+        if im.mode in ("1", "P"):
+            im = im.convert("RGB")
+        return im.reduce(factor)
+    return im
+
+
+def _add_time(timings: Optional[Dict[str, float]], stage: str, started: float) -> None:
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def render_image(
+    im: Image.Image,
+    specs: Iterable[RenditionSpec],
+    max_pixels: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> Dict[str, Rendition]:
+    """
+    Render every spec from an already opened image, largest first. Seconds
+    spent per stage (decode/resize/encode) are added to timings if given.
+    """
+    ordered: List[RenditionSpec] = sorted(specs, key=lambda s: s.long_edge, reverse=True)
+    started = time.perf_counter()
+    current = decode_near(im, ordered[0].long_edge, max_pixels).convert("RGB")
+    _add_time(timings, "decode", started)
+    out: Dict[str, Rendition] = {}
+    for spec in ordered:
+        # thumbnail() only ever shrinks, so each step reuses the previous
+        # (larger) rendition as its source instead of the original pixels.
+        started = time.perf_counter()
+        current.thumbnail((spec.long_edge, spec.long_edge), Image.LANCZOS)
+        _add_time(timings, "resize", started)
+        started = time.perf_counter()
+        data, quality = encode(current, spec)
+        _add_time(timings, "encode", started)
+        out[spec.name] = Rendition(spec=spec, data=data, size=current.size, quality=quality)
+    return out
+
+
+def render_file(src_path: Path, specs: Iterable[RenditionSpec] = DEFAULT_RENDITIONS) -> Dict[str, Rendition]:
+    with Image.open(src_path) as im:
+        return render_image(im, specs)
+
+
+PreviewCandidate = Tuple[str, Tuple[int, int], Callable[[], Image.Image]]
+
+
+def _mpf_previews(im: Image.Image) -> Iterator[PreviewCandidate]:
+    if im.format != "MPO" or getattr(im, "n_frames", 1) < 2:
+        return
+    frames = []
+    for index in range(1, im.n_frames):
+        im.seek(index)
+        frames.append((index, im.size))
+    im.seek(0)
+
+    for index, size in frames:
+        def load(index=index) -> Image.Image:
+            im.seek(index)
+            try:
+                im.load()
+                return im.copy()
+            finally:
+                im.seek(0)
+
+        yield SOURCE_MPF, size, load
+
+
+def _exif_preview(im: Image.Image) -> Iterator[PreviewCandidate]:
+    raw = im.info.get("exif")
+    if not raw:
+        return
+    ifd1 = im.getexif().get_ifd(ExifTags.IFD.IFD1)
+    offset, length = ifd1.get(TAG_JPEG_IF_OFFSET), ifd1.get(TAG_JPEG_IF_LENGTH)
+    if not offset or not length:
+        return
+    if raw.startswith(b"Exif\x00\x00"):
+        raw = raw[6:]
+    data = raw[offset : offset + length]
+    try:
+        preview = Image.open(BytesIO(data))
+    except Exception:
+        return
+
+    def load() -> Image.Image:
+        preview.load()
+        return preview
+
+    yield SOURCE_EXIF, preview.size, load
+
+
+def _heif_previews(im: Image.Image) -> Iterator[PreviewCandidate]:
+    # Opened from a path or, when the caller already has the bytes, a buffer
+    source = getattr(im, "filename", None) or getattr(im, "fp", None)
+    if im.format != "HEIF" or not im.info.get("thumbnails") or not source:
+        return
+    if not isinstance(source, (str, Path)):
+        source.seek(0)
+    heif = open_heif(source)
+    primary = heif[heif.primary_index]
+    for index in range(len(primary.info.get("thumbnails") or ())):
+        thumbnail = primary.get_thumbnail(index)
+        yield SOURCE_HEIF, thumbnail.size, thumbnail.to_pillow
+
+
+def _aspect_matches(size: Tuple[int, int], full_size: Tuple[int, int]) -> bool:
+    if not size[1] or not full_size[1]:
+        return False
+    full_ratio = full_size[0] / full_size[1]
+    return abs(size[0] / size[1] - full_ratio) <= PREVIEW_ASPECT_TOLERANCE * full_ratio
+
+
+def find_previews(
+    im: Image.Image, specs: Iterable[RenditionSpec]
+) -> List[Tuple[Optional[PreviewCandidate], List[RenditionSpec]]]:
+    """
+    Specs grouped by what to render them from: for each spec, the smallest
+    embedded preview that covers its long edge and has the image's aspect
+    ratio, or None for the full image. Previews are not loaded yet.
+    """
+    full_edge = max(im.size)
+    candidates: List[PreviewCandidate] = []
+    try:
+        for finder in (_mpf_previews, _exif_preview, _heif_previews):
+            for candidate in finder(im):
+                if max(candidate[1]) < full_edge and _aspect_matches(candidate[1], im.size):
+                    candidates.append(candidate)
+    except Exception:
+        # A damaged preview is not worth failing the photo over
+        candidates = []
+    candidates.sort(key=lambda c: max(c[1]))
+    groups: Dict[int, Tuple[Optional[PreviewCandidate], List[RenditionSpec]]] = {}
+    for spec in specs:
+        chosen = next((c for c in candidates if max(c[1]) >= spec.long_edge), None)
+        groups.setdefault(id(chosen), (chosen, []))[1].append(spec)
+    return list(groups.values())
+
+
+def render_source(
+    im: Image.Image,
+    specs: Iterable[RenditionSpec],
+    use_previews: bool = True,
+    max_pixels: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> Tuple[Dict[str, Rendition], str]:
+    """
+    render_image() for each spec from the smallest embedded preview that
+    covers it, the rest from the full image. Returns (renditions, source):
+    the sources used, largest rendition's first, joined by "+".
+    """
+    specs = tuple(specs)
+    groups: List[Tuple[Optional[PreviewCandidate], List[RenditionSpec]]] = [(None, list(specs))]
+    if use_previews:
+        started = time.perf_counter()
+        groups = find_previews(im, specs)
+        _add_time(timings, "decode", started)
+    out: Dict[str, Rendition] = {}
+    used: Dict[str, str] = {}
+    full: List[RenditionSpec] = []
+    for candidate, group in groups:
+        if candidate is None:
+            full.extend(group)
+            continue
+        started = time.perf_counter()
+        try:
+            preview = candidate[2]()
+        except Exception:
+            # Damaged preview: these renditions come from the full image
+            full.extend(group)
+            continue
+        finally:
+            _add_time(timings, "decode", started)
+        out.update(render_image(preview, group, max_pixels, timings))
+        used.update((spec.name, candidate[0]) for spec in group)
+    if full:
+        # Last, as loading an MPF preview seeks the source to another frame
+        out.update(render_image(im, full, max_pixels, timings))
+        used.update((spec.name, SOURCE_FULL) for spec in full)
+    sources: List[str] = []
+    for spec in sorted(specs, key=lambda s: s.long_edge, reverse=True):
+        if used[spec.name] not in sources:
+            sources.append(used[spec.name])
+    return out, "+".join(sources)
@@ -1,14 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import hashlib
 import os
-import subprocess
 import sys
+import threading
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Any, Callable, Dict, Optional
 
 from warnings_config import configure_warning_filters
 
@@ -19,7 +22,11 @@ from firebase_admin import credentials, storage as fb_storage
 
 from mcp.server.fastmcp import FastMCP
 
+import find_directory as fd
 import import_jobs
+from dir_index import DEFAULT_INDEX_PATH, DirIndex
+import list_media as lm
+from proc_stream import run_streaming_async
 
 HOST = os.getenv("MCP_HOST", "127.0.0.1").strip()
 PORT = int(os.getenv("MCP_PORT", "8000"))
@@ -69,16 +76,34 @@ MIME_BY_EXT = {
 }
 
 # ログ/返却の末尾サイズ（重いログで詰まらないように）
-LOG_TAIL = 2000
 RET_TAIL = 20000
 
 # MCPのタイムアウトより短くする（MCPがタイムアウトすると情報が消えるので）
 SUBPROCESS_TIMEOUT_SEC = 120
+# find_directory / list_media run in-process on this pool
+TOOL_TIMEOUT_SEC = float(os.getenv("MCP_TOOL_TIMEOUT_SEC", str(SUBPROCESS_TIMEOUT_SEC)))
+# Tools are async; blocking work (directory walks, Storage / HTTP calls) is
+# offloaded here so the event loop keeps serving other requests
+_TOOL_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("MCP_TOOL_WORKERS", "8")), thread_name_prefix="mcp-tool")
+# Calls of one tool allowed to run at once; further calls wait their turn.
+# ping / debug_info are not limited.
+TOOL_CONCURRENCY = {
+    "import_photos": int(os.getenv("MCP_IMPORT_CONCURRENCY", "1")),
+    "find_directory": int(os.getenv("MCP_FIND_CONCURRENCY", "2")),
+    "list_media": int(os.getenv("MCP_LIST_CONCURRENCY", "2")),
+    "get_media": int(os.getenv("MCP_MEDIA_CONCURRENCY", "4")),
+}
+_tool_limits: Dict[str, asyncio.Semaphore] = {}
+# find_directory answers from this directory index ("off" to always walk);
+# a background thread refreshes the indexed roots every REFRESH_SEC
+DIR_INDEX_PATH = os.getenv("MCP_DIR_INDEX", str(DEFAULT_INDEX_PATH)).strip()
+DIR_INDEX_REFRESH_SEC = float(os.getenv("MCP_DIR_INDEX_REFRESH_SEC", "600"))
 
 IMPORT_MODE = os.getenv("MCP_IMPORT_MODE", "pubsub").strip().lower()
 IMPORT_JOBS_ENDPOINT = os.getenv("IMPORT_JOBS_ENDPOINT", "").strip()
 IMPORT_JOB_REQUESTER = os.getenv("IMPORT_JOB_REQUESTER", "").strip()
 IMPORT_JOB_WORKER_ID = os.getenv("IMPORT_JOB_WORKER_ID", "").strip()
+IMPORT_JOB_SHARD_PHOTOS = int(os.getenv("IMPORT_JOB_SHARD_PHOTOS", "0") or 0)
 IMPORT_JOB_SECRET = os.getenv("IMPORT_JOB_SECRET", "").strip()
 
 
@@ -91,13 +116,80 @@ def _log(msg: str) -> None:
     sys.stderr.flush()
 
 
-def _tail(s: Optional[str], n: int) -> str:
-    if not s:
-        return ""
-    return s[-n:]
+def _tool_limit(name: str) -> asyncio.Semaphore:
+    sem = _tool_limits.get(name)
+    if sem is None:
+        sem = _tool_limits[name] = asyncio.Semaphore(max(1, TOOL_CONCURRENCY[name]))
+    return sem
+
+
+async def _offload(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_TOOL_POOL, functools.partial(fn, *args, **kwargs))
+
+
+async def _run_tool(req_id: str, fn, *args: Any) -> Dict[str, Any]:
+    """
+    Run fn(*args, should_stop=...) on the tool pool and return its result
+    with ok/elapsed_sec. After TOOL_TIMEOUT_SEC the walk is told to stop
+    (it checks once per directory) and a timeout error is returned.
+    """
+    t0 = time.time()
+    cancel = threading.Event()
+    try:
+        # shield: on timeout the walk gets should_stop rather than being abandoned
+        result = await asyncio.wait_for(
+            asyncio.shield(_offload(fn, *args, should_stop=cancel.is_set)), TOOL_TIMEOUT_SEC
+        )
+    except asyncio.TimeoutError:
+        dt = time.time() - t0
+        _log(f"[MCP][{req_id}] TIMEOUT elapsed={dt:.2f}s (>{TOOL_TIMEOUT_SEC}s)")
+        return {"ok": False, "error": f"timeout (> {TOOL_TIMEOUT_SEC}s)", "elapsed_sec": round(dt, 3)}
+    except Exception as exc:
+        dt = time.time() - t0
+        _log(f"[MCP][{req_id}] EXCEPTION elapsed={dt:.2f}s")
+        _log(traceback.format_exc())
+        return {"ok": False, "error": f"{type(exc).__name__}: {exc}", "elapsed_sec": round(dt, 3)}
+    finally:
+        # also reached when the request itself is cancelled
+        cancel.set()
+    dt = time.time() - t0
+    _log(f"[MCP][{req_id}] DONE elapsed={dt:.2f}s")
+    return {"ok": True, **result, "elapsed_sec": round(dt, 3)}
+
+
+_dir_index: Optional[DirIndex] = None
+_dir_index_lock = threading.Lock()
 
 
-def _run_import_photos_subprocess(
+def _get_dir_index() -> Optional[DirIndex]:
+    global _dir_index
+    if DIR_INDEX_PATH.lower() in {"", "off", "0"}:
+        return None
+    with _dir_index_lock:
+        if _dir_index is None:
+            _dir_index = DirIndex(Path(DIR_INDEX_PATH))
+        return _dir_index
+
+
+def _refresh_dir_index_forever() -> None:
+    while True:
+        index = _get_dir_index()
+        if index is None:
+            return
+        for root in index.roots() or [str(r) for r in fd.default_roots()]:
+            t0 = time.time()
+            try:
+                stats = index.refresh(Path(root))
+            except Exception:
+                _log(f"[MCP] dir index refresh failed root={root!r}")
+                _log(traceback.format_exc())
+                continue
+            _log(f"[MCP] dir index refreshed root={root!r} {stats} elapsed={time.time() - t0:.2f}s")
+        time.sleep(DIR_INDEX_REFRESH_SEC)
+
+
+async def _run_import_photos_subprocess(
     input_dir: str,
     root_path: str,
     dry_run: bool,
@@ -138,53 +230,39 @@ def _run_import_photos_subprocess(
     env = os.environ.copy()
     env["PYTHONUNBUFFERED"] = "1"
 
+    def on_line(stream: str, line: str) -> None:
+        # Forward the child's output live instead of dumping it at the end
+        _log(f"[MCP][{req_id}] {stream}: {line.rstrip()}")
+
     try:
-        cp = subprocess.run(
-            cmd,
-            env=env,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            check=False,
-            timeout=SUBPROCESS_TIMEOUT_SEC,
+        run = await run_streaming_async(
+            cmd, env=env, timeout_sec=SUBPROCESS_TIMEOUT_SEC, on_line=on_line, tail_chars=RET_TAIL
         )
-
         dt = time.time() - t0
-        _log(f"[MCP][{req_id}] subprocess DONE rc={cp.returncode} elapsed={dt:.2f}s")
-        _log(f"[MCP][{req_id}] stdout(last{LOG_TAIL}):\n{_tail(cp.stdout, LOG_TAIL)}")
-        _log(f"[MCP][{req_id}] stderr(last{LOG_TAIL}):\n{_tail(cp.stderr, LOG_TAIL)}")
 
+        if run.timed_out:
+            _log(f"[MCP][{req_id}] TIMEOUT elapsed={dt:.2f}s (>{SUBPROCESS_TIMEOUT_SEC}s)")
+            _log(f"[MCP][{req_id}] TIMEOUT cmd={cmd}")
+            return {
+                "ok": False,
+                "error": f"subprocess timeout (> {SUBPROCESS_TIMEOUT_SEC}s)",
+                "command": cmd,
+                "elapsed_sec": round(dt, 3),
+                "stdout": run.stdout,
+                "stderr": run.stderr,
+            }
+
+        _log(f"[MCP][{req_id}] subprocess DONE rc={run.returncode} elapsed={dt:.2f}s")
         return {
-            "ok": cp.returncode == 0,
-            "exit_code": cp.returncode,
+            "ok": run.returncode == 0,
+            "exit_code": run.returncode,
             "command": cmd,
             "elapsed_sec": round(dt, 3),
-            "stdout": _tail(cp.stdout, RET_TAIL),
-            "stderr": _tail(cp.stderr, RET_TAIL),
+            "stdout": run.stdout,
+            "stderr": run.stderr,
             "viewer_url": _viewer_url(root_path),
         }
 
-    except subprocess.TimeoutExpired as e:
-        dt = time.time() - t0
-        out = getattr(e, "stdout", None)
-        err = getattr(e, "stderr", None)
-
-        _log(f"[MCP][{req_id}] TIMEOUT elapsed={dt:.2f}s (>{SUBPROCESS_TIMEOUT_SEC}s)")
-        _log(f"[MCP][{req_id}] TIMEOUT cmd={cmd}")
-        if out or err:
-            _log(f"[MCP][{req_id}] timeout stdout(last{LOG_TAIL}):\n{_tail(out, LOG_TAIL)}")
-            _log(f"[MCP][{req_id}] timeout stderr(last{LOG_TAIL}):\n{_tail(err, LOG_TAIL)}")
-
-        return {
-            "ok": False,
-            "error": f"subprocess timeout (> {SUBPROCESS_TIMEOUT_SEC}s)",
-            "command": cmd,
-            "elapsed_sec": round(dt, 3),
-            "stdout": _tail(out, RET_TAIL),
-            "stderr": _tail(err, RET_TAIL),
-        }
-
     except Exception:
         dt = time.time() - t0
         _log(f"[MCP][{req_id}] EXCEPTION elapsed={dt:.2f}s")
@@ -196,7 +274,7 @@ def _run_import_photos_subprocess(
         }
 
 
-def _enqueue_import_job(
+async def _enqueue_import_job(
     input_dir: str,
     root_path: str,
     dry_run: bool,
@@ -227,9 +305,12 @@ def _enqueue_import_job(
             dry_run=dry_run,
             requested_by=IMPORT_JOB_REQUESTER or None,
             worker_id=IMPORT_JOB_WORKER_ID or None,
+            shard_photos=IMPORT_JOB_SHARD_PHOTOS or None,
         )
         headers = {"x-import-job-secret": IMPORT_JOB_SECRET} if IMPORT_JOB_SECRET else None
-        result = import_jobs.enqueue_job(IMPORT_JOBS_ENDPOINT, payload, timeout_sec=15, headers=headers)
+        result = await _offload(
+            import_jobs.enqueue_job, IMPORT_JOBS_ENDPOINT, payload, timeout_sec=15, headers=headers
+        )
     except Exception as exc:
         _log(f"[MCP][{req_id}] enqueue error: {exc}")
         return {
@@ -311,124 +392,48 @@ def _get_storage_url(p: Path, mime: str) -> Optional[str]:
 
 
 @mcp.tool()
-def import_photos(
+async def import_photos(
     input_dir: str,
     root_path: str,
     dry_run: bool = True,
 ) -> Dict[str, Any]:
-    if IMPORT_MODE == "local":
-        return _run_import_photos_subprocess(input_dir, root_path, dry_run)
-    return _enqueue_import_job(input_dir, root_path, dry_run)
+    async with _tool_limit("import_photos"):
+        if IMPORT_MODE == "local":
+            return await _run_import_photos_subprocess(input_dir, root_path, dry_run)
+        return await _enqueue_import_job(input_dir, root_path, dry_run)
 
 
 @mcp.tool()
-def find_directory(
+async def find_directory(
     keyword: str,
     roots: Optional[list[str]] = None,
     include_hidden: bool = False,
     no_default_skip: bool = False,
 ) -> Dict[str, Any]:
     req_id = str(int(time.time() * 1000))
-    t0 = time.time()
-
     _log(f"[MCP][{req_id}] find_directory START")
     _log(
         f"[MCP][{req_id}] args keyword={keyword!r} roots={roots!r} "
         f"include_hidden={include_hidden!r} no_default_skip={no_default_skip!r}"
     )
-    _log(f"[MCP][{req_id}] cwd={os.getcwd()!r}")
-    _log(f"[MCP][{req_id}] sys.executable={sys.executable!r}")
-    _log(
-        f"[MCP][{req_id}] FIND_SCRIPT_PATH={str(FIND_SCRIPT_PATH)!r} "
-        f"exists={FIND_SCRIPT_PATH.exists()}"
-    )
 
     if not keyword or not keyword.strip():
         _log(f"[MCP][{req_id}] ERROR keyword is empty")
         return {"ok": False, "error": "keyword is required"}
 
-    if not FIND_SCRIPT_PATH.exists():
-        _log(f"[MCP][{req_id}] ERROR find_directory.py not found at {FIND_SCRIPT_PATH}")
-        return {"ok": False, "error": f"find_directory.py not found at {FIND_SCRIPT_PATH}"}
-
-    cmd = [sys.executable, str(FIND_SCRIPT_PATH), "--keyword", keyword]
-    if roots:
-        cmd += ["--roots", *roots]
-    if include_hidden:
-        cmd += ["--include-hidden"]
-    if no_default_skip:
-        cmd += ["--no-default-skip"]
-
-    _log(f"[MCP][{req_id}] cmd={cmd}")
-
-    env = os.environ.copy()
-    env["PYTHONUNBUFFERED"] = "1"
-
-    try:
-        cp = subprocess.run(
-            cmd,
-            env=env,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            check=False,
-            timeout=SUBPROCESS_TIMEOUT_SEC,
-        )
-
-        dt = time.time() - t0
-        _log(f"[MCP][{req_id}] subprocess DONE rc={cp.returncode} elapsed={dt:.2f}s")
-        _log(f"[MCP][{req_id}] stdout(last{LOG_TAIL}):\n{_tail(cp.stdout, LOG_TAIL)}")
-        _log(f"[MCP][{req_id}] stderr(last{LOG_TAIL}):\n{_tail(cp.stderr, LOG_TAIL)}")
-
-        return {
-            "ok": cp.returncode == 0,
-            "exit_code": cp.returncode,
-            "command": cmd,
-            "elapsed_sec": round(dt, 3),
-            "stdout": _tail(cp.stdout, RET_TAIL),
-            "stderr": _tail(cp.stderr, RET_TAIL),
-        }
-
-    except subprocess.TimeoutExpired as e:
-        dt = time.time() - t0
-        out = getattr(e, "stdout", None)
-        err = getattr(e, "stderr", None)
-
-        _log(f"[MCP][{req_id}] TIMEOUT elapsed={dt:.2f}s (>{SUBPROCESS_TIMEOUT_SEC}s)")
-        _log(f"[MCP][{req_id}] TIMEOUT cmd={cmd}")
-        if out or err:
-            _log(f"[MCP][{req_id}] timeout stdout(last{LOG_TAIL}):\n{_tail(out, LOG_TAIL)}")
-            _log(f"[MCP][{req_id}] timeout stderr(last{LOG_TAIL}):\n{_tail(err, LOG_TAIL)}")
-
-        return {
-            "ok": False,
-            "error": f"subprocess timeout (> {SUBPROCESS_TIMEOUT_SEC}s)",
-            "command": cmd,
-            "elapsed_sec": round(dt, 3),
-            "stdout": _tail(out, RET_TAIL),
-            "stderr": _tail(err, RET_TAIL),
-        }
-
-    except Exception:
-        dt = time.time() - t0
-        _log(f"[MCP][{req_id}] EXCEPTION elapsed={dt:.2f}s")
-        _log(traceback.format_exc())
-        return {
-            "ok": False,
-            "error": "exception in server.py",
-            "elapsed_sec": round(dt, 3),
-        }
+    async with _tool_limit("find_directory"):
+        search = functools.partial(fd.search, index=_get_dir_index())
+        return await _run_tool(req_id, search, keyword, roots, include_hidden, no_default_skip)
 
 
 @mcp.tool()
-def ping() -> dict:
+async def ping() -> dict:
     _log("[MCP] ping")
     return {"ok": True}
 
 
 @mcp.tool()
-def debug_info() -> dict:
+async def debug_info() -> dict:
     return {
         "ok": True,
         "server_py": str(Path(__file__).resolve()),
@@ -443,12 +448,7 @@ def debug_info() -> dict:
     }
 
 
-@mcp.tool()
-def get_media(
-    file_path: str,
-) -> Dict[str, Any]:
-    req_id = str(int(time.time() * 1000))
-    _log(f"[MCP][{req_id}] get_media START")
+def _get_media(req_id: str, file_path: str) -> Dict[str, Any]:
     _log(f"[MCP][{req_id}] args file_path={file_path!r}")
     _log(f"[MCP][{req_id}] cwd={os.getcwd()!r}")
     _log(f"[MCP][{req_id}] sys.executable={sys.executable!r}")
@@ -486,97 +486,50 @@ def get_media(
 
 
 @mcp.tool()
-def list_media(
+async def get_media(
+    file_path: str,
+) -> Dict[str, Any]:
+    req_id = str(int(time.time() * 1000))
+    _log(f"[MCP][{req_id}] get_media START")
+    # stat + Storage upload / signed URL are blocking network I/O
+    async with _tool_limit("get_media"):
+        return await _offload(_get_media, req_id, file_path)
+
+
+def _list_media(
+    req_id: str,
+    dir_path: str,
+    include_hidden: bool,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Dict[str, Any]:
+    # resolve() and the stat calls can block on a slow share too
+    base = Path(dir_path).expanduser().resolve()
+    if not base.exists() or not base.is_dir():
+        _log(f"[MCP][{req_id}] ERROR dir not found or not dir: {dir_path!r}")
+        return {"ok": False, "error": f"dir not found or not a directory: {dir_path!r}"}
+    return lm.collect_media(base, include_hidden, should_stop=should_stop)
+
+
+@mcp.tool()
+async def list_media(
     dir_path: str,
     include_hidden: bool = False,
 ) -> Dict[str, Any]:
     req_id = str(int(time.time() * 1000))
-    t0 = time.time()
-
     _log(f"[MCP][{req_id}] list_media START")
     _log(f"[MCP][{req_id}] args dir_path={dir_path!r} include_hidden={include_hidden!r}")
-    _log(f"[MCP][{req_id}] cwd={os.getcwd()!r}")
-    _log(f"[MCP][{req_id}] sys.executable={sys.executable!r}")
-    _log(
-        f"[MCP][{req_id}] LIST_MEDIA_PATH={str(LIST_MEDIA_PATH)!r} "
-        f"exists={LIST_MEDIA_PATH.exists()}"
-    )
 
     if not dir_path or not dir_path.strip():
         _log(f"[MCP][{req_id}] ERROR dir_path is empty")
         return {"ok": False, "error": "dir_path is required"}
 
-    if not LIST_MEDIA_PATH.exists():
-        _log(f"[MCP][{req_id}] ERROR list_media.py not found at {LIST_MEDIA_PATH}")
-        return {"ok": False, "error": f"list_media.py not found at {LIST_MEDIA_PATH}"}
-
-    cmd = [sys.executable, str(LIST_MEDIA_PATH), "--dir", dir_path]
-    if include_hidden:
-        cmd += ["--include-hidden"]
-
-    _log(f"[MCP][{req_id}] cmd={cmd}")
-
-    env = os.environ.copy()
-    env["PYTHONUNBUFFERED"] = "1"
-
-    try:
-        cp = subprocess.run(
-            cmd,
-            env=env,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="replace",
-            check=False,
-            timeout=SUBPROCESS_TIMEOUT_SEC,
-        )
-
-        dt = time.time() - t0
-        _log(f"[MCP][{req_id}] subprocess DONE rc={cp.returncode} elapsed={dt:.2f}s")
-        _log(f"[MCP][{req_id}] stdout(last{LOG_TAIL}):\n{_tail(cp.stdout, LOG_TAIL)}")
-        _log(f"[MCP][{req_id}] stderr(last{LOG_TAIL}):\n{_tail(cp.stderr, LOG_TAIL)}")
-
-        return {
-            "ok": cp.returncode == 0,
-            "exit_code": cp.returncode,
-            "command": cmd,
-            "elapsed_sec": round(dt, 3),
-            "stdout": _tail(cp.stdout, RET_TAIL),
-            "stderr": _tail(cp.stderr, RET_TAIL),
-        }
-
-    except subprocess.TimeoutExpired as e:
-        dt = time.time() - t0
-        out = getattr(e, "stdout", None)
-        err = getattr(e, "stderr", None)
-
-        _log(f"[MCP][{req_id}] TIMEOUT elapsed={dt:.2f}s (>{SUBPROCESS_TIMEOUT_SEC}s)")
-        _log(f"[MCP][{req_id}] TIMEOUT cmd={cmd}")
-        if out or err:
-            _log(f"[MCP][{req_id}] timeout stdout(last{LOG_TAIL}):\n{_tail(out, LOG_TAIL)}")
-            _log(f"[MCP][{req_id}] timeout stderr(last{LOG_TAIL}):\n{_tail(err, LOG_TAIL)}")
-
-        return {
-            "ok": False,
-            "error": f"subprocess timeout (> {SUBPROCESS_TIMEOUT_SEC}s)",
-            "command": cmd,
-            "elapsed_sec": round(dt, 3),
-            "stdout": _tail(out, RET_TAIL),
-            "stderr": _tail(err, RET_TAIL),
-        }
-
-    except Exception:
-        dt = time.time() - t0
-        _log(f"[MCP][{req_id}] EXCEPTION elapsed={dt:.2f}s")
-        _log(traceback.format_exc())
-        return {
-            "ok": False,
-            "error": "exception in server.py",
-            "elapsed_sec": round(dt, 3),
-        }
+    async with _tool_limit("list_media"):
+        return await _run_tool(req_id, _list_media, req_id, dir_path, include_hidden)
 
 
 if __name__ == "__main__":
+    if DIR_INDEX_REFRESH_SEC > 0:
+        threading.Thread(target=_refresh_dir_index_forever, name="dir-index", daemon=True).start()
     transport = os.getenv("MCP_TRANSPORT", "stdio").strip().lower()
     if transport == "http":
         transport = "streamable-http"
@@ -0,0 +1,51 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+sys.path.insert(0, str(SCRIPT_DIR / "bench"))
+
+import run_bench
+from fakes import FakeFirestore, Latency
+from make_tree import generate_tree
+
+
+class BenchTests(unittest.TestCase):
+    def test_generated_tree_is_deterministic(self):
+        with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+            kwargs = dict(folders=3, per_folder=2, sizes=[(320, 240)], seed=7)
+            generate_tree(Path(a), **kwargs)
+            generate_tree(Path(b), **kwargs)
+            files_a = sorted(p.relative_to(a).as_posix() for p in Path(a).rglob("*") if p.is_file())
+            files_b = sorted(p.relative_to(b).as_posix() for p in Path(b).rglob("*") if p.is_file())
+            self.assertEqual(files_a, files_b)
+            self.assertEqual(7, len(files_a))  # 6 images + tree.json
+            self.assertIn("level0/level1/f002", {str(Path(f).parent) for f in files_a})
+
+    def test_bench_imports_every_photo_into_the_fakes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tree = Path(tmp)
+            generate_tree(tree, folders=2, per_folder=3, sizes=[(640, 480)], seed=1)
+            report = run_bench.run_bench(tree, [], rerun=True)
+
+        self.assertEqual(6, report["images"])
+        run = report["runs"][0]
+        self.assertIsNone(run["error"])
+        self.assertEqual(6, run["photo_docs"])
+        self.assertEqual(12, run["storage"]["upload"]["calls"])
+        self.assertNotIn("upload", report["reruns"][0]["storage"])
+
+    def test_fake_latency_is_counted_per_call(self):
+        db = FakeFirestore(Latency(mean_ms=5))
+        ref = db.collection("photos").document("a")
+        ref.set({"x": 1})
+        self.assertEqual({"x": 1}, ref.get().to_dict())
+        stats = db.stats.to_dict()
+        self.assertEqual(1, stats["set"]["calls"])
+        self.assertGreaterEqual(stats["get"]["sec"], 0.004)
+
+
+if __name__ == "__main__":
+    unittest.main()
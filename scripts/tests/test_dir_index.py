@@ -0,0 +1,123 @@
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import dir_index
+
+
+class DirIndexTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name).resolve() / "photos"
+        self.root.mkdir()
+        self.index = dir_index.DirIndex(Path(tmp.name) / "index.sqlite3")
+        self.addCleanup(self.index.close)
+        # Freshly made test dirs would otherwise always be listed again
+        settle = mock.patch.object(dir_index, "MTIME_SETTLE_NS", 0)
+        settle.start()
+        self.addCleanup(settle.stop)
+
+    def _make(self, rel, files=()):
+        d = self.root / rel
+        d.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            (d / name).write_bytes(b"data")
+        return d
+
+    def test_refresh_indexes_dirs_and_media_counts(self):
+        trip = self._make("2024/Trip Kyoto", ["a.jpg", "b.HEIC", "notes.txt", ".hidden.jpg"])
+        self._make(".cache/Trip")
+        self._make("node_modules/Trip")
+
+        stats = self.index.refresh(self.root)
+
+        self.assertEqual(1, stats["complete"])
+        self.assertEqual(3, stats["dirs"])
+        self.assertTrue(self.index.covers(self.root))
+        self.assertEqual([str(trip)], self.index.find("trip", [self.root], limit=10))
+        self.assertEqual([str(trip)], self.index.find("kyo", [self.root], limit=10))
+        self.assertEqual({str(trip): 2}, self.index.media_counts([str(self.root)], limit=100))
+        self.assertEqual({str(trip): 1}, self.index.media_counts([str(self.root)], limit=1))
+
+    def test_refresh_lists_only_changed_dirs(self):
+        self._make("a/x", ["1.jpg"])
+        self._make("b/y", ["2.jpg"])
+        self.index.refresh(self.root)
+
+        stats = self.index.refresh(self.root)
+        self.assertEqual(0, stats["listed"])
+        self.assertEqual(5, stats["dirs"])
+
+        (self.root / "a" / "x" / "3.jpg").write_bytes(b"data")
+        stats = self.index.refresh(self.root)
+        self.assertEqual(1, stats["listed"])
+        self.assertEqual(2, self.index.media_counts([str(self.root / "a")], limit=100)[str(self.root / "a" / "x")])
+
+    def test_removed_dirs_leave_the_index(self):
+        self._make("gone/trip/deep", ["1.jpg"])
+        self._make("kept")
+        self.index.refresh(self.root)
+        for d in ("gone/trip/deep", "gone/trip", "gone"):
+            for f in (self.root / d).iterdir():
+                f.unlink()
+            (self.root / d).rmdir()
+
+        stats = self.index.refresh(self.root)
+
+        self.assertEqual(3, stats["removed"])
+        self.assertEqual([], self.index.find("trip", [self.root], limit=10))
+
+    def test_interrupted_refresh_resumes_and_is_not_complete(self):
+        for n in range(5):
+            self._make(f"d{n}")
+        polls = []
+
+        def should_stop():
+            polls.append(1)
+            return len(polls) > 3
+
+        stats = self.index.refresh(self.root, should_stop)
+        self.assertEqual(0, stats["complete"])
+        self.assertFalse(self.index.covers(self.root))
+
+        stats = self.index.refresh(self.root)
+        self.assertEqual(1, stats["complete"])
+        self.assertEqual(6 - 3, stats["listed"])
+
+    def test_refresh_lists_on_the_walk_threads(self):
+        for n in range(4):
+            self._make(f"d{n}/x", ["1.jpg"])
+        threads = []
+        real_list = dir_index.list_dir_entries
+
+        def recording_list(*args):
+            threads.append(threading.current_thread().name)
+            return real_list(*args)
+
+        with mock.patch.object(dir_index, "list_dir_entries", recording_list):
+            stats = self.index.refresh(self.root)
+        self.assertEqual(9, stats["listed"])
+        self.assertEqual(9, len(threads))
+        self.assertTrue(all(name.startswith("walk") for name in threads))
+
+    def test_short_keywords_and_root_filter(self):
+        a = self._make("ab")
+        other = self.root.parent / "other"
+        (other / "ab").mkdir(parents=True)
+        self.index.refresh(self.root)
+        self.index.refresh(other)
+
+        self.assertEqual([str(a)], self.index.find("AB", [self.root], limit=10))
+        self.assertEqual(sorted(self.index.roots()), sorted([str(self.root), str(other)]))
+        self.assertFalse(self.index.covers(self.root.parent))
+
+
+if __name__ == "__main__":
+    unittest.main()
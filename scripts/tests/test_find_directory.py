@@ -1,11 +1,15 @@
 import sys
 import tempfile
+import threading
+import time
 import unittest
 from pathlib import Path
+from unittest import mock
 
 SCRIPT_DIR = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(SCRIPT_DIR))
 
+import dir_index
 import find_directory as fd
 
 
@@ -44,6 +48,111 @@ class FindDirectoryTests(unittest.TestCase):
 
             self.assertEqual(1, counts.get(base, 0))
 
+    def test_search_returns_structured_counts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            trip = root / "Trip2024"
+            (trip / "day1").mkdir(parents=True)
+            (trip / "day1" / "a.jpg").write_bytes(b"data")
+            (root / "Other").mkdir()
+            (root / "Other" / "b.jpg").write_bytes(b"data")
+
+            result = fd.search("trip", roots=[str(root)])
+
+            resolved = trip.resolve()
+            self.assertEqual([str(resolved), str(resolved / "day1")], result["matched_dirs"])
+            self.assertEqual(2, result["total_media"])
+            self.assertFalse(result["cancelled"])
+            self.assertFalse(result["dirs_truncated"])
+
+    def test_search_stops_when_asked(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for name in ("trip1", "trip2", "trip3"):
+                (root / name).mkdir()
+            polls = []
+
+            def should_stop():
+                polls.append(1)
+                return len(polls) > 2
+
+            result = fd.search("trip", roots=[str(root)], should_stop=should_stop)
+
+            self.assertTrue(result["cancelled"])
+            self.assertLess(len(result["matched_dirs"]), 3)
+
+    def test_walk_is_sorted_depth_first_whatever_the_pool_size(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for rel in ["b/y", "b/x", "a/z/deep", "c", ".hidden/q", "node_modules/m"]:
+                (root / rel).mkdir(parents=True)
+            (root / "a" / "z" / "1.jpg").write_bytes(b"data")
+
+            walks = [
+                [(cur.relative_to(root).as_posix(), files) for cur, files in fd.walk_dirs([root], False, {"node_modules"}, workers=n)]
+                for n in (1, 8)
+            ]
+
+            self.assertEqual(walks[0], walks[1])
+            self.assertEqual(
+                [(".", []), ("a", []), ("a/z", ["1.jpg"]), ("a/z/deep", []), ("b", []), ("b/x", []), ("b/y", []), ("c", [])],
+                walks[0],
+            )
+
+    def test_keyword_limit_keeps_the_first_matches_in_walk_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for name in ["trip3", "trip1", "trip2", "trip0"]:
+                (root / name).mkdir()
+            with mock.patch.object(fd, "MAX_KEYWORD_DIRS", 2):
+                hits = fd.find_keyword_dirs([root], "trip", False, set())
+            self.assertEqual([root / "trip0", root / "trip1"], hits)
+
+    def test_listings_run_concurrently(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for n in range(12):
+                (root / f"d{n:02d}").mkdir()
+            active, peak = [0], [0]
+            lock = threading.Lock()
+            real_list_dir = fd.list_dir_entries
+
+            def slow_list_dir(*args):
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.02)  # network round trip
+                with lock:
+                    active[0] -= 1
+                return real_list_dir(*args)
+
+            with mock.patch.object(fd, "list_dir_entries", slow_list_dir):
+                walked = list(fd.walk_dirs([root], False, set(), workers=4))
+
+            self.assertEqual(13, len(walked))
+            self.assertGreater(peak[0], 1)
+            self.assertLessEqual(peak[0], 4)
+
+    def test_search_answers_from_index(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp).resolve()
+            trip = root / "Trip2024"
+            (trip / "day1").mkdir(parents=True)
+            (trip / "day1" / "a.jpg").write_bytes(b"data")
+            (trip / "day1" / "b.mov").write_bytes(b"data")
+            index = dir_index.DirIndex(root / "index.sqlite3")
+            try:
+                first = fd.search("trip", roots=[str(root)], index=index)
+                with mock.patch.object(fd, "find_keyword_dirs", side_effect=AssertionError("walked")):
+                    second = fd.search("trip", roots=[str(root)], index=index)
+            finally:
+                index.close()
+
+            self.assertTrue(first["indexed"])
+            self.assertEqual([str(trip), str(trip / "day1")], second["matched_dirs"])
+            self.assertEqual([{"dir": str(trip / "day1"), "count": 2}], second["media_counts"])
+            self.assertEqual(2, second["total_media"])
+
 
 if __name__ == "__main__":
     unittest.main()
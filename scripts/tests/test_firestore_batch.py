@@ -0,0 +1,142 @@
+import sys
+import unittest
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import firestore_batch as fb
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+
+class FakeDocRef:
+    def __init__(self, db, collection, doc_id):
+        self.db = db
+        self.key = (collection, doc_id)
+        self.id = doc_id
+
+    def set(self, data, merge=False):
+        if self.key in self.db.reject:
+            raise ValueError(f"rejected {self.key}")
+        self.db.docs[self.key] = data
+        self.db.single_writes += 1
+
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeDocRef(self.db, self.name, doc_id)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append((ref, data))
+
+    def commit(self):
+        if any(ref.key in self.db.reject for ref, _ in self.ops):
+            raise ValueError("batch rejected")
+        for ref, data in self.ops:
+            self.db.docs[ref.key] = data
+        self.db.batch_commits.append(len(self.ops))
+
+
+class FakeDb:
+    def __init__(self, reject=()):
+        self.docs = {}
+        self.reject = set(reject)
+        self.batch_commits = []
+        self.single_writes = 0
+        self.get_all_calls = 0
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def get_all(self, refs, field_paths=None):
+        self.get_all_calls += 1
+        self.field_paths = field_paths
+        return [FakeSnapshot(r.id, self.docs.get(r.key)) for r in refs]
+
+
+class BatchedWriterTests(unittest.TestCase):
+    def test_flushes_by_count(self):
+        db = FakeDb()
+        with fb.BatchedWriter(db, max_ops=2, flush_interval_sec=60) as writer:
+            for i in range(5):
+                writer.set("photos", f"p{i}", {"i": i})
+            self.assertEqual([2, 2], db.batch_commits)
+        self.assertEqual([2, 2, 1], db.batch_commits)
+        self.assertEqual(5, writer.written)
+
+    def test_flushes_by_time(self):
+        db = FakeDb()
+        now = [0.0]
+        writer = fb.BatchedWriter(db, flush_interval_sec=2.0, clock=lambda: now[0])
+        writer.set("photos", "a", {})
+        now[0] = 2.5
+        writer.set("photos", "b", {})
+        self.assertEqual([2], db.batch_commits)
+
+    def test_maybe_flush_sends_ops_that_outlive_the_interval_without_a_set(self):
+        db = FakeDb()
+        now = [0.0]
+        writer = fb.BatchedWriter(db, flush_interval_sec=2.0, clock=lambda: now[0])
+        writer.set("photos", "a", {})
+        now[0] = 1.0
+        writer.maybe_flush()
+        self.assertEqual([], db.batch_commits)
+        now[0] = 2.5
+        writer.maybe_flush()
+        self.assertEqual([1], db.batch_commits)
+
+    def test_failed_batch_reports_per_document(self):
+        db = FakeDb(reject={("photos", "bad")})
+        results = {}
+        writer = fb.BatchedWriter(db)
+        for doc_id in ("a", "bad", "c"):
+            writer.set("photos", doc_id, {}, callback=lambda exc, d=doc_id: results.__setitem__(d, exc))
+        writer.close()
+
+        self.assertEqual(["photos/bad"], [name for name, _ in writer.failures])
+        self.assertIsNone(results["a"])
+        self.assertIsInstance(results["bad"], ValueError)
+        self.assertIn(("photos", "c"), db.docs)
+        self.assertEqual(2, writer.written)
+
+    def test_get_existing_chunks_requests(self):
+        db = FakeDb()
+        db.docs[("folders", "x")] = {"name": "x"}
+        found = fb.get_existing(db, "folders", ["x", "y", "z"], chunk_size=2)
+        self.assertEqual({"x": {"name": "x"}}, found)
+        self.assertEqual(2, db.get_all_calls)
+
+    def test_existing_doc_ids_requests_names_only(self):
+        db = FakeDb()
+        db.docs[("photos", "a")] = {"fileName": "a.jpg"}
+        db.docs[("photos", "c")] = {"fileName": "c.jpg"}
+        found = fb.existing_doc_ids(db, "photos", ["a", "b", "c", "a"], chunk_size=2)
+        self.assertEqual({"a", "c"}, found)
+        self.assertEqual([], db.field_paths)
+        self.assertEqual(2, db.get_all_calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
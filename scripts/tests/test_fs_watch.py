@@ -0,0 +1,147 @@
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import fs_watch
+
+
+def is_jpeg(path):
+    return path.suffix.lower() == ".jpg"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, sec):
+        self.now += sec
+
+
+class DebouncerTests(unittest.TestCase):
+    def test_file_is_ready_once_it_stops_changing(self):
+        clock = FakeClock()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "a.jpg"
+            path.write_bytes(b"part")
+            debouncer = fs_watch.Debouncer(2.0, clock)
+            debouncer.add([path])
+
+            clock.now = 1.0
+            path.write_bytes(b"partial copy")  # still growing
+            self.assertEqual([], debouncer.ready())
+            clock.now = 2.5
+            self.assertEqual([], debouncer.ready())
+            clock.now = 3.1
+            self.assertEqual([path], debouncer.ready())
+            self.assertEqual(0, len(debouncer))
+
+    def test_deleted_file_is_dropped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            debouncer = fs_watch.Debouncer(0.0)
+            debouncer.add([Path(tmp) / "gone.jpg"])
+            self.assertEqual([], debouncer.ready())
+            self.assertEqual(0, len(debouncer))
+
+
+class PollingWatcherTests(unittest.TestCase):
+    def test_reports_new_and_rewritten_files_in_changed_dirs(self):
+        clock = FakeClock()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(fs_watch, "MTIME_SETTLE_NS", 0):
+            base = Path(tmp)
+            (base / "old.jpg").write_bytes(b"x")
+            watcher = fs_watch.PollingWatcher(base, is_jpeg, interval_sec=5, clock=clock, sleep=clock.sleep)
+
+            self.assertEqual([], watcher.poll(1.0))  # not due yet
+            (base / "2024" / "trip").mkdir(parents=True)
+            (base / "2024" / "trip" / "new.jpg").write_bytes(b"x")
+            (base / "notes.txt").write_bytes(b"x")
+            clock.now = 5.0
+            self.assertEqual([base / "2024" / "trip" / "new.jpg"], watcher.poll(1.0))
+
+            clock.now = 10.0
+            self.assertEqual([], watcher.poll(1.0))
+
+    def test_only_changed_dirs_are_listed(self):
+        clock = FakeClock()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(fs_watch, "MTIME_SETTLE_NS", 0):
+            base = Path(tmp)
+            for name in ("a", "b", "c"):
+                (base / name).mkdir()
+            watcher = fs_watch.PollingWatcher(base, is_jpeg, interval_sec=0, clock=clock, sleep=clock.sleep)
+            (base / "b" / "x.jpg").write_bytes(b"x")
+            with mock.patch.object(watcher, "_list", wraps=watcher._list) as listed:
+                self.assertEqual([base / "b" / "x.jpg"], watcher.poll(0))
+            self.assertEqual([mock.call(str(base / "b"))], listed.call_args_list)
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+class InotifyWatcherTests(unittest.TestCase):
+    def _poll_until(self, watcher, want, timeout=5.0):
+        got = []
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not set(want) <= set(got):
+            got.extend(watcher.poll(0.1))
+        return got
+
+    def test_close_write_and_new_dirs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            try:
+                watcher = fs_watch.InotifyWatcher(base, is_jpeg)
+            except OSError as exc:
+                self.skipTest(f"inotify unavailable: {exc}")
+            try:
+                (base / "a.jpg").write_bytes(b"x")
+                (base / "a.txt").write_bytes(b"x")
+                (base / "new" / "deep").mkdir(parents=True)
+                (base / "new" / "deep" / "b.jpg").write_bytes(b"x")
+                want = [base / "a.jpg", base / "new" / "deep" / "b.jpg"]
+                got = self._poll_until(watcher, want)
+            finally:
+                watcher.close()
+        self.assertEqual(set(want), set(got))
+
+
+class OpenWatcherTests(unittest.TestCase):
+    def test_network_mounts_are_polled(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            mounts = Path(tmp) / "mounts"
+            mounts.write_text(
+                "/dev/sda1 / ext4 rw 0 0\n"
+                f"//nas/photos {tmp} cifs rw 0 0\n",
+                encoding="utf-8",
+            )
+            self.assertEqual("cifs", fs_watch.mount_fstype(Path(tmp) / "2024", str(mounts)))
+            self.assertEqual("ext4", fs_watch.mount_fstype(Path("/usr"), str(mounts)))
+            with mock.patch.object(fs_watch, "mount_fstype", return_value="cifs"):
+                watcher = fs_watch.open_watcher(Path(tmp), is_jpeg)
+            self.assertEqual("poll", watcher.kind)
+
+    def test_watch_yields_settled_batches(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            batches = []
+            stop = []
+
+            def should_stop():
+                if not stop and not batches:
+                    (base / "a.jpg").write_bytes(b"x")
+                    stop.append(time.monotonic())
+                return bool(batches) or time.monotonic() - stop[0] > 5
+
+            for batch in fs_watch.watch(base, is_jpeg, settle_sec=0.1, poll_sec=0.05, should_stop=should_stop):
+                batches.append(batch)
+        self.assertEqual([[base / "a.jpg"]], batches)
+
+
+if __name__ == "__main__":
+    unittest.main()
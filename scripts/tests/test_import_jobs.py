@@ -18,6 +18,7 @@ class ImportJobsTests(unittest.TestCase):
             dry_run=True,
             requested_by="tester",
             worker_id="worker-1",
+            shard_photos=2000,
         )
         self.assertEqual(
             {
@@ -26,6 +27,7 @@ class ImportJobsTests(unittest.TestCase):
                 "dryRun": True,
                 "requestedBy": "tester",
                 "workerId": "worker-1",
+                "shardPhotos": 2000,
             },
             payload,
         )
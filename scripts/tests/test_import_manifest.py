@@ -0,0 +1,113 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import import_manifest as im
+
+RENDITIONS = {"thumb": {"path": "photos/t/thumb/a.jpg", "longEdge": 256, "format": "jpeg", "quality": 90}}
+
+
+class ImportManifestTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.src = self.tmp / "a.jpg"
+        self.src.write_bytes(b"original")
+        self.manifest = im.ImportManifest(self.tmp / "manifest.sqlite3")
+
+    def tearDown(self):
+        self.manifest.close()
+        self._tmp.cleanup()
+
+    def _record(self):
+        st = self.src.stat()
+        self.manifest.record(self.src, "/t", st.st_size, st.st_mtime_ns, im.file_hash(self.src), "t_a", RENDITIONS)
+
+    def _check(self, renditions=RENDITIONS, doc_id="t_a"):
+        return self.manifest.check(self.src, "/t", self.src.stat(), doc_id, renditions)
+
+    def test_new_then_unchanged_after_record(self):
+        self.assertEqual(im.NEW, self._check())
+        self._record()
+        self.assertEqual(im.UNCHANGED, self._check())
+        self.assertEqual(im.NEW, self.manifest.check(self.src, "/other", self.src.stat(), "t_a", RENDITIONS))
+
+    def test_touched_file_with_same_content_is_unchanged(self):
+        self._record()
+        st = self.src.stat()
+        os.utime(self.src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(im.UNCHANGED, self._check())
+        self.assertEqual(st.st_mtime_ns + 10**9, self.manifest.lookup(self.src, "/t").mtime_ns)
+
+    def test_content_or_params_change_is_changed(self):
+        self._record()
+        self.assertEqual(im.CHANGED, self._check(renditions={"thumb": dict(RENDITIONS["thumb"], quality=80)}))
+        self.src.write_bytes(b"edited!!")
+        st = self.src.stat()
+        os.utime(self.src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(im.CHANGED, self._check())
+
+    def test_entries_persist_across_reopen(self):
+        self._record()
+        self.manifest.close()
+        self.manifest = im.ImportManifest(self.tmp / "manifest.sqlite3")
+        self.assertEqual(im.UNCHANGED, self._check())
+
+    def test_blob_index_needs_every_rendition(self):
+        keys = {"thumb": "t-params", "medium": "m-params"}
+        self.manifest.record_blob("h1", "t-params", "photos/a/thumb.jpg", (256, 171))
+        self.assertIsNone(self.manifest.find_blobs("h1", keys))
+        self.manifest.record_blob("h1", "m-params", "photos/a/medium.jpg", (1280, 853))
+        self.assertEqual(
+            {"thumb": ("photos/a/thumb.jpg", 256, 171), "medium": ("photos/a/medium.jpg", 1280, 853)},
+            self.manifest.find_blobs("h1", keys),
+        )
+        self.assertIsNone(self.manifest.find_blobs("h1", {"thumb": "other-params"}))
+        self.manifest.forget_blobs("h1")
+        self.assertIsNone(self.manifest.find_blobs("h1", keys))
+
+    def test_touch_after_commit_is_persisted(self):
+        self._record()
+        self.manifest.commit()
+        st = self.src.stat()
+        os.utime(self.src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(im.UNCHANGED, self._check())
+        self.manifest.close()
+        self.manifest = im.ImportManifest(self.tmp / "manifest.sqlite3")
+        self.assertEqual(st.st_mtime_ns + 10**9, self.manifest.lookup(self.src, "/t").mtime_ns)
+
+    def test_two_manifests_on_one_file_do_not_lock_each_other(self):
+        # Side-by-side worker jobs: neither may keep the write lock between commits
+        other = im.ImportManifest(self.tmp / "manifest.sqlite3", busy_timeout_sec=0.1)
+        self.manifest.close()
+        self.manifest = im.ImportManifest(self.tmp / "manifest.sqlite3", busy_timeout_sec=0.1)
+        try:
+            for i in range(5):
+                for m in (self.manifest, other):
+                    m.record(self.tmp / f"{i}.jpg", f"/{id(m)}", 1, 1, None, f"d{i}", RENDITIONS)
+                    m.record_blob(f"h{i}", f"p{id(m)}", f"photos/{i}.jpg", (1, 1))
+                    if i % 2:
+                        m.commit()
+            other.commit()
+            self.assertEqual("d4", self.manifest.lookup(self.tmp / "4.jpg", f"/{id(other)}").doc_id)
+        finally:
+            other.close()
+
+    def test_buffered_writes_commit_on_time_limit(self):
+        self.manifest.close()
+        self.manifest = im.ImportManifest(self.tmp / "manifest.sqlite3", commit_every=1000, commit_interval_sec=0)
+        self._record()
+        reader = im.ImportManifest(self.tmp / "manifest.sqlite3")
+        try:
+            self.assertIsNotNone(reader.lookup(self.src, "/t"))
+        finally:
+            reader.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
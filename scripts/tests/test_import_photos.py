@@ -0,0 +1,257 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import types
+import unittest
+from pathlib import Path
+from unittest import mock
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+sys.path.insert(0, str(SCRIPT_DIR / "bench"))
+
+
+def _install_stub_modules():
+    stubs = {}
+    if importlib.util.find_spec("firebase_admin") is not None:
+        return stubs
+    for name in [
+        "firebase_admin",
+        "firebase_admin.credentials",
+        "firebase_admin.firestore",
+        "firebase_admin.storage",
+    ]:
+        if name not in sys.modules:
+            mod = types.ModuleType(name)
+            sys.modules[name] = mod
+            stubs[name] = mod
+    sys.modules["firebase_admin.firestore"].SERVER_TIMESTAMP = object()
+    return stubs
+
+
+_install_stub_modules()
+
+import import_photos as ip
+from fakes import FakeBucket, FakeFirestore
+from import_manifest import ImportManifest, file_hash
+from import_pipeline import UploadStage
+
+
+class StreamingScanTests(unittest.TestCase):
+    def _make_tree(self, base: Path):
+        for rel in ["b.jpg", "a.JPG", "notes.txt", "2024/z.png", "2024/y.heic", "2024/trip/c.jpeg", "empty/x.txt"]:
+            p = base / rel
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_bytes(b"data")
+
+    def test_order_matches_per_folder_filename_sort(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            self._make_tree(base)
+            folders = []
+            items = list(ip.iter_ordered_items(base, "/t", lambda rel, files, docs, start: folders.append((rel, docs))))
+
+            got = [(p.relative_to(base).as_posix(), rel, order) for p, rel, order in items]
+            self.assertEqual(
+                [
+                    ("a.JPG", "", 0),
+                    ("b.jpg", "", 1),
+                    ("2024/y.heic", "2024", 0),
+                    ("2024/z.png", "2024", 1),
+                    ("2024/trip/c.jpeg", "2024/trip", 0),
+                ],
+                got,
+            )
+            self.assertEqual(["", "2024", "2024/trip"], [rel for rel, _ in folders])
+            self.assertEqual(["/t/2024/trip"], [d["path"] for d in folders[2][1]])
+
+    def test_first_folder_is_yielded_before_the_rest_is_listed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            self._make_tree(base)
+            with mock.patch.object(ip.os, "scandir", wraps=ip.os.scandir) as scandir:
+                first = next(ip.iter_ordered_items(base, "", lambda *a: None))
+            self.assertEqual(base / "a.JPG", first[0])
+            self.assertEqual(1, scandir.call_count)
+
+    def test_shard_lists_only_its_folder_slices_and_keeps_orders(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            self._make_tree(base)
+            shard = [{"relDir": "", "start": 1, "end": None}, {"relDir": "2024", "start": 0, "end": 1}]
+            starts = []
+            with mock.patch.object(ip.os, "scandir", wraps=ip.os.scandir) as scandir:
+                items = list(
+                    ip.iter_ordered_items(
+                        base, "/t", lambda rel, files, docs, start: starts.append((rel, len(files), start)), shard=shard
+                    )
+                )
+            got = [(p.relative_to(base).as_posix(), rel, order) for p, rel, order in items]
+            self.assertEqual([("b.jpg", "", 1), ("2024/y.heic", "2024", 0)], got)
+            self.assertEqual([("", 1, 1), ("2024", 1, 0)], starts)
+            self.assertEqual(2, scandir.call_count)
+
+    @unittest.skipUnless(hasattr(os, "symlink"), "needs symlinks")
+    def test_symlinked_dirs_are_not_followed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            (base / "a").mkdir()
+            (base / "a" / "x.jpg").write_bytes(b"data")
+            try:
+                os.symlink("..", base / "a" / "loop", target_is_directory=True)
+            except OSError as exc:
+                self.skipTest(f"cannot create symlinks: {exc}")
+
+            folders = [(rel_dir, [p.name for p in files]) for rel_dir, files in ip.iter_image_folders(base)]
+
+        self.assertEqual([("a", ["x.jpg"])], folders)
+
+    def test_watch_items_list_only_affected_folders_with_full_scan_orders(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            self._make_tree(base)
+            new = base / "2024" / "x.jpg"
+            new.write_bytes(b"data")
+            with mock.patch.object(ip, "_scan_dir", wraps=ip._scan_dir) as scan:
+                items, folders = ip.watch_items(base, [new, base / "notes.txt"], "/t", set())
+
+            self.assertEqual([(new, "2024", 0)], items)
+            self.assertEqual(["/t/2024"], [f["path"] for f in folders])
+            self.assertEqual([mock.call(base / "2024")], scan.call_args_list)
+
+    def test_watch_import_imports_each_batch(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            self._make_tree(base)
+            imported, folder_writes = [], []
+
+            def import_items(items):
+                imported.append([(p.name, rel, order) for p, rel, order in items])
+                return 1 if len(imported) == 2 else 0
+
+            batches = [[base / "b.jpg"], [base / "notes.txt"], [base / "2024/trip/c.jpeg", base / "2024/z.png"]]
+            found, failed = ip.watch_import(base, "/t", iter(batches), import_items, folder_writes.append)
+
+        self.assertEqual(3, found)
+        self.assertEqual(1, failed)
+        self.assertEqual([[("b.jpg", "", 1)], [("z.png", "2024", 1), ("c.jpeg", "2024/trip", 0)]], imported)
+        # folder docs are only offered once per folder
+        self.assertEqual([["/t"], ["/t/2024", "/t/2024/trip"]], [[f["path"] for f in w] for w in folder_writes])
+
+    def test_watch_sees_files_added_during_the_initial_import(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp).resolve()
+            (base / "a.jpg").write_bytes(b"data")
+            args = ip.parse_args([
+                "--input-dir", str(base), "--root-path", "/t", "--dry-run", "--watch",
+                "--watch-mode", "poll", "--watch-poll", "0.05", "--watch-settle", "0",
+            ])
+            imported = []
+
+            def fake_import(db, bucket, items, *a, **kw):
+                imported.append(sorted(p.name for p, _, _ in items))
+                if len(imported) == 1:
+                    # Copied in while the initial import is still running
+                    (base / "late.jpg").write_bytes(b"data")
+                    return 0
+                raise KeyboardInterrupt
+
+            with mock.patch.object(ip, "upload_and_make_docs", fake_import), mock.patch("builtins.print"):
+                ip.run(args, None, None)
+
+        self.assertEqual([["a.jpg"], ["late.jpg"]], imported)
+
+
+class RenderCeilingTests(unittest.TestCase):
+    def test_source_over_decode_ceiling_fails_alone(self):
+        from PIL import Image
+
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            Image.new("RGB", (400, 300)).save(base / "a.png")
+            Image.new("RGB", (3000, 2000)).save(base / "b.png")
+            items = [(base / "a.png", "", 0), (base / "b.png", "", 1)]
+            with mock.patch("builtins.print") as printed:
+                failed = ip.upload_and_make_docs(None, None, items, "/t", True, max_pixels=1_000_000)
+            self.assertEqual(1, failed)
+            docs = [c.args[0] for c in printed.call_args_list if "photo doc" in c.args[0]]
+            self.assertEqual(1, len(docs))
+            self.assertIn("photos/t_a", docs[0])
+
+    def test_zero_decode_ceiling_means_no_limit(self):
+        from PIL import Image
+
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            Image.new("RGB", (3000, 2000)).save(base / "b.png")
+            # A Pillow bomb limit left over from earlier must not apply either
+            with mock.patch("builtins.print"), mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+                ip.set_decode_ceiling(ip.max_decode_pixels(0))
+                self.assertIsNone(Image.MAX_IMAGE_PIXELS)
+                failed = ip.upload_and_make_docs(
+                    None, None, [(base / "b.png", "", 0)], "/t", True, max_pixels=ip.max_decode_pixels(0)
+                )
+            self.assertEqual(0, failed)
+
+    def test_decode_ceiling_keeps_pillow_check_past_any_draft_scale(self):
+        from PIL import Image
+
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", Image.MAX_IMAGE_PIXELS):
+            ip.set_decode_ceiling(ip.max_decode_pixels(400))
+            self.assertEqual(400_000_000 * 64, Image.MAX_IMAGE_PIXELS)
+
+
+class ManifestDedupTests(unittest.TestCase):
+    def setUp(self):
+        from PIL import Image
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.base = Path(tmp.name)
+        self.src = self.base / "a.png"
+        Image.new("RGB", (640, 480), "teal").save(self.src)
+        self.manifest = ImportManifest(self.base / "manifest.sqlite3")
+        self.addCleanup(self.manifest.close)
+        self.db, self.bucket = FakeFirestore(), FakeBucket()
+        self.keys = {spec.name: spec.params_key for spec in ip.DEFAULT_RENDITIONS}
+
+    def _import(self, root_path: str) -> int:
+        with UploadStage(self.bucket, max_in_flight=2, retries=0) as uploader:
+            return ip.upload_and_make_docs(
+                self.db, self.bucket, [(self.src, "", 0)], root_path, False, uploader=uploader, manifest=self.manifest
+            )
+
+    def test_source_is_read_once_and_decoded_from_the_hashed_bytes(self):
+        opened = []
+        real_open = ip.Image.open
+
+        def record_open(fp, *args, **kwargs):
+            opened.append(fp)
+            return real_open(fp, *args, **kwargs)
+
+        with mock.patch.object(ip.Image, "open", side_effect=record_open):
+            self.assertEqual(0, self._import("/a"))
+        self.assertEqual(1, len(opened))
+        self.assertNotIsInstance(opened[0], (str, Path))
+        self.assertEqual(2, len(self.bucket.blobs))
+
+    def test_missing_blob_drops_index_rows_and_re_renders(self):
+        self.assertEqual(0, self._import("/a"))
+        content_hash = file_hash(self.src)
+        old = self.manifest.find_blobs(content_hash, self.keys)
+        self.bucket.blobs.clear()  # renditions deleted behind the manifest's back
+
+        with mock.patch.object(ip, "elog"), mock.patch.object(ip, "render_source", wraps=ip.render_source) as render:
+            self.assertEqual(0, self._import("/b"))
+
+        render.assert_called_once()
+        self.assertEqual(2, len(self.bucket.blobs))
+        new = self.manifest.find_blobs(content_hash, self.keys)
+        self.assertEqual(set(self.bucket.blobs), {path for path, _, _ in new.values()})
+        self.assertFalse({path for path, _, _ in old.values()} & set(self.bucket.blobs))
+        self.assertIn(("photos", "b_a"), self.db.docs)
+
+
+if __name__ == "__main__":
+    unittest.main()
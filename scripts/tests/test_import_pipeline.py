@@ -0,0 +1,134 @@
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import import_pipeline as ip
+
+
+def _slow_square(x):
+    time.sleep(0.01 * (5 - x % 5))
+    return x * x
+
+
+class BoundedMapTests(unittest.TestCase):
+    def test_results_keep_input_order(self):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            out = list(ip.bounded_map(_slow_square, range(10), pool, max_pending=4))
+        self.assertEqual([(i, i * i) for i in range(10)], out)
+
+    def test_input_is_pulled_at_most_max_pending_ahead(self):
+        pulled = []
+
+        def source():
+            for i in range(100):
+                pulled.append(i)
+                yield i
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            gen = ip.bounded_map(_slow_square, source(), pool, max_pending=3)
+            self.assertEqual((0, 0), next(gen))
+            self.assertEqual(3, len(pulled))
+            gen.close()
+
+    def test_inline_without_executor(self):
+        self.assertEqual([(2, 4), (3, 9)], list(ip.bounded_map(_slow_square, [2, 3])))
+
+
+class NotFound(Exception):
+    code = 404
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def upload_from_file(self, fh, content_type=None):
+        self.bucket.record(self.name, fh.read(), content_type)
+
+
+class FakeBucket:
+    def __init__(self, fail_first=(), delay=0.0):
+        self.blobs = {}
+        self.attempts = {}
+        self.fail_first = set(fail_first)
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def copy_blob(self, blob, destination_bucket, new_name):
+        with self._lock:
+            self.attempts[new_name] = self.attempts.get(new_name, 0) + 1
+            if blob.name not in self.blobs:
+                raise NotFound(blob.name)
+            self.blobs[new_name] = self.blobs[blob.name]
+
+    def record(self, name, data, content_type):
+        with self._lock:
+            self.attempts[name] = self.attempts.get(name, 0) + 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            first = self.attempts[name] == 1
+        try:
+            time.sleep(self.delay)
+            if first and name in self.fail_first:
+                raise ConnectionError("transient")
+            with self._lock:
+                self.blobs[name] = (data, content_type)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class UploadStageTests(unittest.TestCase):
+    def test_uploads_run_concurrently_up_to_limit(self):
+        bucket = FakeBucket(delay=0.02)
+        with ip.UploadStage(bucket, max_in_flight=3) as stage:
+            futures = [stage.submit(f"p/{i}.jpg", b"x", "image/jpeg") for i in range(9)]
+            self.assertEqual([f"p/{i}.jpg" for i in range(9)], [f.result() for f in futures])
+        self.assertEqual(9, len(bucket.blobs))
+        self.assertEqual(3, bucket.max_active)
+
+    def test_failed_blob_is_retried_without_blocking_others(self):
+        bucket = FakeBucket(fail_first={"p/bad.jpg"})
+        sleeps = []
+        with ip.UploadStage(bucket, max_in_flight=2, retries=2, sleep=sleeps.append) as stage:
+            bad = stage.submit("p/bad.jpg", b"x", "image/jpeg")
+            good = stage.submit("p/good.jpg", b"y", "image/webp")
+            self.assertEqual("p/good.jpg", good.result())
+            self.assertEqual("p/bad.jpg", bad.result())
+        self.assertEqual(2, bucket.attempts["p/bad.jpg"])
+        self.assertEqual([1.0], sleeps)
+        self.assertEqual((b"y", "image/webp"), bucket.blobs["p/good.jpg"])
+
+    def test_upload_error_surfaces_after_retries(self):
+        bucket = FakeBucket(fail_first={"p/bad.jpg"})
+        with ip.UploadStage(bucket, retries=0) as stage:
+            with self.assertRaises(ConnectionError):
+                stage.submit("p/bad.jpg", b"x", "image/jpeg").result()
+
+    def test_copy_is_server_side_and_missing_source_is_not_retried(self):
+        bucket = FakeBucket()
+        bucket.blobs["a/x.jpg"] = (b"x", "image/jpeg")
+        sleeps = []
+        with ip.UploadStage(bucket, retries=3, sleep=sleeps.append) as stage:
+            self.assertEqual("b/x.jpg", stage.submit_copy("a/x.jpg", "b/x.jpg").result())
+            with self.assertRaises(NotFound):
+                stage.submit_copy("a/gone.jpg", "b/gone.jpg").result()
+        self.assertEqual((b"x", "image/jpeg"), bucket.blobs["b/x.jpg"])
+        self.assertEqual(1, bucket.attempts["b/gone.jpg"])
+        self.assertEqual([], sleeps)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import import_plan as plan
+
+
+class PlanShardsTests(unittest.TestCase):
+    def test_small_folders_are_packed_whole_in_scan_order(self):
+        shards = plan.plan_shards([("a", 3), ("b", 4), ("c", 2), ("d", 5)], max_photos=7)
+        self.assertEqual(
+            [["a", "b"], ["c", "d"]],
+            [[entry["relDir"] for entry in shard] for shard in shards],
+        )
+        self.assertTrue(all(entry["start"] == 0 and entry["end"] is None for shard in shards for entry in shard))
+
+    def test_large_folder_is_sliced_into_consecutive_ranges(self):
+        shards = plan.plan_shards([("a", 2), ("big", 25), ("c", 1)], max_photos=10)
+        self.assertEqual(
+            [
+                [{"relDir": "a", "start": 0, "end": None}],
+                [{"relDir": "big", "start": 0, "end": 10}],
+                [{"relDir": "big", "start": 10, "end": 20}],
+                [{"relDir": "big", "start": 20, "end": None}],
+                [{"relDir": "c", "start": 0, "end": None}],
+            ],
+            shards,
+        )
+
+    def test_plan_import_counts_photos_per_shard(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            for rel in ["x/1.jpg", "x/2.jpg", "x/3.jpg", "y/1.png", "notes.txt"]:
+                path = base / rel
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(b"data")
+            result = plan.plan_import(base, max_photos=2)
+        self.assertEqual(2, result["folders"])
+        self.assertEqual(4, result["photos"])
+        self.assertEqual([2, 1, 1], [shard["photos"] for shard in result["shards"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
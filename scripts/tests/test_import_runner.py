@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import import_runner as ir
+from test_proc_stream import WITH_GRANDCHILD, process_gone
+
+ENV = {**os.environ, "PYTHONUNBUFFERED": "1"}
+
+
+class WarmRunnerTests(unittest.TestCase):
+    def test_runs_jobs_back_to_back_in_one_process(self):
+        from PIL import Image
+
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            Image.new("RGB", (64, 48), "red").save(base / "a.jpg")
+            argv = ["--input-dir", str(base), "--root-path", "/t", "--dry-run", "--progress-interval", "0.001"]
+            runner = ir.WarmRunner(ENV)
+            try:
+                lines = []
+                first = runner.run("job-1", argv, timeout_sec=60, on_line=lambda s, l: lines.append((s, l)), poll_sec=0.05)
+                pid = runner._proc.pid
+                second = runner.run("job-2", argv, timeout_sec=60, poll_sec=0.05)
+                bad = runner.run("job-3", ["--input-dir", str(base)], timeout_sec=60, poll_sec=0.05)
+                self.assertTrue(runner.alive)
+                self.assertEqual(pid, runner._proc.pid)
+            finally:
+                runner.close()
+        self.assertEqual(0, first.returncode)
+        self.assertIn("[DRY-RUN] photo doc -> photos/t_a", first.stdout)
+        self.assertIn(("stdout", "Done.\n"), lines)
+        self.assertTrue(any(l.startswith('{"event":"progress"') for s, l in lines if s == "stderr"))
+        self.assertEqual(0, second.returncode)
+        self.assertIn("Done.", second.stdout)
+        # argparse error (missing --root-path) fails the job, not the runner
+        self.assertEqual(2, bad.returncode)
+        self.assertIn("--root-path", bad.stderr)
+
+
+class RunnerIsolationTests(unittest.TestCase):
+    def _fake_runner(self, body: str) -> Path:
+        path = Path(self.tmp.name) / "fake_runner.py"
+        path.write_text("import sys\nsys.stdin.readline()\n" + body)
+        return path
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_crashed_runner_fails_the_job_and_is_replaced(self):
+        fake = self._fake_runner("print('dying', flush=True)\nsys.exit(3)\n")
+        with mock.patch.object(ir, "RUNNER_PATH", fake):
+            pool = ir.RunnerPool(ENV)
+            try:
+                result = pool.run("job-1", [], timeout_sec=30, poll_sec=0.05)
+                self.assertEqual(ir.RUNNER_LOST, result.returncode)
+                self.assertEqual("dying\n", result.stdout)
+                self.assertEqual([], pool._all)
+            finally:
+                pool.close()
+
+    def test_timeout_kills_the_runner(self):
+        fake = self._fake_runner("import time\nprint('working', flush=True)\ntime.sleep(30)\n")
+        with mock.patch.object(ir, "RUNNER_PATH", fake):
+            runner = ir.WarmRunner(ENV)
+            try:
+                result = runner.run("job-1", [], timeout_sec=0.5, poll_sec=0.05)
+            finally:
+                runner.close()
+        self.assertTrue(result.timed_out)
+        self.assertFalse(runner.alive)
+        self.assertEqual("working\n", result.stdout)
+        self.assertLess(result.elapsed_sec, 10)
+
+    @unittest.skipUnless(hasattr(os, "killpg"), "process groups are POSIX only")
+    def test_timeout_kills_the_runners_child_processes(self):
+        fake = self._fake_runner(WITH_GRANDCHILD)
+        with mock.patch.object(ir, "RUNNER_PATH", fake):
+            runner = ir.WarmRunner(ENV)
+            try:
+                result = runner.run("job-1", [], timeout_sec=1.0, poll_sec=0.05)
+            finally:
+                runner.close()
+        self.assertTrue(result.timed_out)
+        self.assertTrue(process_gone(int(result.stdout)))
+        self.assertLess(result.elapsed_sec, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
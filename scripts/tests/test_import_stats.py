@@ -0,0 +1,73 @@
+import io
+import json
+import sys
+import unittest
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import import_stats as st
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ImportStatsTests(unittest.TestCase):
+    def test_summary_reports_percentiles_and_bytes(self):
+        stats = st.ImportStats()
+        for ms in range(1, 101):
+            stats.record("upload", ms / 1000.0, nbytes=10)
+        stats.record("custom", 0.5)
+        stats.incr("photos_imported", 3)
+
+        summary = stats.summary()
+        upload = summary["stages"]["upload"]
+        self.assertEqual(100, upload["count"])
+        self.assertEqual(50.0, upload["p50_ms"])
+        self.assertEqual(95.0, upload["p95_ms"])
+        self.assertEqual(100.0, upload["max_ms"])
+        self.assertEqual(1000, upload["bytes"])
+        self.assertAlmostEqual(5.05, upload["total_sec"])
+        # Known stages first, in pipeline order, then anything else
+        self.assertEqual(["upload", "custom"], list(summary["stages"]))
+        self.assertEqual({"photos_imported": 3}, summary["counters"])
+
+    def test_timed_iter_measures_time_spent_producing_items(self):
+        clock = FakeClock()
+        stats = st.ImportStats(clock=clock)
+
+        def slow():
+            for i in range(3):
+                clock.now += 0.25
+                yield i
+
+        for _ in stats.timed_iter("scan", slow()):
+            clock.now += 10  # consumer time is not counted
+        scan = stats.summary()["stages"]["scan"]
+        self.assertEqual(3, scan["count"])
+        self.assertEqual(0.75, scan["total_sec"])
+
+    def test_progress_events_are_throttled_jsonl(self):
+        clock = FakeClock()
+        out = io.StringIO()
+        stats = st.ImportStats(out, progress_interval_sec=5, clock=clock)
+        stats.incr("photos_imported")
+        stats.maybe_emit_progress()
+        clock.now = 6
+        stats.maybe_emit_progress()
+        stats.maybe_emit_progress()
+        stats.maybe_emit_progress(force=True)
+        events = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(2, len(events))
+        self.assertEqual("progress", events[0]["event"])
+        self.assertEqual({"photos_imported": 1}, events[0]["counters"])
+
+
+if __name__ == "__main__":
+    unittest.main()
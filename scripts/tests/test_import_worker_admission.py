@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+SCRIPT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+
+def _install_stub_modules():
+    stubs = {}
+    for name in [
+        "firebase_admin",
+        "firebase_admin.credentials",
+        "firebase_admin.firestore",
+        "google",
+        "google.cloud",
+        "google.cloud.pubsub_v1",
+    ]:
+        if name not in sys.modules:
+            mod = types.ModuleType(name)
+            sys.modules[name] = mod
+            stubs[name] = mod
+    return stubs
+
+
+class FakeMessage:
+    def __init__(self, payload):
+        self.data = json.dumps(payload).encode("utf-8")
+        self.acked = False
+        self.nacked = False
+
+    def ack(self):
+        self.acked = True
+
+    def nack(self):
+        self.nacked = True
+
+
+class ImportWorkerAdmissionTests(unittest.TestCase):
+    def setUp(self):
+        self.stubs = _install_stub_modules()
+        import import_worker
+
+        self.worker = import_worker
+
+    def tearDown(self):
+        for name in self.stubs:
+            sys.modules.pop(name, None)
+
+    def test_routing(self):
+        with mock.patch.object(self.worker, "WORKER_ID", "pc1"):
+            self.assertTrue(self.worker._routed_here({"jobId": "a"}))
+            self.assertTrue(self.worker._routed_here({"jobId": "a", "workerId": None}))
+            self.assertTrue(self.worker._routed_here({"jobId": "a", "workerId": "pc1"}))
+            self.assertFalse(self.worker._routed_here({"jobId": "a", "workerId": "pc2"}))
+        with mock.patch.object(self.worker, "WORKER_ID", ""):
+            self.assertFalse(self.worker._routed_here({"jobId": "a", "workerId": "pc1"}))
+
+    def test_other_workers_job_is_republished_without_touching_firestore(self):
+        message = FakeMessage({"jobId": "job1", "workerId": "pc2"})
+        published = []
+        with mock.patch.object(self.worker, "WORKER_ID", "pc1"), mock.patch.object(
+            self.worker, "_get_job", side_effect=AssertionError("should not read the job")
+        ), mock.patch.object(self.worker, "_update_job", side_effect=AssertionError("should not write the job")):
+            self.worker._handle_message(None, message, published.append)
+        self.assertEqual([{"jobId": "job1", "workerId": "pc2", "routeHops": 1}], published)
+        self.assertTrue(message.acked)
+        self.assertFalse(message.nacked)
+
+    def test_routed_job_at_a_worker_without_id_logs_a_warning(self):
+        message = FakeMessage({"jobId": "job1", "workerId": "pc2"})
+        with mock.patch.object(self.worker, "WORKER_ID", ""), mock.patch.object(self.worker, "_log") as log:
+            self.worker._handle_message(None, message, lambda payload: None)
+        self.assertTrue(message.acked)
+        self.assertTrue(any(c.args[0].startswith("warning: job job1") for c in log.call_args_list))
+
+    def test_job_misrouted_too_often_is_failed(self):
+        message = FakeMessage({"jobId": "job1", "workerId": "pc2", "routeHops": self.worker.MAX_ROUTE_HOPS})
+        with mock.patch.object(self.worker, "WORKER_ID", "pc1"), mock.patch.object(
+            self.worker.firestore, "SERVER_TIMESTAMP", object(), create=True
+        ), mock.patch.object(self.worker, "_update_job") as update:
+            self.worker._handle_message(None, message, lambda payload: self.fail("republished"))
+        self.assertEqual("error", update.call_args.args[2]["status"])
+        self.assertTrue(message.acked)
+
+    def test_failed_republish_is_nacked(self):
+        message = FakeMessage({"jobId": "job1", "workerId": "pc2"})
+
+        def publish(payload):
+            raise RuntimeError("publish failed")
+
+        with mock.patch.object(self.worker, "WORKER_ID", "pc1"):
+            self.worker._handle_message(None, message, publish)
+        self.assertTrue(message.nacked)
+        self.assertFalse(message.acked)
+
+    def test_admission_blocked_by_load_or_memory(self):
+        with mock.patch.object(self.worker, "_load_per_cpu", return_value=0.2), mock.patch.object(
+            self.worker, "_mem_available_mb", return_value=8192
+        ):
+            self.assertIsNone(self.worker._admission_blocker())
+        with mock.patch.object(self.worker, "_load_per_cpu", return_value=3.0), mock.patch.object(
+            self.worker, "_mem_available_mb", return_value=8192
+        ):
+            self.assertIn("load", self.worker._admission_blocker())
+        with mock.patch.object(self.worker, "_load_per_cpu", return_value=None), mock.patch.object(
+            self.worker, "_mem_available_mb", return_value=10
+        ):
+            self.assertIn("memory", self.worker._admission_blocker())
+
+    def test_wait_for_admission_polls_until_headroom_or_deadline(self):
+        now = [0.0]
+
+        def sleep(sec):
+            now[0] += sec
+
+        blockers = iter(["busy", "busy", None])
+        with mock.patch.object(self.worker, "_admission_blocker", side_effect=lambda: next(blockers)):
+            result = self.worker._wait_for_admission(60, 5, sleep=sleep, clock=lambda: now[0])
+        self.assertIsNone(result)
+        self.assertEqual(10.0, now[0])
+
+        now[0] = 0.0
+        with mock.patch.object(self.worker, "_admission_blocker", return_value="busy"):
+            result = self.worker._wait_for_admission(12, 5, sleep=sleep, clock=lambda: now[0])
+        self.assertEqual("busy", result)
+        self.assertEqual(15.0, now[0])
+
+    def test_unadmitted_job_is_nacked_before_it_starts(self):
+        message = FakeMessage({"jobId": "job1"})
+        with mock.patch.object(self.worker, "_get_job", return_value={"status": "queued"}), mock.patch.object(
+            self.worker, "_wait_for_admission", return_value="load per cpu 3.00 >= 1.0"
+        ), mock.patch.object(self.worker, "_update_job") as update, mock.patch.object(
+            self.worker, "_run_import_job"
+        ) as run:
+            self.worker._handle_message(None, message)
+        self.assertTrue(message.nacked)
+        update.assert_not_called()
+        run.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
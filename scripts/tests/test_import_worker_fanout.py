@@ -0,0 +1,171 @@
+import json
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+SCRIPT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "bench"))
+
+from fakes import FakeFirestore  # noqa: E402
+
+
+def _install_stub_modules():
+    stubs = {}
+    for name in [
+        "firebase_admin",
+        "firebase_admin.credentials",
+        "firebase_admin.firestore",
+        "google",
+        "google.cloud",
+        "google.cloud.pubsub_v1",
+    ]:
+        if name not in sys.modules:
+            mod = types.ModuleType(name)
+            sys.modules[name] = mod
+            stubs[name] = mod
+    return stubs
+
+
+class FakeMessage:
+    def __init__(self, payload):
+        self.data = json.dumps(payload).encode("utf-8")
+        self.acked = False
+        self.nacked = False
+
+    def ack(self):
+        self.acked = True
+
+    def nack(self):
+        self.nacked = True
+
+
+class ImportWorkerFanOutTests(unittest.TestCase):
+    def setUp(self):
+        self.stubs = _install_stub_modules()
+        import import_worker
+
+        self.worker = import_worker
+
+    def tearDown(self):
+        for name in self.stubs:
+            sys.modules.pop(name, None)
+
+    def _plan(self):
+        return {
+            "folders": 2,
+            "photos": 30,
+            "shards": [
+                {"photos": 20, "folders": [{"relDir": "a", "start": 0, "end": 20}]},
+                {"photos": 10, "folders": [{"relDir": "a", "start": 20, "end": None}]},
+            ],
+        }
+
+    def test_child_payloads_keep_parent_fields(self):
+        parent = {"jobId": "p1", "inputDir": "/mnt/photos", "rootPath": "/2024", "workerId": "pc1", "shardPhotos": 20}
+        children = self.worker.child_payloads(parent, self._plan())
+        self.assertEqual(["p1-000", "p1-001"], [c["jobId"] for c in children])
+        self.assertEqual({"p1"}, {c["parentJobId"] for c in children})
+        self.assertEqual({"pc1"}, {c["workerId"] for c in children})
+        self.assertEqual([{"relDir": "a", "start": 20, "end": None}], children[1]["shard"])
+        self.assertNotIn("shardPhotos", children[0])
+
+    def test_planned_job_fans_out_instead_of_running(self):
+        message = FakeMessage({"jobId": "p1", "inputDir": "/mnt/photos", "shardPhotos": 20})
+        published = []
+        with mock.patch.object(self.worker, "_get_job", return_value={"status": "queued"}), mock.patch.object(
+            self.worker, "_plan_job", return_value=self._plan()
+        ), mock.patch.object(self.worker, "_fan_out") as fan_out, mock.patch.object(
+            self.worker, "_update_job"
+        ) as update, mock.patch.object(self.worker, "_run_import_job") as run, mock.patch.object(
+            self.worker, "firestore", mock.Mock(), create=True
+        ):
+            self.worker._handle_message(None, message, published.append)
+        run.assert_not_called()
+        self.assertTrue(message.acked)
+        children = fan_out.call_args[0][2]
+        self.assertEqual(2, len(children))
+        fields = update.call_args[0][2]
+        self.assertEqual(2, fields["childCount"])
+        self.assertEqual({"queued": 2}, fields["children"])
+
+    def test_fanned_out_parent_redelivery_is_acked(self):
+        message = FakeMessage({"jobId": "p1", "inputDir": "/mnt/photos", "shardPhotos": 20})
+        with mock.patch.object(self.worker, "_get_job", return_value={"status": "running", "childCount": 2}), mock.patch.object(
+            self.worker, "_plan_job"
+        ) as plan_job:
+            self.worker._handle_message(None, message, lambda payload: None)
+        plan_job.assert_not_called()
+        self.assertTrue(message.acked)
+
+    def test_failed_publish_is_finished_by_redelivery(self):
+        db = FakeFirestore()
+        payload = {"jobId": "p1", "inputDir": "/mnt/photos", "shardPhotos": 20}
+        published, failures = [], []
+
+        def flaky_publish(child):
+            if child["jobId"] == "p1-001" and not failures:
+                failures.append(child["jobId"])
+                raise RuntimeError("publish failed")
+            published.append(child["jobId"])
+
+        def deliver():
+            message = FakeMessage(payload)
+            with mock.patch.object(self.worker, "_plan_job", return_value=self._plan()), mock.patch.object(
+                self.worker, "firestore", mock.Mock(SERVER_TIMESTAMP="now"), create=True
+            ):
+                self.worker._handle_message(db, message, flaky_publish)
+            return message
+
+        first = deliver()
+        self.assertTrue(first.nacked)
+        self.assertNotIn("childCount", db.docs.get(("importJobs", "p1"), {}))
+
+        second = deliver()
+        self.assertTrue(second.acked)
+        # p1-000 went out the first time and is not sent twice
+        self.assertEqual(["p1-001"], failures)
+        self.assertEqual(["p1-000", "p1-001"], published)
+        self.assertEqual(2, db.docs[("importJobs", "p1")]["childCount"])
+        for child_id in ("p1-000", "p1-001"):
+            self.assertEqual("now", db.docs[("importJobs", child_id)]["publishedAt"])
+
+    def test_aggregate_children(self):
+        agg = self.worker.aggregate_children
+        self.assertEqual("done", agg(["done", "done"], [])["status"])
+        self.assertEqual("running", agg(["done", "error", "queued"], [])["status"])
+        self.assertEqual("running", agg(["done", None], [])["status"])
+        fields = agg(["done", "error"], [{"photosDone": 5, "photosTotal": 5}, {"photosDone": 1, "photosFailed": 2}])
+        self.assertEqual("error", fields["status"])
+        self.assertEqual({"queued": 0, "running": 0, "done": 1, "error": 1}, fields["children"])
+        self.assertEqual(6, fields["progress"]["photosDone"])
+        self.assertEqual(2, fields["progress"]["photosFailed"])
+
+    def test_update_parent_reads_children_and_writes_parent_in_one_transaction(self):
+        children = [
+            {"status": "done", "progress": {"photosDone": 20}},
+            {"status": "done", "progress": {"photosDone": 10}},
+        ]
+        transaction = mock.Mock()
+        db = mock.Mock()
+        db.transaction.return_value = transaction
+        query = db.collection.return_value.where.return_value.select.return_value
+        query.stream.return_value = [mock.Mock(to_dict=mock.Mock(return_value=c)) for c in children]
+        fake_firestore = mock.Mock(transactional=lambda fn: lambda t: fn(t), SERVER_TIMESTAMP="now")
+        with mock.patch.object(self.worker, "firestore", fake_firestore, create=True):
+            self.worker._update_parent(db, "p1")
+        query.stream.assert_called_once_with(transaction=transaction)
+        ref, fields = transaction.set.call_args[0]
+        self.assertIs(db.collection.return_value.document.return_value, ref)
+        db.collection.return_value.document.assert_called_with("p1")
+        self.assertEqual("done", fields["status"])
+        self.assertEqual(30, fields["progress"]["photosDone"])
+        self.assertEqual("now", fields["finishedAt"])
+        self.assertEqual({"merge": True}, transaction.set.call_args[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
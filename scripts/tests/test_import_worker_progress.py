@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+SCRIPT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+
+def _install_stub_modules():
+    stubs = {}
+    for name in [
+        "firebase_admin",
+        "firebase_admin.credentials",
+        "firebase_admin.firestore",
+        "google",
+        "google.cloud",
+        "google.cloud.pubsub_v1",
+    ]:
+        if name not in sys.modules:
+            mod = types.ModuleType(name)
+            sys.modules[name] = mod
+            stubs[name] = mod
+    return stubs
+
+
+def progress_event(elapsed, **counters):
+    return {
+        "event": "progress",
+        "elapsed_sec": elapsed,
+        "stages": {"upload": {"count": 3, "bytes": 12345}},
+        "counters": counters,
+    }
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ImportWorkerProgressTests(unittest.TestCase):
+    def setUp(self):
+        self.stubs = _install_stub_modules()
+        import import_worker
+
+        self.worker = import_worker
+
+    def tearDown(self):
+        for name in self.stubs:
+            sys.modules.pop(name, None)
+
+    def test_progress_fields(self):
+        fields = self.worker.progress_fields(
+            progress_event(10.0, photos_found=100, photos_imported=15, photos_skipped=5, photos_checkpointed=30)
+        )
+        self.assertEqual(50, fields["photosDone"])
+        self.assertEqual(100, fields["photosTotal"])
+        self.assertEqual(12345, fields["bytesUploaded"])
+        # checkpointed photos are done but do not count towards the rate
+        self.assertEqual(2.0, fields["photosPerSec"])
+        # no ETA until the scan has found every photo
+        self.assertIsNone(fields["etaSec"])
+
+        fields = self.worker.progress_fields(
+            progress_event(10.0, photos_found=100, photos_imported=20, scan_complete=1)
+        )
+        self.assertTrue(fields["scanComplete"])
+        self.assertEqual(40, fields["etaSec"])
+
+    def test_job_progress_throttles_writes(self):
+        writes = []
+        clock = FakeClock()
+        progress = self.worker.JobProgress(writes.append, interval_sec=30, clock=clock)
+        progress.maybe_write()
+        self.assertEqual([], writes)
+
+        progress.update(progress_event(1.0, photos_found=10, photos_imported=1))
+        progress.maybe_write()
+        progress.update(progress_event(6.0, photos_found=10, photos_imported=3))
+        clock.now = 10.0
+        progress.maybe_write()
+        self.assertEqual([1], [w["photosDone"] for w in writes])
+
+        clock.now = 31.0
+        progress.maybe_write()
+        clock.now = 70.0
+        progress.maybe_write()  # unchanged since the last write
+        self.assertEqual([1, 3], [w["photosDone"] for w in writes])
+
+    def test_run_subprocess_streams_progress_and_keeps_log_tails(self):
+        child = (
+            "import json, sys, time\n"
+            "print('scanning')\n"
+            "for n in range(3):\n"
+            "    sys.stderr.write(json.dumps({'event': 'progress', 'elapsed_sec': n, 'counters': {'photos_imported': n}},"
+            " separators=(',', ':')) + '\\n')\n"
+            "    sys.stderr.flush()\n"
+            "    time.sleep(0.05)\n"
+            "sys.stderr.write('[import_photos] done\\n')\n"
+        )
+        events, ticks = [], []
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(self.worker, "POLL_SEC", 0.02):
+            stats_path = os.path.join(tmp, "stats.json")
+            with open(stats_path, "w") as fh:
+                json.dump({"stages": {}}, fh)
+            result = self.worker._run_subprocess(
+                [sys.executable, "-c", child], os.environ.copy(), self.worker.time.time(), stats_path,
+                on_event=events.append, on_tick=lambda: ticks.append(1),
+            )
+        self.assertTrue(result["ok"])
+        self.assertEqual([0, 1, 2], [e["counters"]["photos_imported"] for e in events])
+        self.assertEqual("scanning\n", result["stdoutTail"])
+        self.assertEqual("[import_photos] done\n", result["stderrTail"])
+        self.assertEqual({"stages": {}}, result["stats"])
+        self.assertTrue(ticks)
+
+    def test_run_subprocess_kills_child_after_timeout(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            self.worker, "POLL_SEC", 0.02
+        ), mock.patch.object(self.worker, "SUBPROCESS_TIMEOUT_SEC", 0.2):
+            result = self.worker._run_subprocess(
+                [sys.executable, "-c", "import time; time.sleep(30)"], os.environ.copy(),
+                self.worker.time.time(), os.path.join(tmp, "missing.json"),
+            )
+        self.assertFalse(result["ok"])
+        self.assertIn("timeout", result["error"])
+        self.assertLess(result["elapsedSec"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
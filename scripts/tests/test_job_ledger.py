@@ -0,0 +1,110 @@
+import sys
+import unittest
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import job_ledger as jl
+
+
+class FakeWriter:
+    def __init__(self):
+        self.docs = {}
+        self.flush_checks = 0
+
+    def set(self, collection, doc_id, data, merge=True, callback=None):
+        self.docs[(collection, doc_id)] = dict(data)
+
+    def maybe_flush(self):
+        self.flush_checks += 1
+
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+
+class FakeDb:
+    def __init__(self, writer):
+        self.writer = writer
+
+    def collection(self, path):
+        db = self
+
+        class _Col:
+            def stream(self):
+                return [FakeSnapshot(d) for (c, _), d in db.writer.docs.items() if c == path]
+
+        return _Col()
+
+
+class JobLedgerTests(unittest.TestCase):
+    def setUp(self):
+        self.writer = FakeWriter()
+        self.db = FakeDb(self.writer)
+
+    def _ledger(self):
+        return jl.JobLedger(self.db, "job-1", self.writer, interval_sec=0)
+
+    def test_watermark_advances_over_contiguous_prefix_only(self):
+        ledger = self._ledger()
+        ledger.start_folder("/t/a", 4)
+        for order in (1, 0, 3):
+            ledger.photo_done("/t/a", order)
+        doc = self.writer.docs[("importJobs/job-1/ledger", "t_a")]
+        self.assertEqual({"folderPath": "/t/a", "total": 4, "nextOrder": 2, "done": False}, doc)
+
+        ledger.photo_done("/t/a", 2)
+        self.assertTrue(self.writer.docs[("importJobs/job-1/ledger", "t_a")]["done"])
+
+    def test_skipped_checkpoint_still_lets_the_writer_flush_on_time(self):
+        now = [0.0]
+        ledger = jl.JobLedger(self.db, "job-1", self.writer, interval_sec=10, clock=lambda: now[0])
+        ledger.start_folder("/t/a", 4)
+        now[0] = 1.0
+        ledger.photo_done("/t/a", 0)
+        self.assertNotIn(("importJobs/job-1/ledger", "t_a"), self.writer.docs)
+        self.assertEqual(2, self.writer.flush_checks)
+
+    def test_reloaded_ledger_resumes_from_checkpoint(self):
+        ledger = self._ledger()
+        ledger.start_folder("/t/a", 3)
+        ledger.start_folder("/t/b", 5)
+        for order in range(3):
+            ledger.photo_done("/t/a", order)
+        ledger.photo_done("/t/b", 0)
+        ledger.photo_done("/t/b", 1)
+
+        resumed = self._ledger()
+        self.assertEqual(2, resumed.load())
+        self.assertTrue(resumed.folder_done("/t/a"))
+        self.assertFalse(resumed.folder_done("/t/b"))
+        self.assertEqual(2, resumed.resume_from("/t/b"))
+        self.assertEqual(0, resumed.resume_from("/t/c"))
+
+    def test_shard_slice_watermark_starts_at_its_first_order(self):
+        ledger = self._ledger()
+        ledger.start_folder("/t/a", 20, 10)
+        self.assertEqual(10, ledger.resume_from("/t/a"))
+        for order in range(10, 20):
+            ledger.photo_done("/t/a", order)
+        self.assertTrue(ledger.folder_done("/t/a"))
+        self.assertEqual(20, self.writer.docs[("importJobs/job-1/ledger", "t_a")]["nextOrder"])
+
+    def test_checkpoints_are_throttled(self):
+        now = [0.0]
+        ledger = jl.JobLedger(self.db, "job-1", self.writer, interval_sec=10, clock=lambda: now[0])
+        ledger.start_folder("/t/a", 100)
+        ledger.photo_done("/t/a", 0)
+        self.assertEqual({}, self.writer.docs)
+        now[0] = 11.0
+        ledger.photo_done("/t/a", 1)
+        self.assertEqual(2, self.writer.docs[("importJobs/job-1/ledger", "t_a")]["nextOrder"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -27,6 +27,18 @@ class ListMediaTests(unittest.TestCase):
             self.assertIn(base / ".hidden.jpg", all_files)
             self.assertNotIn(sub / "b.jpg", all_files)
 
+    def test_collect_media_sorts_and_reports(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp)
+            for name in ("b.MP4", "A.jpg", "notes.txt"):
+                (base / name).write_bytes(b"data")
+
+            result = lm.collect_media(base)
+
+            self.assertEqual([str(base / "A.jpg"), str(base / "b.MP4")], result["files"])
+            self.assertEqual(2, result["count"])
+            self.assertFalse(result["truncated"])
+
 
 if __name__ == "__main__":
     unittest.main()
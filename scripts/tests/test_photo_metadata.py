@@ -0,0 +1,65 @@
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from PIL import Image
+
+import photo_metadata as pm
+
+
+def _save_with_exif(path: Path, original=None, offset=None, ifd0_datetime=None) -> None:
+    exif = Image.Exif()
+    if ifd0_datetime:
+        exif[pm.TAG_DATETIME] = ifd0_datetime
+    sub = exif.get_ifd(pm.EXIF_IFD)
+    if original:
+        sub[pm.TAG_DATETIME_ORIGINAL] = original
+    if offset:
+        sub[pm.TAG_OFFSET_TIME_ORIGINAL] = offset
+    Image.new("RGB", (32, 24), (1, 2, 3)).save(path, exif=exif)
+
+
+class PhotoMetadataTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_reads_original_time_with_offset_without_decoding(self):
+        src = self.tmp / "a.jpg"
+        _save_with_exif(src, original="2014:02:03 21:15:09", offset="+09:00", ifd0_datetime="2020:01:01 00:00:00")
+        with mock.patch.object(Image.Image, "load", side_effect=AssertionError("pixels decoded")):
+            captured = pm.read_capture_time(src)
+        self.assertEqual(datetime(2014, 2, 3, 21, 15, 9, tzinfo=timezone(timedelta(hours=9))), captured)
+        fields = pm.capture_fields(captured)
+        self.assertEqual((2014, 2, 3), (fields["year"], fields["month"], fields["day"]))
+
+    def test_falls_back_to_ifd0_datetime_and_handles_missing_exif(self):
+        src = self.tmp / "b.jpg"
+        _save_with_exif(src, ifd0_datetime="2019:12:31 23:59:59")
+        self.assertEqual(datetime(2019, 12, 31, 23, 59, 59), pm.read_capture_time(src))
+
+        plain = self.tmp / "c.png"
+        Image.new("RGB", (8, 8)).save(plain)
+        self.assertIsNone(pm.read_capture_time(plain))
+        self.assertEqual({"capturedAt": None}, pm.capture_fields(None))
+
+    def test_parse_exif_datetime_rejects_placeholders(self):
+        self.assertIsNone(pm.parse_exif_datetime("0000:00:00 00:00:00"))
+        self.assertIsNone(pm.parse_exif_datetime(b"    "))
+        self.assertEqual(
+            datetime(2021, 5, 6, 7, 8, 9, tzinfo=timezone(-timedelta(hours=4, minutes=30))),
+            pm.parse_exif_datetime("2021:05:06 07:08:09", "-04:30"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
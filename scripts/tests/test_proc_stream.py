@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sys
+import time
+import unittest
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import proc_stream as ps
+
+# Starts a grandchild that shares the output pipes (like a render worker of
+# import_photos --workers), prints its pid, then hangs
+WITH_GRANDCHILD = (
+    "import subprocess, sys, time\n"
+    "g = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+    "print(g.pid, flush=True)\n"
+    "time.sleep(60)\n"
+)
+
+
+def process_gone(pid, wait_sec=5.0):
+    """True once pid has exited (a zombie waiting to be reaped counts as gone)."""
+    deadline = time.monotonic() + wait_sec
+    while time.monotonic() < deadline:
+        try:
+            with open(f"/proc/{pid}/stat") as fh:
+                if fh.read().rsplit(")", 1)[1].split()[0] == "Z":
+                    return True
+        except FileNotFoundError:
+            return True
+        except OSError:
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                return True
+        time.sleep(0.05)
+    return False
+
+
+class TailBufferTests(unittest.TestCase):
+    def test_keeps_only_the_last_characters(self):
+        tail = ps.TailBuffer(max_chars=10)
+        for n in range(100):
+            tail.append(f"line{n}\n")
+        self.assertEqual("line99\n", tail.text())
+        tail.append("x" * 25 + "\n")
+        self.assertEqual(10, len(tail.text()))
+        self.assertTrue(tail.text().endswith("x\n"))
+
+
+class RunStreamingTests(unittest.TestCase):
+    def test_lines_reach_callback_live_and_tail_is_bounded(self):
+        child = (
+            "import sys\n"
+            "for n in range(5000):\n"
+            "    print(f'photo {n}')\n"
+            "sys.stderr.write('PROGRESS 1\\n')\n"
+            "sys.stderr.write('warning\\n')\n"
+        )
+        seen = []
+
+        def on_line(stream, line):
+            seen.append((stream, line))
+            return line.startswith("PROGRESS")
+
+        result = ps.run_streaming([sys.executable, "-c", child], on_line=on_line, poll_sec=0.05, tail_chars=100)
+        self.assertEqual(0, result.returncode)
+        self.assertFalse(result.timed_out)
+        self.assertEqual(5002, len(seen))
+        self.assertLessEqual(len(result.stdout), 100)
+        self.assertTrue(result.stdout.endswith("photo 4999\n"))
+        # consumed lines stay out of the tail
+        self.assertEqual("warning\n", result.stderr)
+
+    def test_timeout_kills_child_and_keeps_partial_output(self):
+        child = "import time\nprint('started', flush=True)\ntime.sleep(30)\n"
+        result = ps.run_streaming([sys.executable, "-c", child], timeout_sec=0.5, poll_sec=0.05)
+        self.assertTrue(result.timed_out)
+        self.assertNotEqual(0, result.returncode)
+        self.assertEqual("started\n", result.stdout)
+        self.assertLess(result.elapsed_sec, 10)
+
+    @unittest.skipUnless(hasattr(os, "killpg"), "process groups are POSIX only")
+    def test_timeout_kills_grandchildren_too(self):
+        result = ps.run_streaming([sys.executable, "-c", WITH_GRANDCHILD], timeout_sec=1.0, poll_sec=0.05)
+        self.assertTrue(result.timed_out)
+        self.assertTrue(process_gone(int(result.stdout)))
+        self.assertLess(result.elapsed_sec, 8)
+
+
+class RunStreamingAsyncTests(unittest.TestCase):
+    def test_streams_lines_without_blocking_the_loop(self):
+        child = (
+            "import sys, time\n"
+            "for n in range(3):\n"
+            "    print(f'photo {n}', flush=True)\n"
+            "    time.sleep(0.1)\n"
+            "sys.stderr.write('PROGRESS 1\\nwarning\\n')\n"
+        )
+        seen, ticks = [], []
+
+        def on_line(stream, line):
+            seen.append((stream, line))
+            return line.startswith("PROGRESS")
+
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.02)
+
+        async def scenario():
+            tick_task = asyncio.ensure_future(ticker())
+            try:
+                return await ps.run_streaming_async([sys.executable, "-c", child], on_line=on_line)
+            finally:
+                tick_task.cancel()
+
+        result = asyncio.run(scenario())
+        self.assertEqual(0, result.returncode)
+        self.assertEqual("photo 0\nphoto 1\nphoto 2\n", result.stdout)
+        self.assertEqual("warning\n", result.stderr)
+        self.assertEqual(5, len(seen))
+        self.assertGreater(len(ticks), 5)
+
+    def test_timeout_kills_child(self):
+        child = "import time\nprint('started', flush=True)\ntime.sleep(30)\n"
+        result = asyncio.run(ps.run_streaming_async([sys.executable, "-c", child], timeout_sec=0.5))
+        self.assertTrue(result.timed_out)
+        self.assertNotEqual(0, result.returncode)
+        self.assertEqual("started\n", result.stdout)
+        self.assertLess(result.elapsed_sec, 10)
+
+    @unittest.skipUnless(hasattr(os, "killpg"), "process groups are POSIX only")
+    def test_timeout_kills_grandchildren_too(self):
+        result = asyncio.run(ps.run_streaming_async([sys.executable, "-c", WITH_GRANDCHILD], timeout_sec=1.0))
+        self.assertTrue(result.timed_out)
+        self.assertTrue(process_gone(int(result.stdout)))
+        self.assertLess(result.elapsed_sec, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
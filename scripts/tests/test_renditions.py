@@ -0,0 +1,190 @@
+import struct
+import sys
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from PIL import Image
+
+import renditions as rd
+
+
+class RenditionTests(unittest.TestCase):
+    def test_parse_rendition_spec(self):
+        self.assertEqual(rd.RenditionSpec("medium", 1600, "webp", 80), rd.parse_rendition_spec("medium:1600:webp:80"))
+        self.assertEqual(rd.RenditionSpec("thumb", 200, "jpeg", 90), rd.parse_rendition_spec("thumb:200:jpg"))
+        self.assertEqual(
+            rd.RenditionSpec("medium", 1280, "pjpeg", 80, 150 * 1024), rd.parse_rendition_spec("medium:1280:pjpeg:80:150k")
+        )
+        for bad in ("thumb", "thumb:abc", "thumb:0", "thumb:256:gif", "thumb:256:jpeg:101", "thumb:256:jpeg:90:lots"):
+            with self.assertRaises(ValueError):
+                rd.parse_rendition_spec(bad)
+
+    def test_merge_rendition_specs_overrides_by_name(self):
+        specs = rd.merge_rendition_specs([rd.RenditionSpec("thumb", 320), rd.RenditionSpec("large", 2048)])
+        self.assertEqual(["thumb", "medium", "large"], [s.name for s in specs])
+        self.assertEqual(320, specs[0].long_edge)
+
+    def test_render_file_decodes_once_for_all_renditions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "a.png"
+            Image.new("RGB", (3000, 2000), (10, 20, 30)).save(src)
+
+            with mock.patch.object(rd.Image, "open", wraps=Image.open) as opened:
+                out = rd.render_file(src, rd.DEFAULT_RENDITIONS)
+
+            self.assertEqual(1, opened.call_count)
+            self.assertEqual((1280, 853), out["medium"].size)
+            self.assertEqual((256, 171), out["thumb"].size)
+            with Image.open(BytesIO(out["thumb"].data)) as thumb:
+                self.assertEqual("JPEG", thumb.format)
+
+    def test_byte_budget_lowers_quality_until_it_fits(self):
+        im = Image.effect_noise((640, 480), 60).convert("RGB")
+        unbounded, quality = rd.encode(im, rd.RenditionSpec("medium", 640, "webp", 90))
+        self.assertEqual(90, quality)
+        budget = len(unbounded) * 9 // 10
+        data, quality = rd.encode(im, rd.RenditionSpec("medium", 640, "webp", 90, budget))
+        self.assertLessEqual(len(data), budget)
+        self.assertLess(quality, 90)
+        self.assertGreaterEqual(quality, rd.MIN_BUDGET_QUALITY)
+
+    def test_progressive_jpeg(self):
+        im = Image.new("RGB", (64, 64), (200, 10, 10))
+        data, _ = rd.encode(im, rd.RenditionSpec("thumb", 64, "pjpeg"))
+        with Image.open(BytesIO(data)) as out:
+            self.assertEqual("JPEG", out.format)
+            self.assertTrue(out.info.get("progressive") or out.info.get("progression"))
+
+    def test_jpeg_is_decoded_draft_scaled(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "big.jpg"
+            Image.new("RGB", (4000, 3000), (10, 20, 30)).save(src)
+            with Image.open(src) as im:
+                self.assertEqual((1000, 750), rd.decode_near(im, 256).size)
+            with Image.open(src) as im:
+                self.assertEqual((4000, 3000), rd.decode_near(im, 2048).size)
+
+    def test_other_formats_are_reduced_before_conversion(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "big.png"
+            Image.new("P", (3000, 2000)).save(src)
+            with Image.open(src) as im:
+                out = rd.decode_near(im, 256)
+            self.assertEqual(((600, 400), "RGB"), (out.size, out.mode))
+
+    def test_decode_ceiling_rejects_before_loading(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = Path(tmp) / "big.png"
+            Image.new("RGB", (3000, 2000)).save(src)
+            with Image.open(src) as im, mock.patch.object(type(im), "load") as load:
+                with self.assertRaises(rd.SourceTooLarge):
+                    rd.decode_near(im, 256, max_pixels=5_000_000)
+                load.assert_not_called()
+
+            jpeg = Path(tmp) / "big.jpg"
+            Image.new("RGB", (3000, 2000)).save(jpeg)
+            with Image.open(jpeg) as im:
+                # Drafted to 1/4 scale, well under the ceiling
+                self.assertEqual((750, 500), rd.decode_near(im, 256, max_pixels=5_000_000).size)
+
+    def test_non_jpeg_sources_are_checked_at_full_size_before_loading(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("big.tif", "big.heic", "big.webp"):
+                with self.subTest(name):
+                    src = Path(tmp) / name
+                    Image.new("RGB", (3000, 2000)).save(src)
+                    with Image.open(src) as im, mock.patch.object(type(im), "load") as load:
+                        # The JPEG of the same size passes at 1/4 scale (above)
+                        with self.assertRaises(rd.SourceTooLarge):
+                            rd.decode_near(im, 256, max_pixels=5_000_000)
+                        load.assert_not_called()
+                    with Image.open(src) as im:
+                        self.assertEqual((600, 400), rd.decode_near(im, 256, max_pixels=6_000_000).size)
+
+
+def _exif_with_thumbnail(thumb_jpeg: bytes) -> bytes:
+    """Minimal little-endian TIFF: empty IFD0 -> IFD1 holding a JPEG thumbnail."""
+    ifd1_offset = 8 + 2 + 4
+    data_offset = ifd1_offset + 2 + 2 * 12 + 4
+    tiff = b"II*\x00" + struct.pack("<I", 8)
+    tiff += struct.pack("<H", 0) + struct.pack("<I", ifd1_offset)
+    tiff += struct.pack("<H", 2)
+    tiff += struct.pack("<HHII", rd.TAG_JPEG_IF_OFFSET, 4, 1, data_offset)
+    tiff += struct.pack("<HHII", rd.TAG_JPEG_IF_LENGTH, 4, 1, len(thumb_jpeg))
+    tiff += struct.pack("<I", 0)
+    return b"Exif\x00\x00" + tiff + thumb_jpeg
+
+
+class PreviewTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.full = Image.new("RGB", (2000, 1500), (10, 120, 30))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _render(self, path, specs=rd.DEFAULT_RENDITIONS, use_previews=True):
+        with Image.open(path) as im:
+            return rd.render_source(im, specs, use_previews)
+
+    def test_mpf_preview_covering_all_renditions_is_used(self):
+        src = self.tmp / "a.jpg"
+        self.full.save(src, format="MPO", save_all=True, append_images=[self.full.resize((1400, 1050))])
+        out, source = self._render(src)
+        self.assertEqual(rd.SOURCE_MPF, source)
+        self.assertEqual((1280, 960), out["medium"].size)
+        self.assertEqual(rd.SOURCE_FULL, self._render(src, use_previews=False)[1])
+        self.assertEqual(rd.SOURCE_FULL, self._render(src, (rd.RenditionSpec("large", 1600),))[1])
+
+    def test_each_rendition_uses_the_smallest_preview_covering_it(self):
+        buf = BytesIO()
+        self.full.resize((320, 240)).save(buf, "JPEG")
+        src = self.tmp / "e.jpg"
+        self.full.save(
+            src, format="MPO", save_all=True, append_images=[self.full.resize((1400, 1050))],
+            exif=_exif_with_thumbnail(buf.getvalue()),
+        )
+        out, source = self._render(src)
+        self.assertEqual(rd.SOURCE_MPF + "+" + rd.SOURCE_EXIF, source)
+        self.assertEqual((1280, 960), out["medium"].size)
+        self.assertEqual((256, 192), out["thumb"].size)
+
+        specs = (rd.RenditionSpec("large", 1600), rd.RenditionSpec("thumb", 256))
+        out, source = self._render(src, specs)
+        self.assertEqual(rd.SOURCE_FULL + "+" + rd.SOURCE_EXIF, source)
+        self.assertEqual((1600, 1200), out["large"].size)
+        self.assertEqual((256, 192), out["thumb"].size)
+
+    def test_preview_with_other_aspect_ratio_is_ignored(self):
+        src = self.tmp / "b.jpg"
+        self.full.save(src, format="MPO", save_all=True, append_images=[self.full.resize((1400, 800))])
+        self.assertEqual(rd.SOURCE_FULL, self._render(src)[1])
+
+    def test_exif_thumbnail(self):
+        buf = BytesIO()
+        self.full.resize((320, 240)).save(buf, "JPEG")
+        src = self.tmp / "c.jpg"
+        self.full.save(src, exif=_exif_with_thumbnail(buf.getvalue()))
+        out, source = self._render(src, (rd.RenditionSpec("thumb", 256),))
+        self.assertEqual(rd.SOURCE_EXIF, source)
+        self.assertEqual((256, 192), out["thumb"].size)
+
+    def test_heif_thumbnail(self):
+        src = self.tmp / "d.heic"
+        full = self.full.copy()
+        full.info["thumbnails"] = [1400]
+        full.save(src)
+        out, source = self._render(src)
+        self.assertEqual(rd.SOURCE_HEIF, source)
+        self.assertEqual((1280, 960), out["medium"].size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import asyncio
+import io
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from pathlib import Path
+from unittest import mock
+
+SCRIPT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(SCRIPT_DIR))
+
+
+def _install_fastmcp_stub():
+    try:
+        import mcp.server.fastmcp  # noqa: F401
+
+        return None
+    except ImportError:
+        pass
+
+    class FastMCP:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def tool(self):
+            return lambda fn: fn
+
+    stub = types.ModuleType("mcp.server.fastmcp")
+    stub.FastMCP = FastMCP
+    sys.modules["mcp.server.fastmcp"] = stub
+    return stub
+
+
+_install_fastmcp_stub()
+
+import server  # noqa: E402
+
+
+class InProcessToolTests(unittest.TestCase):
+    def setUp(self):
+        stderr = mock.patch("sys.stderr", io.StringIO())
+        stderr.start()
+        self.addCleanup(stderr.stop)
+        # semaphores bind to the loop they first wait on; each test runs its own loop
+        server._tool_limits.clear()
+        index = mock.patch.object(server, "DIR_INDEX_PATH", "off")
+        index.start()
+        self.addCleanup(index.stop)
+
+    def test_list_media_returns_structured_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = Path(tmp).resolve()
+            (base / "a.jpg").write_bytes(b"data")
+            result = asyncio.run(server.list_media(str(base)))
+        self.assertTrue(result["ok"])
+        self.assertEqual([str(base / "a.jpg")], result["files"])
+        self.assertIn("elapsed_sec", result)
+
+    def test_list_media_rejects_missing_dir(self):
+        result = asyncio.run(server.list_media("/nonexistent/dir/for/test"))
+        self.assertFalse(result["ok"])
+
+    def test_list_media_checks_dir_off_the_event_loop(self):
+        threads = []
+        resolve = Path.resolve
+
+        def recording_resolve(path, *args, **kwargs):
+            threads.append(threading.current_thread())
+            return resolve(path, *args, **kwargs)
+
+        with mock.patch.object(Path, "resolve", recording_resolve):
+            result = asyncio.run(server.list_media("/nonexistent/dir/for/test"))
+        self.assertFalse(result["ok"])
+        self.assertTrue(threads)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_find_directory_returns_structured_counts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp).resolve()
+            (root / "DCIM").mkdir()
+            (root / "DCIM" / "a.jpg").write_bytes(b"data")
+            result = asyncio.run(server.find_directory("dcim", roots=[str(root)]))
+        self.assertTrue(result["ok"])
+        self.assertEqual([{"dir": str(root / "DCIM"), "count": 1}], result["media_counts"])
+
+    def test_timeout_cancels_the_walk(self):
+        stopped = []
+
+        def slow_walk(should_stop):
+            while not should_stop():
+                time.sleep(0.01)
+            stopped.append(True)
+            return {}
+
+        with mock.patch.object(server, "TOOL_TIMEOUT_SEC", 0.1):
+            result = asyncio.run(server._run_tool("req", slow_walk))
+        self.assertFalse(result["ok"])
+        self.assertIn("timeout", result["error"])
+        deadline = time.time() + 5
+        while not stopped and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([True], stopped)
+
+    def test_ping_answers_while_scans_run_and_scans_are_limited(self):
+        running, peak = [0], [0]
+        lock = threading.Lock()
+
+        def slow_search(*args, should_stop, index=None):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.3)
+            with lock:
+                running[0] -= 1
+            return {"matched_dirs": []}
+
+        async def scenario():
+            scans = [asyncio.ensure_future(server.find_directory(f"k{n}")) for n in range(4)]
+            await asyncio.sleep(0.05)
+            t0 = time.monotonic()
+            pong = await server.ping()
+            ping_sec = time.monotonic() - t0
+            results = await asyncio.gather(*scans)
+            return pong, ping_sec, results
+
+        with mock.patch.object(server.fd, "search", slow_search), mock.patch.dict(
+            server.TOOL_CONCURRENCY, {"find_directory": 2}
+        ):
+            pong, ping_sec, results = asyncio.run(scenario())
+        self.assertTrue(pong["ok"])
+        self.assertLess(ping_sec, 0.1)
+        self.assertTrue(all(r["ok"] for r in results))
+        self.assertEqual(2, peak[0])
+
+
+if __name__ == "__main__":
+    unittest.main()